@@ -0,0 +1,221 @@
+"""
+A local stand-in for the parts of Google Maps the scraper talks to, for offline
+end-to-end throughput tests:
+
+- /maps/search/?q=...  a results page with a scrollable [role="feed"] that appends
+  place links in batches as it is scrolled, then the end-of-list marker
+- /maps/place/...      place pages carrying an APP_INITIALIZATION_STATE built from the
+  bundled fixtures (name and ids vary per place)
+- /maps/rpc/listugcposts  the reviews RPC, paged with next-page tokens
+- a consent wall in front of the search page until the SOCS cookie is set
+
+Latency and errors can be injected. Point the scraper at it with GMAPS_BASE_URL:
+
+    python benchmarks/fake_maps_server.py --port 8088 --latency-ms 150 --error-rate 0.02
+    GMAPS_BASE_URL=http://127.0.0.1:8088 uvicorn gmaps_scraper_server.main_api:app --port 8000
+    locust -f locustfile.py --host http://127.0.0.1:8000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+from functools import lru_cache
+from html import escape
+from urllib.parse import quote
+
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, PlainTextResponse
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from run_benchmarks import build_raw_reviews, load_fixture
+
+END_OF_LIST_TEXT = "You've reached the end of the list."
+# Substituted per place into the serialized page-state templates.
+NAME_TOKEN = "FAKEMAPS_NAME"
+FEATURE_ID_TOKEN = "FAKEMAPS_FEATURE_ID"
+PLACE_ID_TOKEN = "FAKEMAPS_PLACE_ID"
+
+
+class FakeMapsConfig:
+    def __init__(self, places_per_query=60, feed_batch=20, reviews_per_place=120,
+                 latency_ms=0, jitter_ms=0, error_rate=0.0, consent=False, seed=0):
+        self.places_per_query = places_per_query
+        self.feed_batch = feed_batch
+        self.reviews_per_place = reviews_per_place
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.consent = consent
+        self.rng = random.Random(seed)
+
+
+def feature_id(query, n):
+    """A stable `0x...:0x...` feature id per (query, result position)."""
+    digest = sum(map(ord, query)) * 1000 + n
+    return f"0x{0x2dd2000000000000 + digest:x}:0x{0x99ad000000000000 + digest:x}"
+
+
+def place_link(base_url, query, n):
+    name = f"{query.title()} {n + 1}"
+    return (
+        f"{base_url}/maps/place/{quote(name.replace(' ', '+'))}/data=!4m7!3m6!1s{feature_id(query, n)}"
+        f"!8m2!3d-8.5!4d115.3!16s%2Fg%2F11fake!19s{quote(name)}?hl=en"
+    )
+
+
+@lru_cache(maxsize=None)
+def state_templates():
+    """Serialized page states, one per fixture blob, with placeholder name and ids."""
+    initial_state = load_fixture("initial_data.json")
+    inner = json.loads(initial_state[3][6].split(")]}'\n", 1)[1])
+    templates = []
+    for blob in (inner[6], load_fixture("data_blob.json")):
+        blob = list(blob) + [None] * max(0, 79 - len(blob))
+        blob[10], blob[11], blob[78] = FEATURE_ID_TOKEN, NAME_TOKEN, PLACE_ID_TOKEN
+        inner[6] = blob
+        basic = initial_state[5][3][2]
+        basic[0], basic[1], basic[18] = FEATURE_ID_TOKEN, NAME_TOKEN, PLACE_ID_TOKEN
+        initial_state[3][6] = ")]}'\n" + json.dumps(inner)
+        templates.append(json.dumps(initial_state))
+    return templates
+
+
+def place_html(name, ftid):
+    template = state_templates()[sum(map(ord, ftid)) % len(state_templates())]
+    state = (
+        template.replace(NAME_TOKEN, json.dumps(name)[1:-1])
+        .replace(FEATURE_ID_TOKEN, ftid)
+        .replace(PLACE_ID_TOKEN, "ChIJ" + ftid.replace(":", "")[-20:])
+    )
+    return (
+        f"<html><head><title>{escape(name)} - Google Maps</title></head><body>"
+        f'<div role="main" aria-label="{escape(name)}"><h1>{escape(name)}</h1>'
+        f'<button data-item-id="address" aria-label="Address: Jl. Fake {len(name)}, Bali"></button></div>'
+        f"<script>;window.APP_INITIALIZATION_STATE={state};window.APP_FLAGS=[];</script></body></html>"
+    )
+
+
+CONSENT_HTML = """<html><body><form>
+<button type="button" onclick="document.cookie='SOCS=fakemaps; path=/'; location.reload()"><span>Accept all</span></button>
+<button type="button" onclick="document.cookie='SOCS=fakemaps; path=/'; location.reload()"><span>Reject all</span></button>
+</form></body></html>"""
+
+# Appends the next batch of links whenever the feed is scrolled to the bottom.
+SEARCH_HTML = """<html><head><title>{title} - Google Maps</title></head><body>
+<div role="main"><div role="feed" style="height:600px;overflow-y:auto"></div></div>
+<script>
+const links = {links};
+const batch = {batch};
+const delay = {delay};
+const feed = document.querySelector('[role="feed"]');
+let shown = 0;
+let loading = false;
+function more() {{
+    loading = false;
+    for (const href of links.slice(shown, shown + batch)) {{
+        const item = document.createElement('div');
+        item.style.height = '120px';
+        item.innerHTML = '<a href="' + href + '">' + decodeURIComponent(href.split('/')[5]) + '</a>';
+        feed.appendChild(item);
+    }}
+    shown += batch;
+    if (shown >= links.length) {{
+        const end = document.createElement('div');
+        end.textContent = {end_text};
+        feed.appendChild(end);
+    }}
+}}
+feed.addEventListener('scroll', () => {{
+    if (loading || shown >= links.length) return;
+    if (feed.scrollTop + feed.clientHeight >= feed.scrollHeight - 10) {{
+        loading = true;
+        setTimeout(more, delay);
+    }}
+}});
+more();
+</script></body></html>"""
+
+
+def create_app(config=None):
+    config = config or FakeMapsConfig()
+    app = FastAPI(title="Fake Google Maps")
+
+    async def inject():
+        """Sleeps for the configured latency; returns an error response when one is injected."""
+        delay = config.latency_ms + config.rng.uniform(0, config.jitter_ms)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if config.error_rate and config.rng.random() < config.error_rate:
+            return PlainTextResponse("injected error", status_code=500)
+        return None
+
+    @app.get("/maps/search/", response_class=HTMLResponse)
+    async def search(request: Request, q: str = "", hl: str = "en"):
+        if error := await inject():
+            return error
+        if config.consent and "SOCS" not in request.cookies:
+            return HTMLResponse(CONSENT_HTML)
+        base_url = str(request.base_url).rstrip("/")
+        links = [place_link(base_url, q, n) for n in range(config.places_per_query)]
+        return HTMLResponse(SEARCH_HTML.format(
+            title=escape(q), links=json.dumps(links), batch=config.feed_batch,
+            delay=int(config.latency_ms), end_text=json.dumps(END_OF_LIST_TEXT),
+        ))
+
+    @app.get("/maps/place/{name}/{data:path}", response_class=HTMLResponse)
+    async def place(name: str, data: str):
+        if error := await inject():
+            return error
+        match = re.search(r'!1s(0x[0-9a-f]+:0x[0-9a-f]+)', data)
+        if not match:
+            return PlainTextResponse("unknown place", status_code=404)
+        return HTMLResponse(place_html(name.replace("+", " "), match.group(1)))
+
+    @app.get("/maps/rpc/listugcposts")
+    async def list_reviews(pb: str = ""):
+        if error := await inject():
+            return error
+        place_id = re.search(r'!1s([^!]+)', pb)
+        page_size = re.search(r'!2m2!1i(\d+)', pb)
+        token = re.search(r'!2s([^!]*)', pb)
+        if not place_id:
+            return PlainTextResponse("missing place id", status_code=400)
+        start = int(token.group(1) or 0) if token and token.group(1).isdigit() else 0
+        size = int(page_size.group(1)) if page_size else 10
+        reviews = place_reviews(place_id.group(1), config.reviews_per_place)
+        next_token = str(start + size) if start + size < len(reviews) else None
+        return PlainTextResponse(")]}'\n" + json.dumps([None, next_token, reviews[start:start + size]]))
+
+    return app
+
+
+@lru_cache(maxsize=1024)
+def place_reviews(place_id, count):
+    return build_raw_reviews(count, seed=sum(map(ord, place_id)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--places", type=int, default=60, help="Results per search query.")
+    parser.add_argument("--feed-batch", type=int, default=20, help="Links appended per feed scroll.")
+    parser.add_argument("--reviews", type=int, default=120, help="Reviews per place.")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Added to every response.")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random extra latency, up to this much.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of responses that are HTTP 500.")
+    parser.add_argument("--consent", action="store_true", help="Show a consent wall until SOCS is set.")
+    args = parser.parse_args()
+
+    import uvicorn
+    config = FakeMapsConfig(args.places, args.feed_batch, args.reviews, args.latency_ms,
+                            args.jitter_ms, args.error_rate, args.consent)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
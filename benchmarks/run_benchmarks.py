@@ -0,0 +1,240 @@
+"""
+Offline extractor benchmarks built from the bundled fixtures.
+
+Place pages are synthesized from `initial_data.json` (a real APP_INITIALIZATION_STATE)
+padded with rendered-DOM markup to several page sizes, and review payloads are
+synthesized in the 'listugcposts' shape at several counts. For every case the runner
+reports ops/sec, peak traced memory, and the memory and number of memory blocks the
+result retains once the call returns, and compares them against a stored baseline:
+
+    python benchmarks/run_benchmarks.py                    # compare, exit 1 on regression
+    python benchmarks/run_benchmarks.py --save-baseline    # record the current numbers
+    python benchmarks/run_benchmarks.py --filter reviews   # only matching cases
+
+Throughput is compared after normalizing by a fixed pure-Python calibration workload,
+so a baseline recorded on one machine stays usable on another. The baseline file holds
+one set of cases per JSON backend ("json", or "orjson" when installed); a run is only
+compared with its own backend's cases and fails when there are none. To record the
+stdlib set on a machine that has orjson, hide it for one run:
+
+    python -c "import sys, runpy; sys.modules['orjson'] = None; sys.argv[1:] = ['--save-baseline']; runpy.run_path('benchmarks/run_benchmarks.py', run_name='__main__')"
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import timeit
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+
+from gmaps_scraper_server import extractor
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Rendered-DOM padding per page size, in KiB (a live place page is a few MiB).
+PAGE_SIZES = {"small": 0, "medium": 512, "large": 4096}
+REVIEW_COUNTS = (100, 1000, 5000)
+REVIEW_SEED = 1234
+# Timing rounds per case; each pairs a calibration run with a case run and the median
+# ratio is kept, so a single slow round (a GC pause, a noisy neighbour) can't fail the gate.
+REPEAT = 11
+# Cases faster than this (ops/sec, about 2 ms a call) swing more between runs and get MICRO_TOLERANCE.
+MICRO_CASE_OPS = 500
+MICRO_TOLERANCE = 0.6
+
+DOM_CHUNK = (
+    '<div class="m6QErb" role="region" aria-label="Information for Blooming Lotus Yoga">'
+    '<button class="CsEnBe" data-item-id="oloc" aria-label="Plus code: 9JHJ+GH Ubud">'
+    '<div class="rogA2c"><div class="Io6YTe">9JHJ+GH Ubud</div></div></button>'
+    '<span class="ZkP5Je" aria-label="Opening hours"><img src="//www.gstatic.com/images/icons/x.png"></span>'
+    '<a class="lcr4fd" href="https://www.google.com/maps/place/x" jsaction="pane.wfvdle10"></a></div>\n'
+)
+
+
+def load_fixture(name):
+    with open(os.path.join(ROOT, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_place_html(initial_state, padding_kib):
+    """A place page: DOM markup around the state script, with the usual fallback targets."""
+    dom = DOM_CHUNK * (padding_kib * 1024 // len(DOM_CHUNK))
+    return (
+        "<html><head><title>Blooming Lotus Yoga - Google Maps</title></head><body>"
+        '<button data-item-id="address" aria-label="Address: Jl. Raya Ubud, Bali"></button>'
+        '<div aria-label="4.9 stars"></div><div aria-label="255 reviews"></div>'
+        f"{dom}<script>;window.APP_INITIALIZATION_STATE={json.dumps(initial_state)};window.APP_FLAGS=[];</script>"
+        "</body></html>"
+    )
+
+
+def build_raw_reviews(count, seed=REVIEW_SEED):
+    """Raw reviews in the 'listugcposts' shape, with a realistic spread of ranking features."""
+    rng = random.Random(seed)
+    words = "great class friendly teacher calm studio view rice fields relaxing morning session".split()
+    reviews = []
+    for n in range(count):
+        name = rng.choice(["A Google User", "Made W.", "Sarah K.", "Profile Name", "Tom B."])
+        picture = rng.choice([None, "//lh3.googleusercontent.com/a/pic=s120"])
+        date = rng.choice([None, [2024, rng.randint(1, 12), rng.randint(1, 28)]])
+        text = " ".join(rng.choice(words) for _ in range(rng.choice([0, 5, 20, 80])))
+        details = [[rng.randint(1, 5)], None, [None, [None] * 21 + [[None] * 6 + [[None] * 8 + [date]]]]]
+        details += [None] * 12 + [[[text]]]
+        author = [None] * 5 + [[name, picture]]
+        reviews.append([[f"review-{n}", [None, "a month ago", 1_700_000_000_000_000 + n, None, author], details]])
+    return reviews
+
+
+def build_cases():
+    """Returns {case name: zero-argument callable}."""
+    initial_state = load_fixture("initial_data.json")
+    # The page state is the same whatever the page size
+    cases = {"parse_json_data": lambda json_str=json.dumps(initial_state): extractor.parse_json_data(json_str)}
+    for size, padding_kib in PAGE_SIZES.items():
+        html = build_place_html(initial_state, padding_kib)
+        _, start, end = extractor.locate_initial_json(html)
+        fallback_html = html[:start] + html[end:]
+        cases[f"extract_place_data[{size}]"] = lambda html=html: extractor.extract_place_data(html)
+        cases[f"html_fallbacks[{size}]"] = lambda html=fallback_html: [
+            fallback(html) for fallback in extractor.HTML_FALLBACKS.values()
+        ]
+    for count in REVIEW_COUNTS:
+        raw = build_raw_reviews(count)
+        cases[f"process_and_select_reviews[{count}]"] = lambda raw=raw: extractor.process_and_select_reviews(
+            raw, seed=REVIEW_SEED
+        )
+    return cases
+
+
+CALIBRATION_DATA = json.dumps([[i, str(i), [i * 0.5, None, {"k": i}]] for i in range(2000)])
+
+
+def calibration_workload():
+    """A fixed pure-Python workload that case throughput is normalized by."""
+    decoded = json.loads(CALIBRATION_DATA)
+    return sorted((row[1] for row in decoded if row[0] % 3), reverse=True)
+
+
+def measure_ops(func, repeat=REPEAT):
+    """
+    Returns (ops/sec, normalized ops/sec) for `func`. Every round times the calibration
+    workload right before the case, so the ratio also absorbs CPU frequency drift; both
+    are medians over `repeat` rounds, after a warmup round that isn't counted.
+    """
+    case_timer = timeit.Timer(func)
+    calibration_timer = timeit.Timer(calibration_workload)
+    number, _ = case_timer.autorange()
+    calibration_number, _ = calibration_timer.autorange()
+    ops = []
+    ratios = []
+    for _ in range(repeat + 1):
+        calibration_ops = calibration_number / calibration_timer.timeit(calibration_number)
+        case_ops = number / case_timer.timeit(number)
+        ops.append(case_ops)
+        ratios.append(case_ops / calibration_ops)
+    return statistics.median(ops[1:]), statistics.median(ratios[1:])
+
+
+def measure_memory(func):
+    """
+    Returns (peak KiB while running, KiB retained by the result, memory blocks retained
+    by the result) from tracemalloc. The block count is net: blocks allocated and freed
+    during the call don't show up in it.
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        before_size, _ = tracemalloc.get_traced_memory()
+        result = func()
+        after_size, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    del result
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return (peak - before_size) / 1024, (after_size - before_size) / 1024, blocks
+
+
+def run(cases):
+    results = {}
+    for name, func in cases.items():
+        func()  # warm up (imports, regex cache)
+        ops, normalized = measure_ops(func)
+        peak_kib, retained_kib, retained_blocks = measure_memory(func)
+        results[name] = {
+            "ops_per_sec": round(ops, 2),
+            "normalized": round(normalized, 6),
+            "peak_kib": round(peak_kib, 1),
+            "retained_kib": round(retained_kib, 1),
+            "retained_blocks": retained_blocks,
+        }
+        print(f"{name:<36} {ops:>10.1f} ops/s {peak_kib:>10.1f} KiB peak "
+              f"{retained_kib:>9.1f} KiB / {retained_blocks:>6} blocks retained")
+    return results
+
+
+def find_regressions(results, baseline, tolerance):
+    """
+    Cases that got slower (normalized ops/sec) or hungrier (peak memory) than `tolerance`
+    allows. Throughput of micro-cases (see MICRO_CASE_OPS) gets at least MICRO_TOLERANCE.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        speed_tolerance = tolerance
+        if previous.get("ops_per_sec", 0) >= MICRO_CASE_OPS:
+            speed_tolerance = max(tolerance, MICRO_TOLERANCE)
+        if current["normalized"] < previous["normalized"] * (1 - speed_tolerance):
+            change = current["normalized"] / previous["normalized"] - 1
+            regressions.append(f"{name}: throughput {change:+.0%}")
+        # Ignore noise on cases that barely allocate
+        if current["peak_kib"] > max(previous["peak_kib"] * (1 + tolerance), previous["peak_kib"] + 64):
+            regressions.append(f"{name}: peak memory {previous['peak_kib']} -> {current['peak_kib']} KiB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Record the results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="Allowed relative regression (default 0.3).")
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this text.")
+    args = parser.parse_args()
+
+    cases = {name: func for name, func in build_cases().items() if args.filter in name}
+    print(f"json backend: {extractor.JSON_BACKEND}")
+    results = run(cases)
+
+    backend = extractor.JSON_BACKEND
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baselines = json.load(f)
+
+    if args.save_baseline:
+        # Only this backend's cases are replaced; cases timed on the other one stay
+        baselines.setdefault(backend, {}).update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({name: dict(sorted(cases.items())) for name, cases in sorted(baselines.items())}, f, indent=2)
+            f.write("\n")
+        print(f"Baseline for the {backend} backend saved to {args.baseline}")
+        return 0
+
+    baseline = baselines.get(backend)
+    if not baseline:
+        print(f"ERROR: {args.baseline} has no baseline for the {backend} JSON backend; "
+              f"record one with --save-baseline.")
+        return 1
+    regressions = find_regressions(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+# gmaps_scraper_server/admission.py
+from contextlib import contextmanager
+import asyncio
+import itertools
+import os
+import time
+
+from . import metrics
+
+# --- Admission Configuration ---
+# Total number of pages (browser tabs) this worker keeps open at once, across all requests.
+PAGE_BUDGET = max(1, int(os.environ.get("PAGE_BUDGET", 30)))
+
+
+class RequestTicket:
+    """
+    One API request's share of the page budget.
+    Usable wherever an `asyncio.Semaphore` was: `async with ticket:` holds one page slot.
+    """
+
+    def __init__(self, controller, name, limit, order):
+        self._controller = controller
+        self.name = name
+        self.limit = limit
+        self.order = order
+        self.in_use = 0
+        self.granted = 0
+        self.queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self._waiters: list[asyncio.Future] = []
+
+    async def __aenter__(self):
+        await self._controller._acquire(self)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._controller._release(self)
+
+    def _record_wait(self, waited):
+        self.granted += 1
+        self.queue_wait += waited
+        self.max_queue_wait = max(self.max_queue_wait, waited)
+        metrics.observe_stage("admission_wait", waited)
+
+    def summary(self):
+        return {
+            "slots_granted": self.granted,
+            "queue_wait_seconds": round(self.queue_wait, 3),
+            "max_queue_wait_seconds": round(self.max_queue_wait, 3),
+        }
+
+
+class AdmissionController:
+    """
+    Process-wide page budget shared by every endpoint.
+    A freed slot goes to the waiting request that currently holds the fewest slots
+    (oldest request first on ties), so one large job cannot starve small ones.
+    """
+
+    def __init__(self, budget=PAGE_BUDGET):
+        self.budget = budget
+        self.in_use = 0
+        self._tickets: list[RequestTicket] = []
+        self._order = itertools.count()
+
+    @contextmanager
+    def request(self, name="", limit=None):
+        """Registers a request for the duration of the block and yields its ticket."""
+        ticket = RequestTicket(self, name, limit or self.budget, next(self._order))
+        self._tickets.append(ticket)
+        try:
+            yield ticket
+        finally:
+            self._tickets.remove(ticket)
+            for waiter in ticket._waiters:
+                waiter.cancel()
+
+    @property
+    def waiting(self):
+        return sum(len(t._waiters) for t in self._tickets)
+
+    def stats(self):
+        return {
+            "budget": self.budget,
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "active_requests": len(self._tickets),
+        }
+
+    def _eligible(self, ticket):
+        return ticket.in_use < ticket.limit
+
+    def _grant(self, ticket):
+        self.in_use += 1
+        ticket.in_use += 1
+
+    async def _acquire(self, ticket):
+        start = time.monotonic()
+        has_eligible_waiters = any(t._waiters and self._eligible(t) for t in self._tickets)
+        if self.in_use < self.budget and self._eligible(ticket) and not has_eligible_waiters:
+            self._grant(ticket)
+            ticket._record_wait(0.0)
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        ticket._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was granted just as we got cancelled; hand it on.
+                self._release(ticket)
+            elif waiter in ticket._waiters:
+                ticket._waiters.remove(waiter)
+            raise
+        ticket._record_wait(time.monotonic() - start)
+
+    def _release(self, ticket):
+        self.in_use -= 1
+        ticket.in_use -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Hands free slots to waiting requests, fewest-held first."""
+        while self.in_use < self.budget:
+            candidates = [t for t in self._tickets if t._waiters and self._eligible(t)]
+            if not candidates:
+                return
+            ticket = min(candidates, key=lambda t: (t.in_use, t.order))
+            waiter = ticket._waiters.pop(0)
+            if waiter.done():
+                continue
+            self._grant(ticket)
+            waiter.set_result(None)
+
+
+# Create a single, shared instance of the admission controller.
+admission_controller = AdmissionController()
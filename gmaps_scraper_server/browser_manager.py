@@ -1,86 +1,489 @@
 # gmaps_scraper_server/browser_manager.py
-from playwright.async_api import async_playwright, Browser, Playwright
+from playwright.async_api import async_playwright, Browser, BrowserContext, Playwright
+from contextlib import asynccontextmanager
 import asyncio
+import os
 import re
+import time
+
+from . import metrics
+
+# --- Browser Sharding Configuration ---
+# Number of independent Chromium processes per worker. A crash only affects its own shard.
+BROWSER_SHARDS = max(1, int(os.environ.get("BROWSER_SHARDS", 1)))
+
+# --- Context Pool Configuration ---
+# Maximum number of idle contexts kept warm per (lang, block_resources) key.
+CONTEXT_POOL_MAX_IDLE = int(os.environ.get("CONTEXT_POOL_MAX_IDLE", 8))
+# A context is recycled (closed and replaced) after this many checkouts.
+CONTEXT_POOL_MAX_USES = int(os.environ.get("CONTEXT_POOL_MAX_USES", 50))
+# Idle contexts older than this (seconds) are evicted by the janitor.
+CONTEXT_POOL_IDLE_TIMEOUT = float(os.environ.get("CONTEXT_POOL_IDLE_TIMEOUT", 300))
+# Number of contexts pre-warmed for the default key when the browser starts.
+CONTEXT_POOL_WARM = int(os.environ.get("CONTEXT_POOL_WARM", 2))
+# Cookies that survive a state reset, so the consent wall is only handled once per context.
+CONSENT_COOKIE_NAMES = {"CONSENT", "SOCS"}
+# Origins whose localStorage/IndexedDB/caches are wiped on every reset, besides any
+# origin the context's storage state lists. Follows GMAPS_BASE_URL for offline runs.
+STORAGE_RESET_ORIGINS = {
+    "https://www.google.com",
+    "https://consent.google.com",
+    os.environ.get("GMAPS_BASE_URL", "https://www.google.com").rstrip("/"),
+}
+STORAGE_RESET_TYPES = "local_storage,indexeddb,websql,service_workers,cache_storage,file_systems"
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+
+class BrowserShard:
+    """
+    A single Chromium process. Each shard restarts independently and keeps a
+    generation counter so contexts created on a previous process can be detected
+    without locking.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.browser: Browser | None = None
+        # Bumped on every launch/close.
+        self.generation = 0
+        # Writers only: launch/close/restart of this shard.
+        self._lock = asyncio.Lock()
+        # Cleared for the duration of a restart; context creation waits on it only then.
+        self._not_restarting = asyncio.Event()
+        self._not_restarting.set()
+        self.checked_out = 0
+        self.contexts_created = 0
+        self.restarts = 0
+        self.crashes = 0
+
+    @property
+    def is_healthy(self):
+        return bool(self.browser and self.browser.is_connected() and self._not_restarting.is_set())
+
+    @property
+    def open_pages(self):
+        if not self.browser:
+            return 0
+        return sum(len(context.pages) for context in self.browser.contexts)
+
+    def load(self):
+        """Dispatch key: open pages first, then contexts that are checked out but have no page yet."""
+        return (self.open_pages, self.checked_out)
+
+    async def launch(self, playwright, headless, on_disconnected):
+        self.browser = await playwright.chromium.launch(headless=headless)
+        self.generation += 1
+        generation = self.generation
+        self.browser.on("disconnected", lambda _: on_disconnected(self, generation))
+
+    async def close(self):
+        self.generation += 1
+        browser, self.browser = self.browser, None
+        if browser and browser.is_connected():
+            await browser.close()
+
+    async def new_context(self, lang="en", block_resources=False):
+        """
+        Creates and configures a fresh context without taking the lock.
+        Returns (context, generation). Callers only wait when this shard is
+        actually restarting, and a context created on a process that got
+        restarted underneath it is closed and retried.
+        """
+        for _ in range(3):
+            if not self._not_restarting.is_set():
+                await self._not_restarting.wait()
+            browser, generation = self.browser, self.generation
+            if not browser or not browser.is_connected():
+                raise Exception("Browser is not running. Please start it first.")
+            try:
+                context = await self._configure_context(browser, lang, block_resources)
+            except Exception:
+                if generation != self.generation:
+                    continue
+                raise
+            if generation != self.generation:
+                await BrowserManager._close_quietly(context)
+                continue
+            self.contexts_created += 1
+            return context, generation
+        raise Exception(f"Browser shard {self.index} kept restarting while creating a context.")
+
+    @staticmethod
+    async def _configure_context(browser, lang, block_resources):
+        context = await browser.new_context(
+            user_agent=USER_AGENT,
+            java_script_enabled=True,
+            accept_downloads=False,
+            locale=lang,
+        )
+
+        if block_resources:
+            # Block only images to save bandwidth while keeping CSS/Fonts for stability
+            await context.route(
+                re.compile(r"\.(jpg|jpeg|png|gif|svg|ico)$"),
+                lambda route: route.abort()
+            )
+
+        return context
+
+    def stats(self):
+        return {
+            "index": self.index,
+            "healthy": self.is_healthy,
+            "restarting": not self._not_restarting.is_set(),
+            "generation": self.generation,
+            "open_contexts": len(self.browser.contexts) if self.browser else 0,
+            "open_pages": self.open_pages,
+            "checked_out": self.checked_out,
+            "contexts_created": self.contexts_created,
+            "restarts": self.restarts,
+            "crashes": self.crashes,
+        }
+
+
+class _PooledContext:
+    """Bookkeeping for a single context owned by the pool."""
+    __slots__ = ("context", "key", "shard", "generation", "uses", "last_used")
+
+    def __init__(self, context, key, shard, generation):
+        self.context = context
+        self.key = key
+        self.shard = shard
+        self.generation = generation
+        self.uses = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def is_stale(self):
+        return self.generation != self.shard.generation
+
 
 class BrowserManager:
-    def __init__(self):
+    def __init__(self, shard_count=BROWSER_SHARDS):
         self.playwright: Playwright | None = None
-        self.browser: Browser | None = None
+        self.shards: list[BrowserShard] = [BrowserShard(i) for i in range(shard_count)]
         self.headless_config: bool = True
+        # Writers only: start/stop of the whole manager.
         self._lock = asyncio.Lock()
+        self._stopping = False
+        self._background_tasks: set[asyncio.Task] = set()
+        # Idle contexts per (lang, block_resources) key, most recently used last.
+        self._idle: dict[tuple, list[_PooledContext]] = {}
+        self._checked_out: dict[BrowserContext, _PooledContext] = {}
+        self._janitor_task: asyncio.Task | None = None
+        self._pool_counters = {"created": 0, "reused": 0, "recycled": 0, "evicted": 0}
+
+    @property
+    def browser(self) -> Browser | None:
+        """The first shard's browser, kept for callers that predate sharding."""
+        return self.shards[0].browser
 
     async def start_browser(self, headless=True):
-        """Initializes Playwright and launches a persistent browser instance."""
+        """Initializes Playwright and launches one browser instance per shard."""
         async with self._lock:
             await self._start_browser(headless)
+        await self.warm_pool(count=CONTEXT_POOL_WARM)
+        if self._janitor_task is None or self._janitor_task.done():
+            self._janitor_task = asyncio.create_task(self._evict_idle_loop())
 
     async def _start_browser(self, headless=True):
-        """Internal method to start browser without locking."""
+        """Internal method to start browsers without locking."""
         self.headless_config = headless
-        if self.browser and self.browser.is_connected():
+        self._stopping = False
+        pending = [s for s in self.shards if not (s.browser and s.browser.is_connected())]
+        if not pending:
             print("Browser is already running.")
             return
-        
-        print("Starting browser...")
-        self.playwright = await async_playwright().start()
-        self.browser = await self.playwright.chromium.launch(headless=headless)
+
+        print(f"Starting {len(pending)} browser shard(s)...")
+        if not self.playwright:
+            self.playwright = await async_playwright().start()
+        await asyncio.gather(*(
+            s.launch(self.playwright, headless, self._on_disconnected) for s in pending
+        ))
         print("Browser started successfully.")
 
     async def restart_browser(self):
-        """Restarts the browser instance safely."""
+        """Restarts every shard. Each shard only blocks its own callers while restarting."""
         print("Restarting browser instance...")
-        async with self._lock:
+        await asyncio.gather(*(self.restart_shard(s) for s in self.shards))
+
+    async def restart_shard(self, shard):
+        """Restarts a single shard without touching the healthy ones."""
+        async with shard._lock:
+            print(f"Restarting browser shard {shard.index}...")
+            shard._not_restarting.clear()
             try:
-                await self._stop_browser()
-            except Exception as e:
-                print(f"Error stopping browser during restart: {e}")
-            await self._start_browser(headless=self.headless_config)
+                try:
+                    await shard.close()
+                except Exception as e:
+                    print(f"Error stopping browser shard {shard.index} during restart: {e}")
+                await self._drain_pool(shard)
+                if self._stopping or not self.playwright:
+                    return
+                await shard.launch(self.playwright, self.headless_config, self._on_disconnected)
+                shard.restarts += 1
+                metrics.BROWSER_RESTARTS.inc()
+                print(f"Browser shard {shard.index} restarted.")
+            finally:
+                shard._not_restarting.set()
+
+    def _on_disconnected(self, shard, generation):
+        """Restarts a shard whose browser process went away on its own (crash, OOM kill)."""
+        if self._stopping or generation != shard.generation:
+            return
+        print(f"Browser shard {shard.index} disconnected unexpectedly.")
+        shard.crashes += 1
+        metrics.BROWSER_CRASHES.inc()
+        task = asyncio.create_task(self.restart_shard(shard))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
 
     async def stop_browser(self):
-        """Closes the browser and stops Playwright."""
+        """Closes every browser and stops Playwright."""
+        if self._janitor_task:
+            self._janitor_task.cancel()
+            self._janitor_task = None
         async with self._lock:
             await self._stop_browser()
 
     async def _stop_browser(self):
-        """Internal method to stop browser without locking."""
-        if self.browser and self.browser.is_connected():
-            print("Closing browser...")
-            await self.browser.close()
+        """Internal method to stop browsers without locking."""
+        self._stopping = True
+        await self._drain_pool()
+        print("Closing browser...")
+        for shard in self.shards:
+            async with shard._lock:
+                try:
+                    await shard.close()
+                except Exception as e:
+                    print(f"Error closing browser shard {shard.index}: {e}")
         if self.playwright:
             await self.playwright.stop()
-        self.browser = None
         self.playwright = None
         print("Browser stopped.")
 
+    def _pick_shard(self):
+        """Least-loaded dispatch over healthy shards, falling back to one that is restarting."""
+        # A restarting shard has no browser for a moment; creation on it waits for the relaunch
+        running = [s for s in self.shards if s.browser or not s._not_restarting.is_set()]
+        if not running:
+            raise Exception("Browser is not running. Please start it first.")
+        return min(running, key=lambda s: (not s.is_healthy, s.load()))
+
+    async def _new_context(self, lang="en", block_resources=False):
+        """Creates a context on the least-loaded shard. Returns (context, shard, generation)."""
+        shard = self._pick_shard()
+        context, generation = await shard.new_context(lang, block_resources)
+        return context, shard, generation
+
     async def get_context(self, lang="en", block_resources=False):
         """
         Provides a new, isolated browser context for a single request.
         This is much faster than creating a new browser.
+        The caller owns the context and must close it; prefer `pooled_context`
+        for hot paths.
         """
-        async with self._lock:
-            if not self.browser or not self.browser.is_connected():
-                # Try to auto-recover if browser claims to be disconnected, 
-                # though usually better to raise or handle via restart logic.
-                # For now, we raise as before, but the lock ensures we don't 
-                # hit this mid-restart if restart is holding the lock.
-                raise Exception("Browser is not running. Please start it first.")
-            
-            context = await self.browser.new_context(
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                java_script_enabled=True,
-                accept_downloads=False,
-                locale=lang,
-            )
-            
-            if block_resources:
-                # Block only images to save bandwidth while keeping CSS/Fonts for stability
-                await context.route(
-                    re.compile(r"\.(jpg|jpeg|png|gif|svg|ico)$"), 
-                    lambda route: route.abort()
-                )
-                
-            return context
+        context, _, _ = await self._new_context(lang, block_resources)
+        return context
+
+    # --- Context Pool ---
+    async def acquire_context(self, lang="en", block_resources=False):
+        """
+        Checks out a warm context for (lang, block_resources), creating one if the pool is empty.
+        Idle contexts on the least-loaded healthy shard are handed out first.
+        Every acquired context must be handed back with `release_context`.
+        """
+        key = (lang, block_resources)
+        idle = self._idle.get(key)
+        while idle:
+            entry = min(reversed(idle), key=lambda e: (not e.shard.is_healthy, e.shard.load()))
+            idle.remove(entry)
+            if entry.is_stale or self._is_idle_expired(entry):
+                self._pool_counters["evicted"] += 1
+                await self._close_entry(entry)
+                continue
+            return self._check_out(entry, reused=True)
+
+        context, shard, generation = await self._new_context(lang, block_resources)
+        self._pool_counters["created"] += 1
+        return self._check_out(_PooledContext(context, key, shard, generation))
+
+    def _check_out(self, entry, reused=False):
+        entry.uses += 1
+        entry.shard.checked_out += 1
+        self._checked_out[entry.context] = entry
+        if reused:
+            self._pool_counters["reused"] += 1
+        return entry.context
+
+    async def release_context(self, context, discard=False):
+        """
+        Returns a context to the pool after resetting its state.
+        The context is closed instead when `discard` is set, when it has reached
+        CONTEXT_POOL_MAX_USES, when its shard was restarted, or when the pool is full.
+        """
+        entry = self._checked_out.pop(context, None)
+        if entry is None:
+            # Not a pooled context, the caller simply wants it gone.
+            await self._close_quietly(context)
+            return
+        entry.shard.checked_out -= 1
+
+        idle = self._idle.setdefault(entry.key, [])
+        if entry.uses >= CONTEXT_POOL_MAX_USES:
+            self._pool_counters["recycled"] += 1
+            discard = True
+        if discard or entry.is_stale or len(idle) >= CONTEXT_POOL_MAX_IDLE:
+            await self._close_entry(entry)
+            return
+
+        try:
+            await self._reset_context(context)
+        except Exception as e:
+            print(f"Error resetting pooled context, discarding it: {e}")
+            await self._close_entry(entry)
+            return
+
+        # Checked again: the shard may have restarted, or other releases filled the
+        # pool, while the context was being reset.
+        idle = self._idle.setdefault(entry.key, [])
+        if entry.is_stale or len(idle) >= CONTEXT_POOL_MAX_IDLE:
+            await self._close_entry(entry)
+            return
+        entry.last_used = time.monotonic()
+        idle.append(entry)
+
+    @asynccontextmanager
+    async def pooled_context(self, lang="en", block_resources=False):
+        """
+        Async context manager around acquire/release.
+        Contexts that saw an exception are discarded rather than returned to the pool.
+        """
+        context = await self.acquire_context(lang=lang, block_resources=block_resources)
+        discard = False
+        try:
+            yield context
+        except BaseException:
+            discard = True
+            raise
+        finally:
+            await self.release_context(context, discard=discard)
+
+    async def warm_pool(self, lang="en", block_resources=False, count=1):
+        """Pre-creates idle contexts for a key so the first requests skip context setup."""
+        key = (lang, block_resources)
+        needed = min(count, CONTEXT_POOL_MAX_IDLE) - len(self._idle.get(key, []))
+        if needed <= 0:
+            return
+        # Spread the batch over shards round-robin; creation runs in parallel.
+        # A restarting shard has no browser for a moment; creation on it waits for the relaunch
+        running = [s for s in self.shards if s.browser or not s._not_restarting.is_set()]
+        if not running:
+            print("Error warming context pool: Browser is not running.")
+            return
+        shards = [running[i % len(running)] for i in range(needed)]
+        results = await asyncio.gather(
+            *(s.new_context(lang, block_resources) for s in shards),
+            return_exceptions=True,
+        )
+        for shard, result in zip(shards, results):
+            if isinstance(result, Exception):
+                print(f"Error warming context pool: {result}")
+                continue
+            context, generation = result
+            self._pool_counters["created"] += 1
+            self._idle.setdefault(key, []).append(_PooledContext(context, key, shard, generation))
+
+    def pool_stats(self):
+        """Returns a snapshot of the pool for monitoring."""
+        return {
+            "idle": {f"{lang}:{int(block)}": len(entries) for (lang, block), entries in self._idle.items()},
+            "checked_out": len(self._checked_out),
+            **self._pool_counters,
+        }
+
+    def shard_stats(self):
+        """Returns per-shard load, health and restart counters."""
+        return [shard.stats() for shard in self.shards]
+
+    def _is_idle_expired(self, entry):
+        return time.monotonic() - entry.last_used > CONTEXT_POOL_IDLE_TIMEOUT
+
+    async def _reset_context(self, context):
+        """
+        Clears per-request state while keeping consent cookies: pages (and with them
+        sessionStorage), other cookies, permissions, and the localStorage, IndexedDB and
+        caches of the Google origins. Raises when the context can't be cleaned, so the
+        caller retires it instead.
+        """
+        for page in list(context.pages):
+            await page.close()
+        cookies = await context.cookies()
+        kept = [c for c in cookies if c.get("name") in CONSENT_COOKIE_NAMES]
+        await context.clear_cookies()
+        if kept:
+            await context.add_cookies(kept)
+        await context.clear_permissions()
+        await self._clear_storage(context)
+
+    async def _clear_storage(self, context):
+        """Wipes origin storage through a throwaway page's DevTools session (Chromium only)."""
+        state = await context.storage_state()
+        origins = STORAGE_RESET_ORIGINS | {entry["origin"] for entry in state.get("origins", [])}
+        page = await context.new_page()
+        try:
+            session = await context.new_cdp_session(page)
+            for origin in sorted(origins):
+                await session.send("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": STORAGE_RESET_TYPES})
+            await session.detach()
+        finally:
+            await page.close()
+
+    async def _evict_idle_loop(self):
+        """Background janitor closing contexts idle for longer than CONTEXT_POOL_IDLE_TIMEOUT."""
+        interval = max(1.0, CONTEXT_POOL_IDLE_TIMEOUT / 2)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                print(f"Error evicting idle contexts: {e}")
+
+    async def evict_idle(self):
+        """Closes every idle context past its idle timeout."""
+        for key, idle in list(self._idle.items()):
+            expired = [e for e in idle if self._is_idle_expired(e)]
+            if not expired:
+                continue
+            self._idle[key] = [e for e in idle if e not in expired]
+            for entry in expired:
+                self._pool_counters["evicted"] += 1
+                await self._close_entry(entry)
+
+    async def _drain_pool(self, shard=None):
+        """
+        Closes idle contexts, either all of them or only those of one shard.
+        Checked-out contexts are closed on release.
+        """
+        drained = []
+        for key, idle in list(self._idle.items()):
+            keep = [e for e in idle if shard is not None and e.shard is not shard]
+            drained.extend(e for e in idle if e not in keep)
+            self._idle[key] = keep
+        for entry in drained:
+            await self._close_entry(entry)
+
+    async def _close_entry(self, entry):
+        await self._close_quietly(entry.context)
+
+    @staticmethod
+    async def _close_quietly(context):
+        try:
+            await context.close()
+        except Exception as e:
+            print(f"Error closing context: {e}")
 
 # Create a single, shared instance of the browser manager.
 # This instance will be imported by other modules.
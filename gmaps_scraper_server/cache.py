@@ -0,0 +1,167 @@
+# gmaps_scraper_server/cache.py
+from collections import OrderedDict
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# --- Cache Configuration ---
+# SQLite file shared by every gunicorn worker on the box; survives restarts.
+CACHE_DB_PATH = os.environ.get("CACHE_DB_PATH", "gmaps_cache.sqlite3")
+# Place details are reused for this many seconds. 0 disables the place cache.
+PLACE_CACHE_TTL = float(os.environ.get("PLACE_CACHE_TTL", 24 * 3600))
+# Entries kept in each worker's in-memory LRU tier.
+PLACE_CACHE_MEMORY_SIZE = int(os.environ.get("PLACE_CACHE_MEMORY_SIZE", 2000))
+# Search result link lists are reused for this many seconds. 0 disables the search cache.
+SEARCH_CACHE_TTL = float(os.environ.get("SEARCH_CACHE_TTL", 6 * 3600))
+SEARCH_CACHE_MEMORY_SIZE = int(os.environ.get("SEARCH_CACHE_MEMORY_SIZE", 500))
+# Per-place review state (seen review ids, newest timestamp) for incremental review runs.
+# Kept this many seconds after the last run. 0 disables the store.
+REVIEW_STATE_TTL = float(os.environ.get("REVIEW_STATE_TTL", 30 * 24 * 3600))
+REVIEW_STATE_MEMORY_SIZE = int(os.environ.get("REVIEW_STATE_MEMORY_SIZE", 2000))
+# Expired rows are purged from SQLite every this many writes.
+PURGE_EVERY_WRITES = 500
+
+
+class TieredCache:
+    """
+    A TTL cache with a per-process LRU tier in front of a SQLite tier.
+    Values must be JSON-serializable; every `get` returns a fresh copy.
+    The methods block on SQLite, so call them through `asyncio.to_thread` from async code.
+    """
+
+    def __init__(self, name, ttl, memory_size, db_path=CACHE_DB_PATH):
+        if not re.fullmatch(r"[a-z_]+", name):
+            raise ValueError(f"Invalid cache name: {name!r}")
+        self.name = name
+        self.ttl = ttl
+        self.memory_size = memory_size
+        self.db_path = db_path
+        # key -> (stored_at, json_str), least recently used first
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._writes = 0
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+            # WAL lets every worker read while one of them writes.
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.name} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _is_fresh(self, stored_at, max_age):
+        limit = self.ttl if max_age is None else min(self.ttl, max_age)
+        return time.time() - stored_at <= limit
+
+    def get(self, key, max_age=None):
+        """
+        Returns the cached value for `key`, or None on a miss.
+        `max_age` (seconds) tightens the TTL for this lookup only.
+        """
+        if not self.enabled or (max_age is not None and max_age <= 0):
+            return None
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and self._is_fresh(entry[0], max_age):
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return json.loads(entry[1])
+
+            try:
+                row = self._connection().execute(
+                    f"SELECT value, stored_at FROM {self.name} WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"Error reading {self.name} cache: {e}")
+                row = None
+
+            if row and self._is_fresh(row[1], max_age):
+                self._remember(key, row[1], row[0])
+                self.counters["disk_hits"] += 1
+                return json.loads(row[0])
+
+            self.counters["misses"] += 1
+            return None
+
+    def set(self, key, value):
+        """Stores `value` in both tiers."""
+        if not self.enabled:
+            return
+        value_json = json.dumps(value)
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, stored_at, value_json)
+            self.counters["writes"] += 1
+            try:
+                conn = self._connection()
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.name} (key, value, stored_at) VALUES (?, ?, ?)",
+                    (key, value_json, stored_at),
+                )
+                self._writes += 1
+                if self._writes % PURGE_EVERY_WRITES == 0:
+                    conn.execute(f"DELETE FROM {self.name} WHERE stored_at < ?", (stored_at - self.ttl,))
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Error writing {self.name} cache: {e}")
+
+    def _remember(self, key, stored_at, value_json):
+        self._memory[key] = (stored_at, value_json)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+        hits = lookups - self.counters["misses"]
+        return {
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl,
+            "memory_entries": len(self._memory),
+            **self.counters,
+            "hit_ratio": round(hits / lookups, 3) if lookups else None,
+        }
+
+
+def place_cache_key(link, lang="en"):
+    """
+    Canonical identity of a place link: the `0x...:0x...` feature id (whose second
+    half is the CID) plus the language. Returns None when the link doesn't carry one.
+    """
+    match = re.search(r'!1s(0x[0-9a-fA-F]+:0x[0-9a-fA-F]+)', link or "")
+    if not match:
+        match = re.search(r'ftid=(0x[0-9a-fA-F]+:0x[0-9a-fA-F]+)', link or "")
+    if not match:
+        return None
+    return f"{lang}:{match.group(1).lower()}"
+
+
+def search_cache_key(query, lang="en"):
+    """Normalizes a search query (case, whitespace) plus language into a cache key."""
+    return f"{lang}:{' '.join(query.lower().split())}"
+
+
+# Shared cache of `extract_place_data` output.
+place_cache = TieredCache("place_details", PLACE_CACHE_TTL, PLACE_CACHE_MEMORY_SIZE)
+# Shared cache of query -> ordered place links harvested from the results feed.
+search_cache = TieredCache("search_links", SEARCH_CACHE_TTL, SEARCH_CACHE_MEMORY_SIZE)
+# Shared store of what previous review runs already returned, keyed by place id.
+review_store = TieredCache("review_state", REVIEW_STATE_TTL, REVIEW_STATE_MEMORY_SIZE)
@@ -0,0 +1,114 @@
+# gmaps_scraper_server/extraction_executor.py
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from . import extractor, profiling
+
+# --- Extraction Executor Configuration ---
+# Where the CPU-bound extraction work (page parsing, review ranking) runs:
+#   "thread"  - the default thread pool; simple, but shares the GIL with the event loop
+#   "process" - a pool of worker processes, so extraction scales across cores
+#   "inline"  - directly on the event loop (debugging and profiling only)
+EXTRACTION_EXECUTOR = os.environ.get("EXTRACTION_EXECUTOR", "thread").lower()
+EXTRACTION_MODES = ("thread", "process", "inline")
+# Worker processes per API worker. By default the cores are split evenly between
+# the gunicorn workers, so a fully loaded box runs one extraction per core.
+# gunicorn_conf.py exports its resolved worker count; without gunicorn there is one.
+EXTRACTION_WORKERS = int(os.environ.get("EXTRACTION_WORKERS", 0)) or max(
+    1, (os.cpu_count() or 1) // int(os.environ.get("GUNICORN_WORKERS", 1))
+)
+
+
+def _extract(html_content, all_reviews, require_blob, max_reviews, candidate_pool, review_seed):
+    timings = {}
+    place_data = extractor.extract_place_data(
+        html_content, all_reviews, require_blob,
+        max_reviews=max_reviews, candidate_pool=candidate_pool, timings=timings, review_seed=review_seed,
+    )
+    return place_data, timings
+
+
+class ExtractionExecutor:
+    """
+    Runs extraction off the event loop in the configured mode and tracks how many
+    jobs are queued or running (`queue_depth`), which /stats reports.
+    The process pool is started on first use and replaced if a worker dies.
+    """
+
+    def __init__(self, mode=EXTRACTION_EXECUTOR, workers=EXTRACTION_WORKERS):
+        if mode not in EXTRACTION_MODES:
+            raise ValueError(f"EXTRACTION_EXECUTOR must be one of {EXTRACTION_MODES}, got {mode!r}")
+        self.mode = mode
+        self.workers = workers
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.completed = 0
+        self._pool: ProcessPoolExecutor | None = None
+
+    def _process_pool(self):
+        if self._pool is None:
+            # Not forked: the API process runs an event loop and Playwright's threads
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def run(self, func, *args):
+        """Calls `func(*args)` in the configured mode. In process mode both must be picklable."""
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            if self.mode == "inline":
+                return func(*args)
+            if self.mode == "thread":
+                return await asyncio.to_thread(func, *args)
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self._process_pool(), func, *args)
+            except BrokenProcessPool:
+                self._pool = None
+                raise
+        finally:
+            self.queue_depth -= 1
+            self.completed += 1
+
+    async def extract_place_data(self, html_content, all_reviews=None, require_blob=False,
+                                 max_reviews=extractor.REVIEW_SELECTION_COUNT,
+                                 candidate_pool=extractor.REVIEW_CANDIDATE_POOL_SIZE, review_seed=None,
+                                 cpu_samples=None):
+        """
+        Returns (place_data, phase timings) for a page. With a `cpu_samples` Counter, the
+        extraction is stack-sampled wherever it runs and the samples are added to it.
+        """
+        # In process mode the page is pickled to the worker (UTF-8 encoded once by pickle)
+        func, args = _extract, (html_content, all_reviews, require_blob, max_reviews, candidate_pool, review_seed)
+        if cpu_samples is None:
+            return await self.run(func, *args)
+        result, samples = await self.run(profiling.sample_call, func, *args)
+        cpu_samples.update(samples)
+        return result
+
+    async def select_reviews(self, all_reviews, review_budget):
+        """Ranks, samples and parses raw reviews for `review_budget`."""
+        return await self.run(
+            extractor.process_and_select_reviews, list(all_reviews),
+            review_budget.max_reviews, review_budget.candidate_pool, review_budget.seed,
+        )
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "workers": self.workers if self.mode == "process" else None,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "completed": self.completed,
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Create a single, shared instance of the extraction executor.
+extraction_executor = ExtractionExecutor()
@@ -1,9 +1,26 @@
 # gmaps_scraper_server/extractor.py
 
+import heapq
 import json
 import re
 import random # <--- ADDED: For random selection of reviews
 import os
+import threading
+import time
+from datetime import datetime, timezone
+
+# orjson parses the multi-megabyte page state several times faster when it is installed.
+try:
+    import orjson
+    JSON_BACKEND = "orjson"
+    json_loads = orjson.loads
+except ImportError:
+    JSON_BACKEND = "json"
+    json_loads = json.loads
+
+# How the inner data blob is decoded: "full" parses it in one go, "lazy" indexes the
+# top-level elements and only parses the ones the field getters read (see `LazyBlob`).
+BLOB_DECODING = os.environ.get("BLOB_DECODING", "full").lower()
 
 def safe_get(data, *keys):
     """
@@ -39,70 +56,121 @@ REVIEW_CANDIDATE_POOL_SIZE = 300
 PLACEHOLDER_USERNAMES = {"google user", "anonymous user", "unknown", "profile name"}
 
 # === REVIEW SORTING AND SELECTION LOGIC ==================
-def process_and_select_reviews(reviews_data):
+def review_rank_key(review):
     """
-    Sorts, filters, and selects a random subset of reviews based on predefined quality criteria.
-    This function processes raw review data before full parsing to optimize performance.
+    The ranking key of a raw review (`review_item[0]`); higher keys rank first.
+    Only the data needed for ranking is read, the review is not parsed.
+    """
+    description = safe_get(review, 2, 15, 0, 0) or ""
+    profile_pic_raw = safe_get(review, 1, 4, 5, 1)
+    date_parts = safe_get(review, 2, 2, 0, 1, 21, 6, 8)
+    author_name = (safe_get(review, 1, 4, 5, 0) or "").lower()
+
+    # --- Calculate ranking criteria based on the hierarchy ---
+    # 1. Length of review description (longer is better)
+    desc_len = len(description)
+    # 2. Has a profile picture
+    has_pic = bool(profile_pic_raw)
+    # 3. Has a specific datetime
+    has_datetime = isinstance(date_parts, list) and len(date_parts) >= 3
+    # 4. Has a "real" username (not a placeholder)
+    is_real_name = author_name not in PLACEHOLDER_USERNAMES
+
+    # Python compares tuples element-by-element, matching the hierarchical ranking.
+    return (desc_len, has_pic, has_datetime, is_real_name)
+
+
+class ReviewRanker:
+    """
+    Keeps the `pool_size` best raw reviews seen so far in a bounded min-heap, so reviews
+    can be ranked page by page as they arrive and only the candidate pool stays in memory.
+    Ties keep arrival order (earlier ranks higher), as a stable descending sort would.
+    """
+
+    def __init__(self, pool_size=REVIEW_CANDIDATE_POOL_SIZE):
+        self.pool_size = pool_size
+        # Reviews with review data ranked so far (entries without it are skipped)
+        self.ranked = 0
+        self._heap = []
+
+    def add(self, review_item):
+        review = safe_get(review_item, 0)
+        if not review:
+            return
+        # The heap root is the worst candidate: lowest key, latest arrival on ties
+        entry = (review_rank_key(review), -self.ranked, review_item)
+        self.ranked += 1
+        if len(self._heap) < self.pool_size:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def extend(self, review_items):
+        for review_item in review_items:
+            self.add(review_item)
+
+    def candidates(self):
+        """The candidate pool as raw reviews, best first."""
+        return [item for *_, item in sorted(self._heap, key=lambda entry: entry[:2], reverse=True)]
+
+    def select(self, selection_count=REVIEW_SELECTION_COUNT, seed=None):
+        """Samples `selection_count` candidates and parses only those."""
+        candidate_pool = self.candidates()
+        if len(candidate_pool) <= selection_count:
+            # If the pool is smaller than our target, take all of them
+            selected_reviews_raw = candidate_pool
+        else:
+            # Otherwise, randomly sample the desired count from the high-quality pool.
+            # A seed makes the sample reproducible.
+            rng = random.Random(seed) if seed is not None else random
+            selected_reviews_raw = rng.sample(candidate_pool, selection_count)
+        return parse_user_reviews(selected_reviews_raw)
+
+
+def process_and_select_reviews(reviews_data, selection_count=REVIEW_SELECTION_COUNT, pool_size=REVIEW_CANDIDATE_POOL_SIZE, seed=None):
+    """
+    Ranks, filters, and selects a random subset of reviews based on predefined quality criteria.
+    Ranking runs on the raw reviews; only the selected ones are parsed.
     
     Args:
         reviews_data (list): The raw list of review data from the 'listugcposts' RPC response.
+        selection_count (int): How many reviews to select.
+        pool_size (int): How many top-ranked reviews the selection is sampled from.
+        seed (int): Optional seed for a reproducible sample.
 
     Returns:
-        list: A list of 100 (or fewer) parsed user review dictionaries.
+        list: A list of `selection_count` (or fewer) parsed user review dictionaries.
     """
     if not reviews_data:
         return []
+    ranker = ReviewRanker(pool_size)
+    ranker.extend(reviews_data)
+    return ranker.select(selection_count, seed)
 
-    ranked_reviews = []
-    for review_item in reviews_data:
-        review = safe_get(review_item, 0)
-        if not review:
-            continue
 
-        # --- Extract only the data needed for ranking ---
-        description = safe_get(review, 2, 15, 0, 0) or ""
-        profile_pic_raw = safe_get(review, 1, 4, 5, 1)
-        date_parts = safe_get(review, 2, 2, 0, 1, 21, 6, 8)
-        author_name = (safe_get(review, 1, 4, 5, 0) or "").lower()
-
-        # --- Calculate ranking criteria based on the hierarchy ---
-        # 1. Length of review description (longer is better)
-        desc_len = len(description)
-        # 2. Has a profile picture
-        has_pic = bool(profile_pic_raw)
-        # 3. Has a specific datetime
-        has_datetime = isinstance(date_parts, list) and len(date_parts) >= 3
-        # 4. Has a "real" username (not a placeholder)
-        is_real_name = author_name not in PLACEHOLDER_USERNAMES
-        
-        # Create a sort key tuple. Python sorts tuples element-by-element,
-        # perfectly matching our hierarchical ranking need.
-        sort_key = (desc_len, has_pic, has_datetime, is_real_name)
-        
-        # Store the key along with the original raw review data
-        ranked_reviews.append((sort_key, review_item))
-
-    # Sort the list of (key, review) tuples. `reverse=True` ensures that
-    # higher lengths and True values are ranked first.
-    ranked_reviews.sort(key=lambda x: x[0], reverse=True)
-
-    # Extract the sorted raw review data
-    sorted_raw_reviews = [item for sort_key, item in ranked_reviews]
-
-    # Create a candidate pool from the top-ranked reviews
-    candidate_pool = sorted_raw_reviews[:REVIEW_CANDIDATE_POOL_SIZE]
-
-    # Randomly select the final set of reviews from the pool
-    if len(candidate_pool) <= REVIEW_SELECTION_COUNT:
-        # If the pool is smaller than our target, take all of them
-        selected_reviews_raw = candidate_pool
-    else:
-        # Otherwise, randomly sample the desired count from the high-quality pool
-        selected_reviews_raw = random.sample(candidate_pool, REVIEW_SELECTION_COUNT)
-    
-    # --- Final Step: Parse ONLY the selected high-quality reviews ---
-    # print(f"Selected {len(selected_reviews_raw)} reviews for parsing from a total of {len(reviews_data)}.")
-    return parse_user_reviews(selected_reviews_raw)
+def get_review_id(review_item):
+    """Returns the stable id of a raw 'listugcposts' review, or None."""
+    review_id = safe_get(review_item, 0, 0)
+    return review_id if isinstance(review_id, str) and review_id else None
+
+
+def get_review_timestamp(review_item):
+    """
+    Returns when a raw review was posted as epoch microseconds, or None.
+    Falls back to the day-precision [Y, M, D] date when the timestamp field is absent.
+    """
+    review = safe_get(review_item, 0)
+    timestamp = safe_get(review, 1, 2)
+    if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        return int(timestamp)
+    date_parts = safe_get(review, 2, 2, 0, 1, 21, 6, 8)
+    if isinstance(date_parts, list) and len(date_parts) >= 3:
+        try:
+            posted = datetime(int(date_parts[0]), int(date_parts[1]), int(date_parts[2]), tzinfo=timezone.utc)
+        except (ValueError, TypeError):
+            return None
+        return int(posted.timestamp() * 1_000_000)
+    return None
 
 
 def parse_user_reviews(reviews_data):
@@ -255,16 +323,33 @@ def get_categories_from_html(html):
     matches = re.findall(r'jsaction="[^"]*category[^"]*"[^>]*>(?:<span[^>]*>)?([^<]+)(?:</span>)?</button>', html, re.IGNORECASE)
     return [m.strip() for m in matches if m.strip()]
 
+INITIAL_STATE_MARKER = ";window.APP_INITIALIZATION_STATE"
+INITIAL_STATE_END_MARKER = ";window.APP_FLAGS"
+INITIAL_STATE_ASSIGNMENT = re.compile(r'\s*=\s*')
+
 def extract_initial_json(html_content):
     """
     Extracts the JSON string assigned to window.APP_INITIALIZATION_STATE from HTML content.
     """
+    located = locate_initial_json(html_content)
+    return located[0] if located else None
+
+def locate_initial_json(html_content):
+    """
+    Finds the window.APP_INITIALIZATION_STATE assignment in HTML content.
+    Returns (json_str, start, end) where [start:end] spans the whole assignment, or None.
+    Plain substring searches keep this linear on multi-megabyte pages.
+    """
     try:
-        match = re.search(r';window\.APP_INITIALIZATION_STATE\s*=\s*(.*?);window\.APP_FLAGS', html_content, re.DOTALL)
-        if match:
-            json_str = match.group(1)
+        start = html_content.find(INITIAL_STATE_MARKER)
+        assignment = None
+        if start != -1:
+            assignment = INITIAL_STATE_ASSIGNMENT.match(html_content, start + len(INITIAL_STATE_MARKER))
+        end = html_content.find(INITIAL_STATE_END_MARKER, assignment.end()) if assignment else -1
+        if end != -1:
+            json_str = html_content[assignment.end():end]
             if json_str.strip().startswith(('[', '{')):
-                return json_str
+                return json_str, start, end + len(INITIAL_STATE_END_MARKER)
             else:
                 print("Extracted content doesn't look like valid JSON start.")
                 return None
@@ -283,20 +368,29 @@ def parse_json_data(json_str):
     if not json_str:
         return None
     try:
-        initial_data = json.loads(json_str)
-        
-        # DEBUG - save the initial data to a file for inspection
-        # with open('initial_data.json', 'w') as f:
-        #     json.dump(initial_data, f, indent=2)
+        initial_data = json_loads(json_str)
+    except ValueError as e:
+        print(f"Error parsing JSON data: {e}")
+        return None
+
+    # DEBUG - save the initial data to a file for inspection
+    # with open('initial_data.json', 'w') as f:
+    #     json.dump(initial_data, f, indent=2)
+    return find_data_blob(initial_data)
 
+def find_data_blob(initial_data):
+    """
+    Finds the dynamic key in the already parsed APP_INITIALIZATION_STATE and decodes
+    the main data blob from it.
+    """
+    try:
         app_state = safe_get(initial_data, 3)
         if not isinstance(app_state, dict):
             if isinstance(app_state, list) and len(app_state) > 6:
                 data_blob_str = safe_get(app_state, 6)
                 if isinstance(data_blob_str, str) and data_blob_str.startswith(")]}'"):
                     json_str_inner = data_blob_str.split(")]}'\n", 1)[1]
-                    actual_data = json.loads(json_str_inner)
-                    return safe_get(actual_data, 6)
+                    return decode_data_blob(json_str_inner)
             return None
 
         for i in range(65, 91):  # ASCII for 'A' through 'Z'
@@ -306,105 +400,153 @@ def parse_json_data(json_str):
                 if isinstance(data_blob_str, str) and data_blob_str.startswith(")]}'"):
                     print(f"Found data blob under dynamic key: '{key}'")
                     json_str_inner = data_blob_str.split(")]}'\n", 1)[1]
-                    actual_data = json.loads(json_str_inner)
-                    final_blob = safe_get(actual_data, 6)
+                    final_blob = decode_data_blob(json_str_inner)
                     if isinstance(final_blob, list):
                         return final_blob
         
         print("Could not find the data blob using dynamic key search.")
         return None
 
-    except (json.JSONDecodeError, IndexError, TypeError) as e:
+    except (ValueError, IndexError, TypeError) as e:
         print(f"Error parsing JSON data: {e}")
         return None
 
 
-# --- Field Extraction Functions ---
-def get_main_name(data):
-    return safe_get(data, 11)
+# --- Lazy Blob Decoding ---
+# JSON strings and container brackets; everything else is scalars and commas.
+JSON_TOKEN_PATTERN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{}]')
 
 
-def get_place_id(data):
-    # Primary PlaceID is at [78] as per newest analysis. Fallback to [10].
-    return safe_get(data, 78) or safe_get(data, 10)
+def _strip_span(text, start, end):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def iter_array_elements(text, start):
+    """
+    Yields the (start, end) span of each element of the JSON array opening at text[start],
+    without decoding anything. Stops at the array's closing bracket.
+    """
+    depth = 0
+    element_start = start + 1
+    pos = start
+    for match in JSON_TOKEN_PATTERN.finditer(text, start):
+        if depth == 1:
+            # Between tokens at array level there are only scalars and separating commas
+            comma = text.find(",", pos, match.start())
+            while comma != -1:
+                yield _strip_span(text, element_start, comma)
+                element_start = comma + 1
+                comma = text.find(",", element_start, match.start())
+        token = text[match.start()]
+        if token in "[{":
+            depth += 1
+        elif token in "]}":
+            depth -= 1
+            if depth == 0:
+                span = _strip_span(text, element_start, match.start())
+                if span[0] < span[1]:
+                    yield span
+                return
+        pos = match.end()
+    raise ValueError("Unterminated JSON array")
+
+
+class LazyBlob(list):
+    """
+    A read-only list view of a JSON array that only decodes the elements that are read.
+    Element boundaries are indexed once; each element is parsed on first access and kept.
+    Being a list, it works with `safe_get` and every getter unchanged.
+    """
 
+    def __init__(self, text, spans):
+        super().__init__()
+        self._text = text
+        self._spans = spans
+        self._decoded = {}
+
+    @classmethod
+    def from_inner_json(cls, json_str_inner, index):
+        """Indexes element `index` of the top-level array in `json_str_inner` (the data blob)."""
+        start = _strip_span(json_str_inner, 0, len(json_str_inner))[0]
+        if json_str_inner[start:start + 1] != "[":
+            raise ValueError("Inner data is not a JSON array")
+        # Walk past the preceding elements only; the blob itself is scanned once, below
+        element_start = start + 1
+        elements = iter_array_elements(json_str_inner, start)
+        for _ in range(index):
+            span = next(elements, None)
+            if span is None:
+                raise ValueError(f"No element at index {index} of the inner data")
+            element_start = json_str_inner.find(",", span[1]) + 1
+        element_start = _strip_span(json_str_inner, element_start, len(json_str_inner))[0]
+        if element_start == 0 or json_str_inner[element_start:element_start + 1] != "[":
+            raise ValueError(f"No array at index {index} of the inner data")
+        return cls(json_str_inner, list(iter_array_elements(json_str_inner, element_start)))
+
+    def __len__(self):
+        return len(self._spans)
+
+    def __bool__(self):
+        return bool(self._spans)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self._spans)
+        if not 0 <= index < len(self._spans):
+            raise IndexError("LazyBlob index out of range")
+        if index not in self._decoded:
+            start, end = self._spans[index]
+            self._decoded[index] = json_loads(self._text[start:end])
+        return self._decoded[index]
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self._spans)))
+
+    def elements_containing(self, marker):
+        """Indices of the elements whose raw JSON text contains `marker`, in order."""
+        return [i for i, (start, end) in enumerate(self._spans) if self._text.find(marker, start, end) != -1]
+
+
+def decode_data_blob(json_str_inner):
+    """Decodes the main data blob (element 6 of the inner data) per BLOB_DECODING."""
+    if BLOB_DECODING == "lazy":
+        try:
+            return LazyBlob.from_inner_json(json_str_inner, 6)
+        except ValueError as e:
+            print(f"Lazy blob decoding failed, parsing in full: {e}")
+    return safe_get(json_loads(json_str_inner), 6)
 
-def get_gps_coordinates(data):
-    lat = safe_get(data, 9, 2)
-    lon = safe_get(data, 9, 3)
+
+# --- Field Extraction Functions ---
+# Post-processors turn the raw node found at a field's path into the output value.
+def _coordinates(node):
+    lat = safe_get(node, 2)
+    lon = safe_get(node, 3)
     if lat is not None and lon is not None:
         return {"latitude": lat, "longitude": lon}
     return None
 
 
-def get_complete_address(data):
-    address_parts = safe_get(data, 2)
+def _joined_address(address_parts):
     if isinstance(address_parts, list):
         formatted = ", ".join(filter(None, address_parts))
         return formatted if formatted else None
     return None
 
 
-def get_rating(data):
-    return safe_get(data, 4, 7)
-
-
-def get_reviews_count(data):
-    return safe_get(data, 4, 8)
-
-
-def get_website(data):
-    return safe_get(data, 7, 0)
-
-
-def _find_phone_recursively(data_structure):
-    if isinstance(data_structure, list):
-        if len(data_structure) >= 2 and \
-           isinstance(data_structure[0], str) and "call_googblue" in data_structure[0] and \
-           isinstance(data_structure[1], str):
-            phone_number_str = data_structure[1]
-            standardized_number = re.sub(r'\D', '', phone_number_str)
-            if standardized_number:
-                return standardized_number
-        for item in data_structure:
-            found_phone = _find_phone_recursively(item)
-            if found_phone:
-                return found_phone
-    elif isinstance(data_structure, dict):
-        for key, value in data_structure.items():
-            found_phone = _find_phone_recursively(value)
-            if found_phone:
-                return found_phone
-    return None
-
-
-def get_phone_number(data_blob):
-    found_phone = _find_phone_recursively(data_blob)
-    return found_phone if found_phone else None
-
-
-def get_categories(data):
-    # Extracted as an []any at index 13.
-    raw_cats = safe_get(data, 13)
+def _string_list(raw_cats):
     if isinstance(raw_cats, list):
         return [str(c) for c in raw_cats if isinstance(c, str)]
     return []
 
 
-def get_thumbnail(data):
-    return safe_get(data, 72, 0, 1, 6, 0)
-
-
-def get_status(data):
-    """
-    Extracts the business status (e.g., 'Open', 'Closed', 'Temporarily closed').
-    The index path [34, 4, 4] is derived from analysis of the Go project.
-    """
-    return safe_get(data, 34, 4, 4)
-
-
-def get_open_hours(data):
-    hours_list = safe_get(data, 34, 1)
+def _open_hours(hours_list):
     if not isinstance(hours_list, list):
         return None
     open_hours = {}
@@ -417,13 +559,7 @@ def get_open_hours(data):
     return open_hours if open_hours else None
 
 
-def get_price_range(data):
-    """Extracts the price range of the business (e.g., $, $$, $$$)."""
-    return safe_get(data, 4, 2)
-
-
-def get_images(data):
-    images_list = safe_get(data, 171, 0)
+def _images(images_list):
     if not isinstance(images_list, list):
         return None
     images = []
@@ -435,13 +571,8 @@ def get_images(data):
     return images if images else None
 
 
-def get_about(data):
-    """
-    Extracts the 'About' section, which contains details like Accessibility, Offerings, etc.
-    """
-    # The entire "About" block is located at index path [100, 1] in the main data blob.
-    about_sections_raw = safe_get(data, 100, 1)
-    
+def _about_sections(about_sections_raw):
+    """Parses the 'About' tab sections (Accessibility, Offerings, ...) and their options."""
     if not isinstance(about_sections_raw, list):
         return None
 
@@ -481,10 +612,174 @@ def get_about(data):
     return parsed_about_sections if parsed_about_sections else None
 
 
-def get_description(data):
-    """Extracts the brief description of the business."""
-    # Path based on Go project: darray[32][1][1]
-    return safe_get(data, 32, 1, 1)
+# Where each field lives in the main data blob: field -> (index paths, post-processor).
+# The first truthy path wins (like `a or b`); the post-processor, if any, gets that value.
+# A Maps layout change is an edit to this table.
+FIELD_SPECS = {
+    "name": ([[11]], None),
+    # Primary PlaceID is at [78] as per newest analysis. Fallback to [10].
+    "place_id": ([[78], [10]], None),
+    "coordinates": ([[9]], _coordinates),
+    "address": ([[2]], _joined_address),
+    "rating": ([[4, 7]], None),
+    "reviews_count": ([[4, 8]], None),
+    "price_range": ([[4, 2]], None),
+    "website": ([[7, 0]], None),
+    "categories": ([[13]], _string_list),
+    "thumbnail": ([[72, 0, 1, 6, 0]], None),
+    # Business status text, e.g. 'Temporarily closed' (path from the Go project)
+    "business_status": ([[34, 4, 4]], None),
+    "open_hours": ([[34, 1]], _open_hours),
+    "images": ([[171, 0]], _images),
+    # The beginning description text in the 'About' tab (Go project: darray[32][1][1])
+    "about": ([[32, 1, 1]], None),
+    # The listed attributes in the 'About' tab
+    "attributes": ([[100, 1]], _about_sections),
+}
+
+
+def compile_field_specs(specs):
+    """
+    Compiles a field-spec table into one function `extract(blob) -> {field: value}`.
+    The generated code resolves every index-path prefix exactly once, so fields that
+    share a prefix (e.g. [4, 7] and [4, 8]) share the traversal; each hop has the
+    same semantics as `safe_get`.
+    """
+    namespace = {"isinstance": isinstance, "len": len, "list": list}
+    lines = ["def extract(node):"]
+    names = {(): "node"}
+    for field, (paths, post_process) in specs.items():
+        for path in paths:
+            for depth in range(1, len(path) + 1):
+                prefix = tuple(path[:depth])
+                if prefix in names:
+                    continue
+                parent, index = names[prefix[:-1]], prefix[-1]
+                names[prefix] = "n_" + "_".join(map(str, prefix))
+                lines.append(
+                    f"    {names[prefix]} = {parent}[{index}] "
+                    f"if isinstance({parent}, list) and len({parent}) > {index} else None"
+                )
+    lines.append("    return {")
+    for field, (paths, post_process) in specs.items():
+        value = " or ".join(names[tuple(path)] for path in paths)
+        if post_process:
+            namespace[f"post_{field}"] = post_process
+            value = f"post_{field}({value})"
+        lines.append(f"        {field!r}: {value},")
+    lines.append("    }")
+    exec("\n".join(lines), namespace)
+    return namespace["extract"]
+
+
+extract_blob_fields = compile_field_specs(FIELD_SPECS)
+
+
+def _field_getter(field):
+    extract = compile_field_specs({field: FIELD_SPECS[field]})
+    def getter(data):
+        return extract(data)[field]
+    getter.__name__ = f"get_{field}"
+    return getter
+
+
+# Single-field getters, kept for callers that need one value.
+get_main_name = _field_getter("name")
+get_place_id = _field_getter("place_id")
+get_gps_coordinates = _field_getter("coordinates")
+get_complete_address = _field_getter("address")
+get_rating = _field_getter("rating")
+get_reviews_count = _field_getter("reviews_count")
+get_price_range = _field_getter("price_range")
+get_website = _field_getter("website")
+get_categories = _field_getter("categories")
+get_thumbnail = _field_getter("thumbnail")
+get_status = _field_getter("business_status")
+get_open_hours = _field_getter("open_hours")
+get_images = _field_getter("images")
+get_description = _field_getter("about")
+get_about = _field_getter("attributes")
+
+
+def _phone_digits(node):
+    phone_number_str = safe_get(node, 1)
+    if isinstance(phone_number_str, str):
+        standardized_number = re.sub(r'\D', '', phone_number_str)
+        if standardized_number:
+            return standardized_number
+    return None
+
+
+# Fields found by searching the blob rather than by a fixed path: field -> (marker,
+# post-processor). Candidates are the lists whose first item is a string containing the
+# marker, in depth-first order; the first one the post-processor turns into a value wins.
+MARKER_SPECS = {
+    "phone": ("call_googblue", _phone_digits),
+}
+
+
+class MarkerIndex:
+    """
+    Index of marker string -> the lists whose first item is a string containing it, in
+    depth-first order, built by one iterative walk of the blob shared by all markers.
+    The walk only advances as far as lookups need, so a field found early doesn't pay
+    for the rest of the blob. With a LazyBlob only the top-level elements whose raw
+    text mentions a marker are decoded and walked.
+    """
+
+    def __init__(self, data, markers):
+        self.markers = tuple(markers)
+        self._nodes = {marker: [] for marker in self.markers}
+        if isinstance(data, LazyBlob):
+            positions = sorted({i for marker in self.markers for i in data.elements_containing(marker)})
+            roots = [data[i] for i in positions]
+        else:
+            roots = [data]
+        # One iterator per open list/dict: the walk resumes where the last lookup stopped
+        self._stack = [iter(roots)]
+
+    def _advance(self):
+        """Walks until at least one more node is indexed; False once the blob is exhausted."""
+        stack, markers = self._stack, self.markers
+        while stack:
+            for node in stack[-1]:
+                if isinstance(node, list):
+                    stack.append(iter(node))
+                    if node and isinstance(node[0], str):
+                        matched = [marker for marker in markers if marker in node[0]]
+                        for marker in matched:
+                            self._nodes[marker].append(node)
+                        if matched:
+                            return True
+                    break
+                if isinstance(node, dict):
+                    stack.append(iter(node.values()))
+                    break
+            else:
+                stack.pop()
+        return False
+
+    def nodes(self, marker):
+        """Yields the indexed nodes for `marker`, walking further on demand."""
+        found = self._nodes[marker]
+        position = 0
+        while position < len(found) or self._advance():
+            if position < len(found):
+                yield found[position]
+                position += 1
+
+
+def extract_marker_fields(data_blob, specs=MARKER_SPECS):
+    """Resolves every marker field from a single shared walk of the blob."""
+    index = MarkerIndex(data_blob, {marker for marker, _ in specs.values()})
+    fields = {}
+    for field, (marker, post_process) in specs.items():
+        fields[field] = next(filter(None, map(post_process, index.nodes(marker))), None)
+    return fields
+
+
+def get_phone_number(data_blob):
+    return extract_marker_fields(data_blob, {"phone": MARKER_SPECS["phone"]})["phone"]
 
 
 def get_basic_info_from_initial_json(initial_data):
@@ -510,25 +805,88 @@ def get_basic_info_from_initial_json(initial_data):
     }
 
 
-def extract_place_data(html_content, all_reviews=None):
+# Fields filled from the rendered HTML when neither JSON source provides them.
+HTML_FALLBACKS = {
+    "name": get_name_from_html,
+    "address": get_address_from_html,
+    "rating": get_rating_from_html,
+    "reviews_count": get_reviews_count_from_html,
+    "categories": get_categories_from_html,
+    "website": get_website_from_html,
+    "phone": get_phone_from_html,
+    "open_hours": get_hours_from_html,
+}
+
+
+class PhaseStats:
+    """Running per-phase totals of `extract_place_data` timings, reported by /stats."""
+
+    def __init__(self):
+        self.extractions = 0
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    def add(self, timings):
+        with self._lock:
+            self.extractions += 1
+            for phase, seconds in timings.items():
+                self.totals[phase] = self.totals.get(phase, 0.0) + seconds
+
+    def summary(self):
+        with self._lock:
+            count = self.extractions
+            return {
+                "json_backend": JSON_BACKEND,
+                "extractions": count,
+                "mean_ms": {phase: round(total / count * 1000, 3) for phase, total in self.totals.items()} if count else {},
+            }
+
+
+extraction_stats = PhaseStats()
+
+
+def _lap(timings, phase, started):
+    """Adds the time since `started` to `timings[phase]` (when collecting) and returns now."""
+    now = time.perf_counter()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + now - started
+    return now
+
+
+def extract_place_data(html_content, all_reviews=None, require_blob=False,
+                       max_reviews=REVIEW_SELECTION_COUNT, candidate_pool=REVIEW_CANDIDATE_POOL_SIZE,
+                       timings=None, review_seed=None):
     """
     High-level function to orchestrate extraction from HTML content.
     Uses a tiered strategy: Basic JSON -> Deep JSON (if any) -> HTML.
+    The page state is parsed once and shared by the basic-info and deep-blob readers;
+    the HTML fallbacks scan the page with that (multi-megabyte) state cut out.
+    With `require_blob`, returns None when the deep data blob is missing, so callers
+    holding raw (unrendered) HTML know to fall back to a browser.
+    Pass a dict as `timings` to collect seconds spent per phase.
     """
-    json_str = extract_initial_json(html_content)
+    started = time.perf_counter()
+    located = locate_initial_json(html_content)
+    json_str = located[0] if located else None
+    started = _lap(timings, "locate_state", started)
+
     initial_data = None
     basic_info = {}
-    
     if json_str:
         try:
-            initial_data = json.loads(json_str)
+            initial_data = json_loads(json_str)
             basic_info = get_basic_info_from_initial_json(initial_data)
         except Exception as e:
             print(f"Error parsing initial JSON: {e}")
+    started = _lap(timings, "parse_state", started)
 
     # Attempt to find the deep data blob (legacy or restored structure)
-    data_blob = parse_json_data(json_str) if json_str else None
-    
+    data_blob = find_data_blob(initial_data) if initial_data is not None else None
+    started = _lap(timings, "parse_blob", started)
+
+    if not data_blob and require_blob:
+        return None
+
     if not data_blob:
         print("Deep data blob not found. Proceeding with basic info and HTML extraction.")
         # If no deep blob, we should still try to log if needed, but not fail.
@@ -539,9 +897,13 @@ def extract_place_data(html_content, all_reviews=None):
             with open(f"debug_data_blobs/failed_blob_{len(os.listdir('debug_data_blobs')) + 1}.json", "w") as f:
                 json.dump(json_str, f) if json_str else f.write("No JSON found")
 
+    fields = extract_blob_fields(data_blob) if data_blob else {}
+    if data_blob:
+        fields.update(extract_marker_fields(data_blob))
+
     # ===== handle Business Status =====
     close_statuses = ['permanently closed', 'temporarily closed', 'closed permanently', 'closed temporarily']
-    raw_status = get_status(data_blob) if data_blob else None
+    raw_status = fields.get("business_status")
     
     # Determine final status value ('open' or 'close')
     final_status = 'open'  # Default to 'open'
@@ -551,31 +913,39 @@ def extract_place_data(html_content, all_reviews=None):
             final_status = 'close'
     
     # Start with basic info from JSON, then allow deep blob to override/augment
-    # Finally, use HTML fallbacks for missing fields
-    name = basic_info.get("name") or (get_main_name(data_blob) if data_blob else None) or get_name_from_html(html_content)
-    
     place_details = {
-        "name": name,
-        "place_id": basic_info.get("place_id") or (get_place_id(data_blob) if data_blob else None),
+        "name": basic_info.get("name") or fields.get("name"),
+        "place_id": basic_info.get("place_id") or fields.get("place_id"),
         "cid": basic_info.get("cid"),
-        "coordinates": basic_info.get("coordinates") or (get_gps_coordinates(data_blob) if data_blob else None),
-        "address": (get_complete_address(data_blob) if data_blob else None) or get_address_from_html(html_content),
-        "rating": (get_rating(data_blob) if data_blob else None) or get_rating_from_html(html_content),
-        "reviews_count": (get_reviews_count(data_blob) if data_blob else None) or get_reviews_count_from_html(html_content),
-        "categories": (get_categories(data_blob) if data_blob else []) or get_categories_from_html(html_content),
-        "website": (get_website(data_blob) if data_blob else None) or get_website_from_html(html_content),
-        "phone": (get_phone_number(data_blob) if data_blob else None) or get_phone_from_html(html_content),
-        "price_range": get_price_range(data_blob) if data_blob else None,
-        "thumbnail": get_thumbnail(data_blob) if data_blob else None,
-        "open_hours": (get_open_hours(data_blob) if data_blob else None) or get_hours_from_html(html_content),
-        "images": get_images(data_blob) if data_blob else None,
-        "about": get_description(data_blob) if data_blob else None, # the beginning description text in 'About' tab
-        "attributes": get_about(data_blob) if data_blob else None, # the listed attributes in 'About' tab
-        "user_reviews": process_and_select_reviews(all_reviews) if all_reviews else [],
+        "coordinates": basic_info.get("coordinates") or fields.get("coordinates"),
+        "address": fields.get("address"),
+        "rating": fields.get("rating"),
+        "reviews_count": fields.get("reviews_count"),
+        "categories": fields.get("categories", []),
+        "website": fields.get("website"),
+        "phone": fields.get("phone"),
+        "price_range": fields.get("price_range"),
+        "thumbnail": fields.get("thumbnail"),
+        "open_hours": fields.get("open_hours"),
+        "images": fields.get("images"),
+        "about": fields.get("about"), # the beginning description text in 'About' tab
+        "attributes": fields.get("attributes"), # the listed attributes in 'About' tab
+        "user_reviews": [],
         "status": final_status,
     }
+    started = _lap(timings, "fields", started)
 
-    # Task for next phase: Add HTML extraction fallbacks here for missing fields
+    # Finally, use HTML fallbacks for missing fields
+    missing = [field for field in HTML_FALLBACKS if not place_details[field]]
+    if missing:
+        fallback_html = html_content[:located[1]] + html_content[located[2]:] if located else html_content
+        for field in missing:
+            place_details[field] = HTML_FALLBACKS[field](fallback_html)
+    started = _lap(timings, "html_fallbacks", started)
+
+    if all_reviews:
+        place_details["user_reviews"] = process_and_select_reviews(all_reviews, max_reviews, candidate_pool, review_seed)
+    _lap(timings, "reviews", started)
     
     return {k: v for k, v in place_details.items() if v is not None}
 
@@ -0,0 +1,83 @@
+# gmaps_scraper_server/http_client.py
+import importlib.util
+import os
+import time
+
+import httpx
+
+from .browser_manager import CONSENT_COOKIE_NAMES, USER_AGENT
+
+# --- HTTP Client Configuration ---
+# Maximum simultaneous connections to Google from this worker.
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 50))
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", 20))
+# Browser cookies are copied into the client at most this often (seconds).
+COOKIE_SYNC_INTERVAL = float(os.environ.get("COOKIE_SYNC_INTERVAL", 300))
+
+# httpx only speaks HTTP/2 when the optional h2 package is installed.
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class HttpSession:
+    """
+    A shared keep-alive HTTP client for requests that don't need a rendered page.
+    Cookies (consent state in particular) are borrowed from a browser context.
+    """
+
+    def __init__(self):
+        self._client: httpx.AsyncClient | None = None
+        self._cookies_synced_at = 0.0
+        # Set once Maps was loaded in a browser and showed no consent wall, so the
+        # missing consent cookie isn't going to turn up
+        self.consent_not_required = False
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                follow_redirects=True,
+                timeout=HTTP_TIMEOUT,
+                limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
+                headers={"User-Agent": USER_AGENT},
+            )
+        return self._client
+
+    @property
+    def has_cookies(self):
+        """Whether the client carries Google's consent cookie (or needs none)."""
+        return self.consent_not_required or any(cookie.name in CONSENT_COOKIE_NAMES for cookie in self.client.cookies.jar)
+
+    async def borrow_cookies(self, context, force=False):
+        """Copies the browser context's cookies into the client, rate-limited by COOKIE_SYNC_INTERVAL."""
+        if not force and time.monotonic() - self._cookies_synced_at < COOKIE_SYNC_INTERVAL:
+            return
+        try:
+            cookies = await context.cookies()
+        except Exception as e:
+            print(f"Error reading browser cookies: {e}")
+            return
+        for cookie in cookies:
+            self.client.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain", ""), path=cookie.get("path", "/"))
+        self._cookies_synced_at = time.monotonic()
+
+    async def get(self, url, lang="en", **kwargs):
+        headers = {"Accept-Language": lang, **kwargs.pop("headers", {})}
+        return await self.client.get(url, headers=headers, **kwargs)
+
+    async def fetch_text(self, url, lang="en"):
+        """Returns (final_url, body) for a page, or (None, None) on a non-200 response."""
+        response = await self.get(url, lang=lang)
+        if response.status_code != 200:
+            print(f"  - HTTP fetch failed for {url}: Status {response.status_code}")
+            return None, None
+        return str(response.url), response.text
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Create a single, shared instance of the HTTP session.
+http_session = HttpSession()
@@ -1,15 +1,27 @@
-from fastapi import FastAPI, HTTPException, Query
-from typing import Optional, List, Dict, Any
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Optional, List, Dict, Any, Literal
 import logging
-from contextlib import asynccontextmanager
+from contextlib import aclosing, asynccontextmanager
 import os
 import asyncio
-from pydantic import BaseModel
+import json
+import time
+from pydantic import BaseModel, Field
 
 # Import the browser manager and scraper function
 try:
     from gmaps_scraper_server.browser_manager import browser_manager
-    from gmaps_scraper_server.scraper import scrape_google_maps, scrape_reviews_only
+    from gmaps_scraper_server.admission import admission_controller
+    from gmaps_scraper_server.cache import place_cache, search_cache, review_store
+    from gmaps_scraper_server.extractor import extraction_stats
+    from gmaps_scraper_server.extraction_executor import extraction_executor
+    from gmaps_scraper_server.http_client import http_session
+    from gmaps_scraper_server import metrics, profiling
+    from gmaps_scraper_server.reviews import ReviewBudget, extract_place_id
+    from gmaps_scraper_server.scraper import (
+        REVIEW_RPC_CONCURRENCY, scrape_google_maps, iter_scrape_google_maps, scrape_reviews_only, scrape_reviews_by_place_id,
+    )
 except ImportError:
     logging.error("Could not import modules from gmaps_scraper_server.")
     # Define dummy functions and objects to allow API to start, but fail on call
@@ -17,15 +29,102 @@ except ImportError:
         async def start_browser(self, *args, **kwargs): pass
         async def stop_browser(self, *args, **kwargs): pass
         async def get_context(self, *args, **kwargs): pass
+        async def acquire_context(self, *args, **kwargs): pass
+        async def release_context(self, *args, **kwargs): pass
+        def shard_stats(self): return []
+        def pool_stats(self): return {}
     browser_manager = DummyBrowserManager()
+    admission_controller = None
+    place_cache = None
+    search_cache = None
+    review_store = None
+    extraction_stats = None
+    extraction_executor = None
+    http_session = None
+    metrics = None
+    profiling = None
     def scrape_google_maps(*args, **kwargs):
         raise ImportError("Scraper function not available.")
+    def iter_scrape_google_maps(*args, **kwargs):
+        raise ImportError("Scraper function not available.")
     def scrape_reviews_only(*args, **kwargs):
         raise ImportError("Scraper function not available.")
+    def scrape_reviews_by_place_id(*args, **kwargs):
+        raise ImportError("Scraper function not available.")
+    def extract_place_id(*args, **kwargs):
+        return None
+    def ReviewBudget(*args, **kwargs):
+        return None
 
 # Configure basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Per-request page ceilings. The worker-wide PAGE_BUDGET is shared fairly between requests.
+SCRAPE_CONCURRENCY_LIMIT = 15
+REVIEWS_CONCURRENCY_LIMIT = 20
+
+def profiled_response(results, timeline, response: Response):
+    """Wraps `results` with the request's timeline; headers already set on `response` are kept."""
+    headers = {name: value for name, value in response.headers.items() if name != "content-length"}
+    return JSONResponse({"results": results, "profile": timeline.to_dict()}, headers=headers)
+
+def report_queue_wait(response: Response, ticket):
+    """Exposes how long a request waited for page slots via response headers."""
+    summary = ticket.summary()
+    response.headers["X-Queue-Wait-Seconds"] = str(summary["queue_wait_seconds"])
+    response.headers["X-Queue-Wait-Max-Seconds"] = str(summary["max_queue_wait_seconds"])
+    logging.info(f"Admission for {ticket.name}: {summary}")
+
+# --- Streaming ---
+StreamFormat = Literal["ndjson", "sse"]
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+def encode_stream_record(stream_format, record_type, payload):
+    """Encodes one record as an NDJSON line or an SSE event."""
+    if stream_format == "sse":
+        return f"event: {record_type}\ndata: {json.dumps(payload)}\n\n"
+    return json.dumps({"type": record_type, "data": payload}) + "\n"
+
+def streaming_response(stream_format, record_type, name, limit, produce_records, profile=False, cpu_profile=False):
+    """
+    Streams every record yielded by `produce_records(ticket)` as soon as it is ready,
+    then a final summary record with the count, elapsed time and admission queue wait,
+    plus the request's timeline when `profile` is set.
+    """
+    async def body():
+        started = time.monotonic()
+        count = 0
+        with profiling.profile_request(profile, cpu_profile) as timeline, \
+                admission_controller.request(name, limit=limit) as ticket:
+            try:
+                # Closed right here when the client goes away, so its cleanup (cancelling
+                # tasks, returning contexts) runs while the ticket is still registered
+                async with aclosing(produce_records(ticket)) as records:
+                    async for record in records:
+                        count += 1
+                        yield encode_stream_record(stream_format, record_type, record)
+            except Exception as e:
+                logging.error(f"An error occurred while streaming {name} results: {e}", exc_info=True)
+                yield encode_stream_record(stream_format, "error", {"error": str(e)})
+            summary = {"count": count, "elapsed_seconds": round(time.monotonic() - started, 3), **ticket.summary()}
+            if timeline:
+                summary["profile"] = timeline.to_dict()
+        logging.info(f"Streaming {name} finished: {summary}")
+        yield encode_stream_record(stream_format, "summary", summary)
+
+    return StreamingResponse(
+        body(),
+        media_type=STREAM_MEDIA_TYPES[stream_format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def sample_runtime_gauges():
+    metrics.set_runtime_gauges(
+        browser_manager.shard_stats(),
+        admission_controller.stats() if admission_controller else None,
+        extraction_executor.stats() if extraction_executor else None,
+    )
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -35,8 +134,15 @@ async def lifespan(app: FastAPI):
     # Get headless mode from environment variable, default to True
     headless_mode = os.environ.get("HEADLESS", "true").lower() == "true"
     await browser_manager.start_browser(headless=headless_mode)
+    sampler = asyncio.create_task(metrics.run_sampler(sample_runtime_gauges)) if metrics and metrics.METRICS_ENABLED else None
     yield
+    if sampler:
+        sampler.cancel()
     await browser_manager.stop_browser()
+    if http_session:
+        await http_session.aclose()
+    if extraction_executor:
+        extraction_executor.shutdown()
 
 app = FastAPI(
     title="Google Maps Scraper API",
@@ -45,67 +151,150 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Counts requests per endpoint and status code. Streams are timed up to their first byte."""
+    if not metrics or not metrics.METRICS_ENABLED:
+        return await call_next(request)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        # Unmatched paths share one label so scanners can't blow up the series count
+        endpoint = route.path if route else "unmatched"
+        metrics.record_request(endpoint, status, time.perf_counter() - started)
+
 class ReviewsRequest(BaseModel):
     urls: List[str]
     lang: str = "en"
+    stream: Optional[StreamFormat] = None
+    # Only return reviews posted since the previous run for each place
+    since_last_run: bool = False
+    max_reviews: Optional[int] = Field(None, ge=1, description="Reviews returned per place (default 100).")
+    candidate_pool: Optional[int] = Field(None, ge=1, description="Top-ranked reviews the selection is sampled from (default 3x max_reviews).")
+    review_page_size: Optional[int] = Field(None, ge=1, description="Reviews requested per RPC page (default 10).")
+    review_fetch_limit: Optional[int] = Field(None, ge=1, description="Reviews paged in per place before ranking stops (default 300, or candidate_pool if larger).")
+    profile: bool = Field(False, description="Return {results, profile} with a per-URL timeline of the request.")
+    profile_cpu: bool = Field(False, description="With profile, also stack-sample the extraction work.")
+
+    def review_budget(self):
+        return ReviewBudget(self.max_reviews, self.candidate_pool, self.review_page_size, fetch_limit=self.review_fetch_limit)
 
 @app.post("/reviews", response_model=List[Dict[str, Any]])
-async def run_reviews_scrape(request: ReviewsRequest):
+async def run_reviews_scrape(request: ReviewsRequest, response: Response):
     """
     Triggers the reviews-only scraping process for a list of Google Maps URLs.
     Optimized for performance by skipping full place details and blocking assets.
+    With `stream` set, each URL's result is sent as soon as it finishes.
     """
     logging.info(f"Received reviews scrape request for {len(request.urls)} URLs.")
-    
-    # Use a semaphore to limit concurrency
-    # Optimized for 48 threads / 64GB RAM: 20 is a safe high-performance sweet spot
-    CONCURRENCY_LIMIT = 20 
-    semaphore = asyncio.Semaphore(CONCURRENCY_LIMIT)
-    
-    async def process_url(url):
-        async with semaphore:
-            context = None
-            try:
-                # Get an isolated context for each URL to avoid interference
-                context = await browser_manager.get_context(lang=request.lang, block_resources=False)
-                # We don't need the semaphore inside scrape_reviews_only anymore as we handle it here
-                return await scrape_reviews_only(context, url, asyncio.Semaphore(1))
-            finally:
-                if context:
-                    await context.close()
+    if request.stream:
+        return streaming_response(
+            request.stream, "review", "reviews", REVIEWS_CONCURRENCY_LIMIT,
+            lambda ticket: iter_reviews_scrape(request, ticket),
+            request.profile, request.profile_cpu,
+        )
 
     try:
-        # Process URLs concurrently with isolated contexts
-        tasks = [process_url(url) for url in request.urls]
-        results = await asyncio.gather(*tasks)
-        
+        with profiling.profile_request(request.profile, request.profile_cpu) as timeline, \
+                admission_controller.request("reviews", limit=REVIEWS_CONCURRENCY_LIMIT) as ticket:
+            # Process URLs concurrently with isolated contexts
+            rpc_slots = asyncio.Semaphore(REVIEW_RPC_CONCURRENCY)
+            tasks = [scrape_review_url(url, request.lang, ticket, rpc_slots, request.since_last_run, request.review_budget()) for url in request.urls]
+            results = await asyncio.gather(*tasks)
+        report_queue_wait(response, ticket)
+
         logging.info(f"Reviews scraping finished. Processed {len(results)} URLs.")
-        return results
-        
+        return profiled_response(results, timeline, response) if timeline else results
+
     except Exception as e:
         logging.error(f"An error occurred during reviews scraping: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"An internal error occurred during scraping: {str(e)}")
 
-@app.post("/scrape", response_model=List[Dict[str, Any]])
-async def run_scrape(
-    query: str = Query(..., description="The search query for Google Maps (e.g., 'restaurants in New York')"),
-    max_places: Optional[int] = Query(None, description="Maximum number of places to scrape. Scrapes all found if None."),
-    lang: str = Query("en", description="Language code for Google Maps results (e.g., 'en', 'es')."),
-    extract_reviews: bool = Query(True, description="Set to true to extract all user reviews (slower).")
-):
-    """
-    Triggers the Google Maps scraping process for the given query.
-    """
-    logging.info(f"Received scrape request for query: '{query}', max_places: {max_places}, lang: {lang}, extract_reviews: {extract_reviews}")
+async def iter_reviews_scrape(request: ReviewsRequest, ticket):
+    """Yields each URL's reviews result in completion order."""
+    rpc_slots = asyncio.Semaphore(REVIEW_RPC_CONCURRENCY)
+    tasks = [
+        asyncio.create_task(scrape_review_url(url, request.lang, ticket, rpc_slots, request.since_last_run, request.review_budget()))
+        for url in request.urls
+    ]
     try:
-        results = await scrape_google_maps(
-            query=query,
-            max_places=max_places,
-            lang=lang,
-            extract_reviews=extract_reviews
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def scrape_review_url(url, lang, ticket, rpc_slots, since_last_run=False, review_budget=None):
+    with profiling.place(url):
+        return await _scrape_review_url(url, lang, ticket, rpc_slots, since_last_run, review_budget)
+
+async def _scrape_review_url(url, lang, ticket, rpc_slots, since_last_run=False, review_budget=None):
+    place_id = extract_place_id(url)
+    if place_id:
+        # No page needed: the reviews RPC goes straight over the shared HTTP client,
+        # a few pagings at a time per request (`rpc_slots`), like the /scrape review pipeline
+        async with rpc_slots:
+            return await scrape_reviews_by_place_id(url, place_id, lang, since_last_run, review_budget)
+
+    # Each URL that must be opened holds one slot of the worker-wide page budget
+    async with ticket:
+        context = None
+        discard = False
+        try:
+            # Check out a warm context for each URL; its state is reset before the next use
+            context = await browser_manager.acquire_context(lang=lang, block_resources=False)
+            # We don't need the semaphore inside scrape_reviews_only anymore as we handle it here
+            result = await scrape_reviews_only(context, url, asyncio.Semaphore(1), since_last_run, review_budget, lang)
+            # Don't hand a context that just failed back to the next URL
+            discard = result.get("status") != "success"
+            return result
+        except BaseException:
+            discard = True
+            raise
+        finally:
+            if context:
+                await browser_manager.release_context(context, discard=discard)
+
+async def _run_scrape(response, query, max_places, lang, extract_reviews, stream, max_age, refresh, review_budget,
+                      profile=False, profile_cpu=False):
+    """Shared implementation of the POST and GET scrape endpoints."""
+    if stream:
+        return streaming_response(
+            stream, "place", "scrape", SCRAPE_CONCURRENCY_LIMIT,
+            lambda ticket: iter_scrape_google_maps(
+                query=query,
+                max_places=max_places,
+                lang=lang,
+                extract_reviews=extract_reviews,
+                ticket=ticket,
+                max_age=max_age,
+                refresh=refresh,
+                review_budget=review_budget
+            ),
+            profile, profile_cpu,
         )
+    try:
+        with profiling.profile_request(profile, profile_cpu) as timeline, \
+                admission_controller.request("scrape", limit=SCRAPE_CONCURRENCY_LIMIT) as ticket:
+            results = await scrape_google_maps(
+                query=query,
+                max_places=max_places,
+                lang=lang,
+                extract_reviews=extract_reviews,
+                ticket=ticket,
+                max_age=max_age,
+                refresh=refresh,
+                review_budget=review_budget
+            )
+        report_queue_wait(response, ticket)
         logging.info(f"Scraping finished for query: '{query}'. Found {len(results)} results.")
-        return results
+        return profiled_response(results, timeline, response) if timeline else results
     except ImportError as e:
          logging.error(f"ImportError during scraping for query '{query}': {e}")
          raise HTTPException(status_code=500, detail="Server configuration error: Scraper not available.")
@@ -113,32 +302,55 @@ async def run_scrape(
         logging.error(f"An error occurred during scraping for query '{query}': {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"An internal error occurred during scraping: {str(e)}")
 
+@app.post("/scrape", response_model=List[Dict[str, Any]])
+async def run_scrape(
+    response: Response,
+    query: str = Query(..., description="The search query for Google Maps (e.g., 'restaurants in New York')"),
+    max_places: Optional[int] = Query(None, description="Maximum number of places to scrape. Scrapes all found if None."),
+    lang: str = Query("en", description="Language code for Google Maps results (e.g., 'en', 'es')."),
+    extract_reviews: bool = Query(True, description="Set to true to extract all user reviews (slower)."),
+    stream: Optional[StreamFormat] = Query(None, description="Stream places as they finish: 'ndjson' or 'sse'."),
+    max_age: Optional[int] = Query(None, description="Maximum age in seconds of cached place details to accept. 0 bypasses the cache."),
+    refresh: bool = Query(False, description="Ignore cached search results and scroll the results feed again."),
+    max_reviews: Optional[int] = Query(None, ge=1, description="Reviews returned per place when extract_reviews is set (default 100)."),
+    candidate_pool: Optional[int] = Query(None, ge=1, description="Top-ranked reviews the selection is sampled from (default 3x max_reviews)."),
+    review_page_size: Optional[int] = Query(None, ge=1, description="Reviews requested per RPC page (default 10)."),
+    review_fetch_limit: Optional[int] = Query(None, ge=1, description="Reviews paged in per place before ranking stops (default 300, or candidate_pool if larger)."),
+    profile: bool = Query(False, description="Return {results, profile} with a per-place timeline and stage percentiles (streams add it to the summary)."),
+    profile_cpu: bool = Query(False, description="With profile, also stack-sample the extraction work.")
+):
+    """
+    Triggers the Google Maps scraping process for the given query.
+    """
+    logging.info(f"Received scrape request for query: '{query}', max_places: {max_places}, lang: {lang}, extract_reviews: {extract_reviews}, stream: {stream}, max_age: {max_age}, refresh: {refresh}")
+    review_budget = ReviewBudget(max_reviews, candidate_pool, review_page_size, fetch_limit=review_fetch_limit)
+    return await _run_scrape(response, query, max_places, lang, extract_reviews, stream, max_age, refresh, review_budget,
+                             profile, profile_cpu)
+
 @app.get("/scrape-get", response_model=List[Dict[str, Any]])
 async def run_scrape_get(
+    response: Response,
     query: str = Query(..., description="The search query for Google Maps (e.g., 'restaurants in New York')"),
     max_places: Optional[int] = Query(None, description="Maximum number of places to scrape. Scrapes all found if None."),
     lang: str = Query("en", description="Language code for Google Maps results (e.g., 'en', 'es')."),
-    extract_reviews: bool = Query(True, description="Set to true to extract all user reviews (slower).")
+    extract_reviews: bool = Query(True, description="Set to true to extract all user reviews (slower)."),
+    stream: Optional[StreamFormat] = Query(None, description="Stream places as they finish: 'ndjson' or 'sse'."),
+    max_age: Optional[int] = Query(None, description="Maximum age in seconds of cached place details to accept. 0 bypasses the cache."),
+    refresh: bool = Query(False, description="Ignore cached search results and scroll the results feed again."),
+    max_reviews: Optional[int] = Query(None, ge=1, description="Reviews returned per place when extract_reviews is set (default 100)."),
+    candidate_pool: Optional[int] = Query(None, ge=1, description="Top-ranked reviews the selection is sampled from (default 3x max_reviews)."),
+    review_page_size: Optional[int] = Query(None, ge=1, description="Reviews requested per RPC page (default 10)."),
+    review_fetch_limit: Optional[int] = Query(None, ge=1, description="Reviews paged in per place before ranking stops (default 300, or candidate_pool if larger)."),
+    profile: bool = Query(False, description="Return {results, profile} with a per-place timeline and stage percentiles (streams add it to the summary)."),
+    profile_cpu: bool = Query(False, description="With profile, also stack-sample the extraction work.")
 ):
     """
     Triggers the Google Maps scraping process for the given query via GET request.
     """
-    logging.info(f"Received GET scrape request for query: '{query}', max_places: {max_places}, lang: {lang}, extract_reviews: {extract_reviews}")
-    try:
-        results = await scrape_google_maps(
-            query=query,
-            max_places=max_places,
-            lang=lang,
-            extract_reviews=extract_reviews
-        )
-        logging.info(f"Scraping finished for query: '{query}'. Found {len(results)} results.")
-        return results
-    except ImportError as e:
-         logging.error(f"ImportError during scraping for query '{query}': {e}")
-         raise HTTPException(status_code=500, detail="Server configuration error: Scraper not available.")
-    except Exception as e:
-        logging.error(f"An error occurred during scraping for query '{query}': {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"An internal error occurred during scraping: {str(e)}")
+    logging.info(f"Received GET scrape request for query: '{query}', max_places: {max_places}, lang: {lang}, extract_reviews: {extract_reviews}, stream: {stream}, max_age: {max_age}, refresh: {refresh}")
+    review_budget = ReviewBudget(max_reviews, candidate_pool, review_page_size, fetch_limit=review_fetch_limit)
+    return await _run_scrape(response, query, max_places, lang, extract_reviews, stream, max_age, refresh, review_budget,
+                             profile, profile_cpu)
 
 
 # Basic root endpoint for health check or info
@@ -146,6 +358,28 @@ async def run_scrape_get(
 async def read_root():
     return {"message": "Google Maps Scraper API is running."}
 
+@app.get("/stats")
+async def read_stats():
+    """Per-worker browser shard and context pool statistics."""
+    return {
+        "pid": os.getpid(),
+        "browser_shards": browser_manager.shard_stats(),
+        "context_pool": browser_manager.pool_stats(),
+        "admission": admission_controller.stats() if admission_controller else {},
+        "place_cache": place_cache.stats() if place_cache else {},
+        "search_cache": search_cache.stats() if search_cache else {},
+        "review_store": review_store.stats() if review_store else {},
+        "extraction": extraction_stats.summary() if extraction_stats else {},
+        "extraction_executor": extraction_executor.stats() if extraction_executor else {},
+    }
+
+@app.get("/metrics")
+async def read_metrics():
+    """Prometheus metrics, aggregated over all gunicorn workers when PROMETHEUS_MULTIPROC_DIR is set."""
+    if not metrics or not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled.")
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE_LATEST)
+
 # Example for running locally (uvicorn main_api:app --reload)
 # if __name__ == "__main__":
 #     import uvicorn
@@ -0,0 +1,139 @@
+# gmaps_scraper_server/metrics.py
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+from . import profiling
+
+# --- Metrics Configuration ---
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+# How often the gauges and the event-loop lag are sampled, in seconds.
+METRICS_SAMPLE_INTERVAL = float(os.environ.get("METRICS_SAMPLE_INTERVAL", 1.0))
+# Set (by gunicorn_conf.py) when several workers write to shared metric files that
+# /metrics then aggregates. Must be set before prometheus_client is imported.
+PROMETHEUS_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+# Stages range from a few ms (review ranking) to a minute (navigation timeouts).
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+
+class _NoopMetric:
+    """Stands in for every metric when metrics are off, so call sites stay unconditional."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+
+if METRICS_ENABLED:
+    STAGE_SECONDS = Histogram(
+        "gmaps_stage_seconds", "Time spent in each scraping stage.", ["stage"], buckets=STAGE_BUCKETS
+    )
+    REQUESTS = Counter("gmaps_requests", "API requests by endpoint and status code.", ["endpoint", "status"])
+    REQUEST_SECONDS = Histogram(
+        "gmaps_request_seconds", "API request latency by endpoint.", ["endpoint"], buckets=STAGE_BUCKETS
+    )
+    FAILURES = Counter("gmaps_failures", "Places or links that timed out or failed, by job.", ["job", "kind"])
+    BROWSER_RESTARTS = Counter("gmaps_browser_restarts", "Browser shard restarts.")
+    BROWSER_CRASHES = Counter("gmaps_browser_crashes", "Browser processes that went away on their own.")
+    EVENT_LOOP_LAG = Histogram(
+        "gmaps_event_loop_lag_seconds", "How late the event loop ran a sampling timer.", buckets=LAG_BUCKETS
+    )
+    # Summed over the live workers; a dead worker's values are dropped (see gunicorn_conf.py)
+    OPEN_CONTEXTS = Gauge("gmaps_open_contexts", "Open browser contexts.", multiprocess_mode="livesum")
+    OPEN_PAGES = Gauge("gmaps_open_pages", "Open browser pages.", multiprocess_mode="livesum")
+    CONTEXTS_CHECKED_OUT = Gauge(
+        "gmaps_contexts_checked_out", "Pooled contexts currently in use.", multiprocess_mode="livesum"
+    )
+    PAGE_SLOTS_IN_USE = Gauge("gmaps_page_slots_in_use", "Admission page slots held.", multiprocess_mode="livesum")
+    PAGE_SLOTS_WAITING = Gauge(
+        "gmaps_page_slots_waiting", "Requests waiting for an admission page slot.", multiprocess_mode="livesum"
+    )
+    EXTRACTION_QUEUE_DEPTH = Gauge(
+        "gmaps_extraction_queue_depth", "Extraction jobs queued or running.", multiprocess_mode="livesum"
+    )
+else:
+    STAGE_SECONDS = REQUESTS = REQUEST_SECONDS = FAILURES = _NoopMetric()
+    BROWSER_RESTARTS = BROWSER_CRASHES = EVENT_LOOP_LAG = _NoopMetric()
+    OPEN_CONTEXTS = OPEN_PAGES = CONTEXTS_CHECKED_OUT = _NoopMetric()
+    PAGE_SLOTS_IN_USE = PAGE_SLOTS_WAITING = EXTRACTION_QUEUE_DEPTH = _NoopMetric()
+
+
+def observe_stage(stage, seconds, started=None, **detail):
+    """
+    Records `seconds` spent in `stage`, which began at perf_counter time `started`
+    (default: `seconds` ago). `detail` only goes into a profiled request's timeline.
+    """
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    profiling.record_span(stage, time.perf_counter() - seconds if started is None else started, seconds, **detail)
+
+
+@contextmanager
+def stage_timer(stage):
+    """Times the enclosed block into the `stage` histogram, whether or not it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started, started)
+
+
+def record_failure(job, kind):
+    """Counts a place or link of `job` ("scrape" or "reviews") that ended in `kind` ("timeout" or "error")."""
+    FAILURES.labels(job, kind).inc()
+
+
+def record_request(endpoint, status, seconds):
+    REQUESTS.labels(endpoint, str(status)).inc()
+    REQUEST_SECONDS.labels(endpoint).observe(seconds)
+
+
+def set_runtime_gauges(shard_stats, admission_stats, executor_stats):
+    """Copies the current browser, admission and executor stats into the gauges."""
+    OPEN_CONTEXTS.set(sum(shard["open_contexts"] for shard in shard_stats))
+    OPEN_PAGES.set(sum(shard["open_pages"] for shard in shard_stats))
+    CONTEXTS_CHECKED_OUT.set(sum(shard["checked_out"] for shard in shard_stats))
+    if admission_stats:
+        PAGE_SLOTS_IN_USE.set(admission_stats["in_use"])
+        PAGE_SLOTS_WAITING.set(admission_stats["waiting"])
+    if executor_stats:
+        EXTRACTION_QUEUE_DEPTH.set(executor_stats["queue_depth"])
+
+
+async def run_sampler(sample, interval=METRICS_SAMPLE_INTERVAL):
+    """
+    Calls `sample()` every `interval` seconds and records how late each wakeup was,
+    which is how long something held the event loop. Runs until cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - expected))
+        try:
+            sample()
+        except Exception as e:
+            print(f"Error sampling metrics: {e}")
+
+
+def render():
+    """Returns the metrics exposition, aggregated over every worker in multiprocess mode."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
@@ -0,0 +1,176 @@
+# gmaps_scraper_server/profiling.py
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# --- Request Profiling Configuration ---
+# Seconds between stack samples of a profiled extraction.
+CPU_SAMPLE_INTERVAL = float(os.environ.get("CPU_SAMPLE_INTERVAL", 0.005))
+# Functions listed in a timeline's CPU profile, by samples spent in the function itself.
+CPU_PROFILE_TOP = int(os.environ.get("CPU_PROFILE_TOP", 25))
+
+# The timeline of the request being served, and the place link the current task works on.
+# Tasks copy both when they are created, so spans land in the right request and place.
+_timeline = ContextVar("gmaps_timeline", default=None)
+_place = ContextVar("gmaps_place", default=None)
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted, non-empty list."""
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def distribution(values):
+    values = sorted(values)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "total": round(sum(values), 4),
+        "p50": round(percentile(values, 0.5), 4),
+        "p90": round(percentile(values, 0.9), 4),
+        "p99": round(percentile(values, 0.99), 4),
+        "max": round(values[-1], 4),
+    }
+
+
+class Timeline:
+    """
+    Spans recorded while serving one profiled request: what ran (`stage`), for which
+    place link, when (seconds since the request started) and for how long.
+    With `cpu_profile`, extractions are also stack-sampled into `cpu_samples`.
+    """
+
+    def __init__(self, cpu_profile=False):
+        self.started = time.perf_counter()
+        self.cpu_profile = cpu_profile
+        self.cpu_samples = Counter()
+        self.spans = []
+
+    def add(self, stage, started, duration, place=None, **detail):
+        self.spans.append((place, stage, started - self.started, duration, detail))
+
+    def to_dict(self):
+        request_spans = []
+        places = {}
+        stage_durations = {}
+        for place, stage, start, duration, detail in self.spans:
+            span = {"stage": stage, "start": round(start, 4), "duration": round(duration, 4), **detail}
+            (places.setdefault(place, []) if place else request_spans).append(span)
+            stage_durations.setdefault(stage, []).append(duration)
+
+        place_timelines = {}
+        for place, spans in places.items():
+            spans.sort(key=lambda span: span["start"])
+            first = spans[0]["start"]
+            last = max(span["start"] + span["duration"] for span in spans)
+            place_timelines[place] = {"start": first, "elapsed": round(last - first, 4), "spans": spans}
+
+        profile = {
+            "elapsed_seconds": round(time.perf_counter() - self.started, 4),
+            "request": sorted(request_spans, key=lambda span: span["start"]),
+            "places": place_timelines,
+            "summary": {
+                "places": distribution(timeline["elapsed"] for timeline in place_timelines.values()),
+                "stages": {stage: distribution(durations) for stage, durations in sorted(stage_durations.items())},
+            },
+        }
+        if self.cpu_profile:
+            profile["cpu_profile"] = summarize_cpu_samples(self.cpu_samples)
+        return profile
+
+
+@contextmanager
+def profile_request(enabled=True, cpu_profile=False):
+    """Collects the spans of everything run inside the block (and the tasks it starts) into a Timeline."""
+    if not enabled:
+        yield None
+        return
+    timeline = Timeline(cpu_profile)
+    token = _timeline.set(timeline)
+    try:
+        yield timeline
+    finally:
+        _timeline.reset(token)
+
+
+@contextmanager
+def place(link):
+    """Attributes spans recorded inside the block to the place `link`."""
+    token = _place.set(link)
+    try:
+        yield
+    finally:
+        _place.reset(token)
+
+
+def current_timeline():
+    return _timeline.get()
+
+
+def record_span(stage, started, duration, **detail):
+    """Adds a span to the current request's timeline; a no-op for requests that aren't profiled."""
+    timeline = _timeline.get()
+    if timeline is not None:
+        timeline.add(stage, started, duration, _place.get(), **detail)
+
+
+def sample_call(func, *args):
+    """
+    Calls `func(*args)` while a background thread samples the calling thread's stack every
+    CPU_SAMPLE_INTERVAL seconds. Returns (result, {folded stack: samples}), root first.
+    Runs in whichever thread or process the extraction executor uses.
+    """
+    target = threading.get_ident()
+    caller = sys._getframe()
+    samples = Counter()
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(CPU_SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(target)
+            stack = []
+            while frame is not None and frame.f_back is not caller:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            # Only stacks inside `func`, not the caller winding the sampler down
+            if frame is not None and frame.f_code is getattr(func, "__code__", frame.f_code):
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                samples[";".join(reversed(stack))] += 1
+
+    sampler = threading.Thread(target=sample, name="gmaps-cpu-sampler", daemon=True)
+    sampler.start()
+    try:
+        result = func(*args)
+    finally:
+        done.set()
+        sampler.join()
+    return result, dict(samples)
+
+
+def summarize_cpu_samples(samples):
+    """Top functions by self and total samples, plus every stack in flamegraph 'folded' form."""
+    samples = Counter(samples)
+    own = Counter()
+    total = Counter()
+    for stack, count in samples.items():
+        frames = stack.split(";")
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+    return {
+        "interval_seconds": CPU_SAMPLE_INTERVAL,
+        "samples": sum(samples.values()),
+        "top": [
+            {"function": function, "self": count, "total": total[function]}
+            for function, count in own.most_common(CPU_PROFILE_TOP)
+        ],
+        "folded": dict(samples.most_common()),
+    }
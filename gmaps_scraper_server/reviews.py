@@ -0,0 +1,280 @@
+# gmaps_scraper_server/reviews.py
+import asyncio
+import base64
+import json
+import os
+import random
+import re
+from urllib.parse import quote
+
+from . import extractor, metrics
+from .cache import review_store
+from .http_client import http_session
+
+# --- Reviews RPC Configuration ---
+# Origin of the reviews RPC; follows GMAPS_BASE_URL unless set on its own.
+GMAPS_RPC_BASE_URL = os.environ.get(
+    "GMAPS_RPC_BASE_URL", os.environ.get("GMAPS_BASE_URL", "https://www.google.com")
+).rstrip("/")
+REVIEWS_RPC_URL = f"{GMAPS_RPC_BASE_URL}/maps/rpc/listugcposts"
+# Upper bound on RPC pages requested per place, whatever the review budget.
+REVIEWS_MAX_PAGES = 20
+# Reviews per RPC page unless a request asks for another page size.
+REVIEWS_PAGE_SIZE = 10
+# Sort orders understood by the RPC.
+REVIEWS_SORT_RELEVANT = 1
+REVIEWS_SORT_NEWEST = 2
+# Seen review ids remembered per place for "since last run" fetches.
+REVIEW_STATE_MAX_IDS = 500
+
+
+class ReviewBudget:
+    """
+    How many reviews a request wants back (`max_reviews`), how many top-ranked candidates
+    they are sampled from (`candidate_pool`) and how many reviews each RPC page carries.
+    The candidate pool defaults to three times `max_reviews`, the ratio of the extractor's
+    100/300 defaults, and is never smaller than `max_reviews`. A `seed` makes the sample
+    reproducible.
+    `fetch_limit` is a plain count cap on the reviews paged in per place. By default it
+    keeps the extractor's fixed fetch depth (REVIEW_CANDIDATE_POOL_SIZE reviews, or the
+    candidate pool when that is larger) whatever `max_reviews` is; callers may narrow it
+    down to `max_reviews` or widen it. The ranking key has no upper bound (longer text
+    always ranks higher), so no score threshold can prove a later page holds nothing better.
+    """
+
+    def __init__(self, max_reviews=None, candidate_pool=None, page_size=None, seed=None, fetch_limit=None):
+        self.max_reviews = max_reviews or extractor.REVIEW_SELECTION_COUNT
+        if candidate_pool is None:
+            ratio = extractor.REVIEW_CANDIDATE_POOL_SIZE // extractor.REVIEW_SELECTION_COUNT
+            candidate_pool = self.max_reviews * ratio
+        self.candidate_pool = max(candidate_pool, self.max_reviews)
+        self.page_size = page_size or REVIEWS_PAGE_SIZE
+        self.seed = seed
+        if fetch_limit is None:
+            fetch_limit = max(extractor.REVIEW_CANDIDATE_POOL_SIZE, self.candidate_pool)
+        self.fetch_limit = max(fetch_limit, self.max_reviews)
+
+    def ranker(self):
+        return extractor.ReviewRanker(self.candidate_pool)
+
+    def select(self, all_reviews):
+        """Ranks, samples and parses the fetched raw reviews."""
+        return extractor.process_and_select_reviews(all_reviews, self.max_reviews, self.candidate_pool, self.seed)
+
+    def sample(self, candidates):
+        """Samples raw candidates (best first) the way `select` does, without parsing them."""
+        if len(candidates) <= self.max_reviews:
+            return list(candidates)
+        rng = random.Random(self.seed) if self.seed is not None else random
+        return rng.sample(candidates, self.max_reviews)
+
+    def summary(self):
+        return {
+            "max_reviews": self.max_reviews, "candidate_pool": self.candidate_pool,
+            "page_size": self.page_size, "fetch_limit": self.fetch_limit,
+        }
+
+
+DEFAULT_REVIEW_BUDGET = ReviewBudget()
+
+
+class FetchedReviews(list):
+    """
+    The raw reviews `fetch_reviews` kept, plus why paging stopped: "seen" (reached a review
+    the caller already has), "end" (no more pages), "limit" (page cap or the budget's
+    fetch limit) or "error" (a failed page). `ranked` counts every review that was ranked,
+    including those that didn't make the candidate pool.
+    """
+
+    def __init__(self, reviews=(), stop_reason="end", ranked=0):
+        super().__init__(reviews)
+        self.stop_reason = stop_reason
+        self.ranked = ranked
+
+    @property
+    def complete(self):
+        """True when every review up to a seen one (or the end of the feed) was ranked."""
+        return self.stop_reason in ("seen", "end")
+
+    @property
+    def failed(self):
+        return self.stop_reason == "error"
+
+
+def generate_random_id(length):
+    """Generates a URL-safe random ID, mimicking the Go implementation."""
+    num_bytes = (length * 6 + 7) // 8
+    random_bytes = os.urandom(num_bytes)
+    encoded = base64.urlsafe_b64encode(random_bytes).decode('utf-8')
+    return encoded.replace('=', '')[:length]
+
+
+def extract_place_id(place_link):
+    """Returns the place id the reviews RPC expects (`!1s...` or `ftid=...`) from a link, or None."""
+    match = re.search(r'!1s([^!]+)', place_link or "")
+    if not match:
+        match = re.search(r'ftid=([^&]+)', place_link or "")
+    return match.group(1) if match else None
+
+
+def build_reviews_url(place_id, page_token="", sort=REVIEWS_SORT_RELEVANT, page_size=REVIEWS_PAGE_SIZE):
+    """Builds one 'listugcposts' RPC URL for a page of reviews."""
+    request_id = generate_random_id(21)
+    pb_components = [
+        f"!1m6!1s{quote(place_id)}",
+        "!6m4!4m1!1e1!4m1!1e3",
+        f"!2m2!1i{page_size}!2s{quote(page_token)}",
+        f"!5m2!1s{request_id}!7e81",
+        "!8m9!2b1!3b1!5b1!7b1!12m4!1b1!2b1!4m1!1e1!11m4!1e3!2e1!6m1!1i2",
+        f"!13m1!1e{sort}",
+    ]
+    return f"{REVIEWS_RPC_URL}?authuser=0&hl=en&pb={''.join(pb_components)}"
+
+
+async def fetch_reviews(place_id, newest_first=False, is_seen=None, budget=None, on_review=None, skip=None):
+    """
+    Fetches the raw user reviews of a place by paging the internal 'listugcposts' RPC
+    over the shared HTTP client. No browser page is involved; cookies are whatever the
+    client last borrowed from a browser context.
+    Each page is ranked as it arrives and only the `budget`'s candidate pool is kept:
+    the returned raw reviews are that pool, best first. Paging stops after the budget's
+    `fetch_limit` reviews (or REVIEWS_MAX_PAGES pages), whichever comes first.
+    With `is_seen`, paging stops at the first review for which it returns True and only
+    the reviews before it count; combine it with `newest_first`. `on_review` is called
+    with every review that counts, including those that don't make the pool; reviews
+    for which `skip` returns True don't count at all.
+    Returns a FetchedReviews, which tells a complete walk from a truncated or failed one.
+    """
+    budget = budget or DEFAULT_REVIEW_BUDGET
+    print(f"  - Using place_id for reviews: {place_id}")
+    sort = REVIEWS_SORT_NEWEST if newest_first else REVIEWS_SORT_RELEVANT
+    ranker = budget.ranker()
+    next_page_token = ""
+    page_num = 0
+    stop_reason = "end"
+
+    while True:
+        try:
+            with metrics.stage_timer("review_page"):
+                response = await http_session.get(build_reviews_url(place_id, next_page_token, sort, budget.page_size))
+            if response.status_code != 200:
+                print(f"Error fetching reviews page {page_num+1}: Status {response.status_code}")
+                stop_reason = "error"
+                break
+
+            json_str = response.content.decode('utf-8').lstrip(")]}'")
+            data = json.loads(json_str)
+
+            reviews_list = extractor.safe_get(data, 2)
+            reached_seen = False
+            if isinstance(reviews_list, list):
+                for review_item in reviews_list:
+                    if is_seen and is_seen(review_item):
+                        reached_seen = True
+                        break
+                    if skip and skip(review_item):
+                        continue
+                    if on_review:
+                        on_review(review_item)
+                    ranker.add(review_item)
+
+            next_page_token = extractor.safe_get(data, 1)
+
+            if reached_seen or not next_page_token:
+                stop_reason = "seen" if reached_seen else "end"
+                break
+            if page_num >= REVIEWS_MAX_PAGES or ranker.ranked >= budget.fetch_limit:
+                stop_reason = "limit"
+                break
+
+            page_num += 1
+            await asyncio.sleep(random.uniform(0.8, 1.8))
+
+        except Exception as e:
+            print(f"An exception occurred while fetching reviews: {e}")
+            stop_reason = "error"
+            break
+
+    return FetchedReviews(ranker.candidates(), stop_reason, ranker.ranked)
+
+
+def review_state_key(place_id):
+    return place_id.lower()
+
+
+async def fetch_new_reviews(place_id, budget=None):
+    """
+    "Since last run" mode: fetches reviews newest-first and stops at the first review an
+    earlier run already returned (or anything older than the newest one it saw). Returns
+    only reviews that weren't returned before, already sampled down to the budget's
+    `max_reviews`; the first run for a place returns what a plain fetch would.
+    The seen ids and the newest timestamp only advance when the walk reached a seen
+    review or the end of the feed and every new review was returned. Otherwise (paging
+    stopped early, failed, or more new reviews than `max_reviews`) the returned ids are
+    kept aside as `returned_ids`: later runs skip them and carry on with the rest.
+    """
+    budget = budget or DEFAULT_REVIEW_BUDGET
+    key = review_state_key(place_id)
+    state = await asyncio.to_thread(review_store.get, key) if review_store.enabled else None
+    seen_ids = set(state["seen_ids"]) if state else set()
+    returned_ids = state.get("returned_ids", []) if state else []
+    newest = state["newest"] if state else None
+
+    def is_seen(review_item):
+        if extractor.get_review_id(review_item) in seen_ids:
+            return True
+        timestamp = extractor.get_review_timestamp(review_item)
+        return newest is not None and timestamp is not None and timestamp < newest
+
+    # Ids (newest first) of every new review, not just the ranked candidate pool
+    # fetch_reviews keeps, and the newest timestamp among them and the skipped ones
+    new_ids = []
+    newest_new = None
+    returned = set(returned_ids)
+
+    def note_timestamp(review_item):
+        nonlocal newest_new
+        timestamp = extractor.get_review_timestamp(review_item)
+        if timestamp is not None and (newest_new is None or timestamp > newest_new):
+            newest_new = timestamp
+
+    def record(review_item):
+        review_id = extractor.get_review_id(review_item)
+        if review_id and len(new_ids) < REVIEW_STATE_MAX_IDS:
+            new_ids.append(review_id)
+        note_timestamp(review_item)
+
+    def was_returned(review_item):
+        if extractor.get_review_id(review_item) not in returned:
+            return False
+        note_timestamp(review_item)
+        return True
+
+    fetched = await fetch_reviews(
+        place_id, newest_first=True, is_seen=is_seen if state else None, budget=budget,
+        on_review=record, skip=was_returned if returned else None,
+    )
+    new_reviews = FetchedReviews(budget.sample(fetched), fetched.stop_reason, fetched.ranked)
+    print(f"  - {len(new_ids)} new reviews since last run for: {place_id}")
+
+    if review_store.enabled:
+        if fetched.complete and len(new_reviews) == fetched.ranked:
+            new_state = merge_review_state(state, new_ids + returned_ids, newest_new)
+        else:
+            new_state = dict(state or {"seen_ids": [], "newest": None})
+            sent_ids = [review_id for review_id in map(extractor.get_review_id, new_reviews) if review_id]
+            if sent_ids:
+                new_state["returned_ids"] = (sent_ids + returned_ids)[:REVIEW_STATE_MAX_IDS]
+        # Written even without new reviews so the state lives REVIEW_STATE_TTL past the last run
+        await asyncio.to_thread(review_store.set, key, new_state)
+    return new_reviews
+
+
+def merge_review_state(state, new_ids, newest_new=None):
+    """Prepends `new_ids` (newest first) to a stored review state and advances its newest timestamp."""
+    previous_ids = state["seen_ids"] if state else []
+    timestamps = [t for t in (newest_new, state["newest"] if state else None) if t is not None]
+    return {
+        "seen_ids": (new_ids + previous_ids)[:REVIEW_STATE_MAX_IDS],
+        "newest": max(timestamps) if timestamps else None,
+    }
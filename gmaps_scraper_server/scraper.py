@@ -1,52 +1,201 @@
 import json
 import asyncio
-import re
-import random
-from urllib.parse import quote
 import os
-import base64
+import time
 from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 from urllib.parse import urlencode
 
 # Import the extraction functions and the browser manager
-from . import extractor
+from . import extractor, metrics, profiling
 from .browser_manager import browser_manager
+from .admission import admission_controller
+from .extraction_executor import extraction_executor
+from .cache import place_cache, place_cache_key, search_cache, search_cache_key
+from .http_client import http_session
+from .reviews import DEFAULT_REVIEW_BUDGET, FetchedReviews, extract_place_id, fetch_new_reviews, fetch_reviews
 
 # --- Constants ---
-BASE_URL = "https://www.google.com/maps/search/"
+# Origin serving Maps pages; point it at a stand-in such as benchmarks/fake_maps_server.py
+# for offline load tests.
+GMAPS_BASE_URL = os.environ.get("GMAPS_BASE_URL", "https://www.google.com").rstrip("/")
+BASE_URL = f"{GMAPS_BASE_URL}/maps/search/"
+# How long the feed may stay silent before the harvester nudges it with another scroll.
 SCROLL_PAUSE_TIME = 1.5
 MAX_SCROLL_ATTEMPTS_WITHOUT_NEW_LINKS = 5
+FEED_SELECTOR = '[role="feed"]'
+END_OF_LIST_TEXT = "You've reached the end of the list."
+# Upper bound on pages a single /scrape request may hold; the worker-wide
+# budget in `admission` is shared fairly between concurrent requests.
+CONCURRENCY_LIMIT = 15
+# Marks a detail worker running out of links in the scrape pipeline.
+_WORKER_DONE = object()
+# How place pages are fetched: "browser" renders every place in Chromium, "http"
+# fetches the raw HTML with the pooled HTTP client and only falls back to the
+# browser when the page has no data blob.
+PLACE_FETCH_MODE = os.environ.get("PLACE_FETCH_MODE", "browser").lower()
+# What is read back from a rendered place page: "content" serializes the whole DOM
+# with page.content(); "state" evaluates in the page and returns only the page-state
+# script plus the few snippets the HTML fallbacks look at.
+PAGE_CAPTURE_MODE = os.environ.get("PAGE_CAPTURE_MODE", "content").lower()
+# Reviews RPC pagings a single /scrape request runs at once in its review pipeline.
+REVIEW_RPC_CONCURRENCY = int(os.environ.get("REVIEW_RPC_CONCURRENCY", 10))
+# Serializes the one-off cookie capture for browserless jobs.
+_cookie_capture_lock = asyncio.Lock()
+# Search opened to pass the consent wall before a browserless job borrows cookies.
+CONSENT_BOOTSTRAP_QUERY = "restaurants"
+
+# In-page feed harvester. A MutationObserver reports only the place links added since
+# the last batch (plus an end-of-list flag) through the exposed binding, and scrolls
+# again right away, so the feed is paged as fast as Maps renders it.
+FEED_HARVESTER_JS = """
+([feedSelector, endText, bindingName]) => {
+    const feed = document.querySelector(feedSelector);
+    if (!feed) return false;
+    const seen = new Set();
+    const collect = (root, fresh) => {
+        if (root.nodeType !== Node.ELEMENT_NODE) return;
+        const anchors = root.matches('a[href*="/maps/place/"]')
+            ? [root] : root.querySelectorAll('a[href*="/maps/place/"]');
+        for (const a of anchors) {
+            if (!seen.has(a.href)) {
+                seen.add(a.href);
+                fresh.push(a.href);
+            }
+        }
+    };
+    const hasEndMarker = (root) => (root.textContent || '').includes(endText);
+    const report = (fresh, atEnd) => {
+        if (fresh.length || atEnd) window[bindingName](fresh, atEnd);
+        feed.scrollTop = feed.scrollHeight;
+    };
+    const observer = new MutationObserver((mutations) => {
+        const fresh = [];
+        let atEnd = false;
+        for (const mutation of mutations) {
+            for (const node of mutation.addedNodes) {
+                collect(node, fresh);
+                atEnd = atEnd || hasEndMarker(node);
+            }
+        }
+        if (atEnd) observer.disconnect();
+        report(fresh, atEnd);
+    });
+    observer.observe(feed, { childList: true, subtree: true });
+    const initial = [];
+    collect(feed, initial);
+    report(initial, hasEndMarker(feed));
+    return true;
+}
+"""
+
+# Re-triggers lazy loading when the feed has gone quiet without reaching the end.
+FEED_NUDGE_JS = """
+(feedSelector) => {
+    const feed = document.querySelector(feedSelector);
+    if (!feed) return;
+    feed.scrollBy(0, -200);
+    feed.scrollTop = feed.scrollHeight;
+}
+"""
+
+# Collects the APP_INITIALIZATION_STATE assignment and the markup the extractor's HTML
+# fallbacks match (title, aria-labels, address/website items, tel: links, category
+# buttons). Returns null when the state script isn't there.
+PLACE_SNAPSHOT_JS = """
+([marker, endMarker]) => {
+    let state = null;
+    for (const script of document.scripts) {
+        const text = script.textContent;
+        const start = text.indexOf(marker);
+        if (start === -1) continue;
+        const end = text.indexOf(endMarker, start);
+        state = end === -1 ? text.slice(start) : text.slice(start, end);
+        break;
+    }
+    if (state === null) return null;
+    const snippets = [];
+    const label = document.createElement('div');
+    for (const el of document.querySelectorAll('[aria-label]')) {
+        label.setAttribute('aria-label', el.getAttribute('aria-label'));
+        snippets.push(label.outerHTML);
+    }
+    const selectors = '[data-item-id="address"], [data-item-id="authority"], a[href^="tel:"], button[jsaction*="category" i]';
+    for (const el of document.querySelectorAll(selectors)) snippets.push(el.outerHTML);
+    const title = document.querySelector('title');
+    return { title: title ? title.outerHTML : '', snippets, state };
+}
+"""
 
 # --- Helper Functions ---
+def snapshot_to_html(snapshot):
+    """Lays a PLACE_SNAPSHOT_JS result out as a small page the extractor reads like the full one."""
+    return (
+        f"<html><head>{snapshot['title']}</head><body>{''.join(snapshot['snippets'])}"
+        f"<script>{snapshot['state']}{extractor.INITIAL_STATE_END_MARKER}=[];</script></body></html>"
+    )
+
+async def capture_place_html(page):
+    """
+    Returns the HTML to extract a rendered place page from. In "state" capture mode only
+    the page state and the fallback snippets cross CDP; pages without the state script
+    are still captured whole.
+    """
+    with metrics.stage_timer("capture"):
+        if PAGE_CAPTURE_MODE == "state":
+            snapshot = await page.evaluate(
+                PLACE_SNAPSHOT_JS, [extractor.INITIAL_STATE_MARKER, extractor.INITIAL_STATE_END_MARKER]
+            )
+            if snapshot:
+                return snapshot_to_html(snapshot)
+        return await page.content()
+
 def create_search_url(query, lang="en", geo_coordinates=None, zoom=None):
     """Creates a Google Maps search URL."""
     params = {'q': query, 'hl': lang}
     return BASE_URL + "?" + urlencode(params)
 
-def generate_random_id(length):
-    """Generates a URL-safe random ID, mimicking the Go implementation."""
-    num_bytes = (length * 6 + 7) // 8
-    random_bytes = os.urandom(num_bytes)
-    encoded = base64.urlsafe_b64encode(random_bytes).decode('utf-8')
-    return encoded.replace('=', '')[:length]
+async def ensure_http_cookies(lang="en"):
+    """
+    Makes sure the shared HTTP client carries the consent cookie before a browserless job.
+    A pooled context that hasn't passed consent yet loads Maps and accepts it first, then
+    its cookies are borrowed; later syncs piggyback on contexts the scraper already holds.
+    """
+    if http_session.has_cookies:
+        return
+    async with _cookie_capture_lock:
+        if http_session.has_cookies:
+            return
+        async with browser_manager.pooled_context(lang=lang) as context:
+            await http_session.borrow_cookies(context, force=True)
+            if http_session.has_cookies:
+                return
+            page = await context.new_page()
+            try:
+                print("Passing the consent wall for browserless jobs...")
+                with metrics.stage_timer("consent"):
+                    await page.goto(create_search_url(CONSENT_BOOTSTRAP_QUERY, lang), wait_until='domcontentloaded')
+                    await handle_consent(page)
+            finally:
+                await page.close()
+            await http_session.borrow_cookies(context, force=True)
+        if not http_session.has_cookies:
+            # Maps loaded without a consent wall: this region doesn't ask for one
+            http_session.consent_not_required = True
 
-async def fetch_all_reviews(page, place_link, place_id=None):
+async def fetch_all_reviews(page, place_link, place_id=None, review_budget=None):
     """
-    Fetches all user reviews by simulating the internal 'listugcposts' RPC call.
+    Fetches the user reviews for the place open in `page` through the reviews RPC,
+    up to what `review_budget` can use.
     If place_id is not provided, it attempts to extract it from the place_link.
+    The RPC itself goes over the shared HTTP client, using the page's cookies.
     """
     if not place_id:
-        place_id_match = re.search(r'!1s([^!]+)', place_link)
-        if not place_id_match:
-            place_id_match = re.search(r'ftid=([^&]+)', place_link)
-            
-        if place_id_match:
-            place_id = place_id_match.group(1)
-        else:
+        place_id = extract_place_id(place_link)
+        if not place_id:
             print("Could not extract place ID for reviews RPC from link.")
             # Fallback: Try to extract from page content if available
             try:
-                content = await page.content()
+                content = await capture_place_html(page)
                 json_str = extractor.extract_initial_json(content)
                 if json_str:
                     initial_data = json.loads(json_str)
@@ -57,61 +206,53 @@ async def fetch_all_reviews(page, place_link, place_id=None):
 
     if not place_id:
         print("Failed to resolve place ID. Cannot fetch reviews.")
-        return []
-
-    print(f"  - Using place_id for reviews: {place_id}")
-    rpc_base_url = "https://www.google.com/maps/rpc/listugcposts"
-    all_reviews_data = []
-    next_page_token = ""
-    page_num = 0
-    max_pages = 20
-
-    while True:
-        request_id = generate_random_id(21)
-        pb_components = [
-            f"!1m6!1s{quote(place_id)}",
-            "!6m4!4m1!1e1!4m1!1e3",
-            f"!2m2!1i10!2s{quote(next_page_token)}",
-            f"!5m2!1s{request_id}!7e81",
-            "!8m9!2b1!3b1!5b1!7b1!12m4!1b1!2b1!4m1!1e1!11m4!1e3!2e1!6m1!1i2!13m1!1e1",
-        ]
-        pb_param = "".join(pb_components)
-        full_url = f"{rpc_base_url}?authuser=0&hl=en&pb={pb_param}"
-        
-        try:
-            response = await page.request.get(full_url)
-            if response.status != 200:
-                print(f"Error fetching reviews page {page_num+1}: Status {response.status}")
-                break
-
-            content = await response.body()
-            json_str = content.decode('utf-8').lstrip(")]}'")
-            data = json.loads(json_str)
-
-            reviews_list = extractor.safe_get(data, 2)
-            if isinstance(reviews_list, list):
-                all_reviews_data.extend(reviews_list)
-
-            next_page_token = extractor.safe_get(data, 1)
-            
-            if not next_page_token or page_num >= max_pages or len(all_reviews_data) > 300:
-                break
-                
-            page_num += 1
-            await asyncio.sleep(random.uniform(0.8, 1.8))
+        return FetchedReviews([], "error")
 
-        except Exception as e:
-            print(f"An exception occurred while fetching reviews: {e}")
-            break
-            
-    return all_reviews_data
+    await http_session.borrow_cookies(page.context)
+    return await fetch_reviews(place_id, budget=review_budget)
 
 # --- Main Scraping Logic ---
-async def scrape_reviews_only(context, link, semaphore):
+async def scrape_reviews_by_place_id(link, place_id, lang="en", since_last_run=False, review_budget=None):
+    """
+    Scrapes ONLY user reviews for a place whose id is already known, without any
+    browser navigation: the reviews RPC is called directly over the shared HTTP client.
+    With `since_last_run`, only reviews posted since the previous run are returned.
+    """
+    review_budget = review_budget or DEFAULT_REVIEW_BUDGET
+    try:
+        print(f"Processing reviews by place id: {link}")
+        await ensure_http_cookies(lang)
+        if since_last_run:
+            all_reviews = await fetch_new_reviews(place_id, budget=review_budget)
+        else:
+            all_reviews = await fetch_reviews(place_id, budget=review_budget)
+        if reviews_failed(all_reviews) and not all_reviews:
+            raise Exception("The reviews RPC failed before returning any reviews.")
+        with metrics.stage_timer("review_selection"):
+            user_reviews = await extraction_executor.select_reviews(all_reviews, review_budget)
+        return {
+            "link": link,
+            "resolved_url": link,
+            "user_reviews": user_reviews or [],
+            "status": "success"
+        }
+    except Exception as e:
+        print(f"  - Error processing {link}: {e}")
+        metrics.record_failure("reviews", "error")
+        return {"link": link, "status": "error", "error": str(e)}
+
+async def scrape_reviews_only(context, link, semaphore, since_last_run=False, review_budget=None, lang="en"):
     """
     Scrapes ONLY user reviews for a single place link.
-    Optimized for performance by skipping full place details extraction and blocking assets.
+    Links that already carry a place id skip navigation entirely; others (e.g. short
+    links) are opened once to resolve the final URL.
     """
+    review_budget = review_budget or DEFAULT_REVIEW_BUDGET
+    place_id = extract_place_id(link)
+    if place_id:
+        await http_session.borrow_cookies(context)
+        return await scrape_reviews_by_place_id(link, place_id, lang, since_last_run, review_budget)
+
     async with semaphore:
         page = None
         try:
@@ -119,16 +260,25 @@ async def scrape_reviews_only(context, link, semaphore):
             print(f"Processing link for reviews only: {link}")
             
             # Navigate and follow redirects. 'load' is safer for session initialization.
-            await page.goto(link, wait_until='load', timeout=60000)
+            with metrics.stage_timer("reviews_goto"):
+                await page.goto(link, wait_until='load', timeout=60000)
             
             resolved_url = page.url
             print(f"  - Resolved URL: {resolved_url}")
             
-            all_reviews = await fetch_all_reviews(page, resolved_url)
+            place_id = extract_place_id(resolved_url)
+            if since_last_run and place_id:
+                await http_session.borrow_cookies(page.context)
+                all_reviews = await fetch_new_reviews(place_id, budget=review_budget)
+            else:
+                all_reviews = await fetch_all_reviews(page, resolved_url, place_id, review_budget)
+            if reviews_failed(all_reviews) and not all_reviews:
+                raise Exception("The reviews RPC failed before returning any reviews.")
             
             # Process and select high-quality reviews
-            # Note: We run this in a thread to avoid blocking the event loop
-            user_reviews = await asyncio.to_thread(extractor.process_and_select_reviews, all_reviews)
+            # Note: This runs on the extraction executor to avoid blocking the event loop
+            with metrics.stage_timer("review_selection"):
+                user_reviews = await extraction_executor.select_reviews(all_reviews, review_budget)
             
             return {
                 "link": link,
@@ -139,149 +289,448 @@ async def scrape_reviews_only(context, link, semaphore):
 
         except PlaywrightTimeoutError:
             print(f"  - Timeout processing: {link}")
+            metrics.record_failure("reviews", "timeout")
             return {"link": link, "status": "timeout", "error": "Timeout navigating to the link."}
         except Exception as e:
             print(f"  - Error processing {link}: {e}")
+            metrics.record_failure("reviews", "error")
             return {"link": link, "status": "error", "error": str(e)}
         finally:
             if page:
                 await page.close()
 
-async def scrape_google_maps(query, max_places=None, lang="en", extract_reviews=False):
+async def scrape_google_maps(query, max_places=None, lang="en", extract_reviews=False, ticket=None, max_age=None, refresh=False, review_budget=None):
     """
     Scrapes Google Maps for places based on a query using a shared browser context.
+    Collects everything `iter_scrape_google_maps` yields into a list.
     """
-    results = []
-    place_links = set()
-    scroll_attempts_no_new = 0
+    results = [place async for place in iter_scrape_google_maps(query, max_places, lang, extract_reviews, ticket, max_age, refresh, review_budget)]
+    print(f"\nScraping finished. Found details for {len(results)} places.")
+    return results
+
+async def iter_scrape_google_maps(query, max_places=None, lang="en", extract_reviews=False, ticket=None, max_age=None, refresh=False, review_budget=None):
+    """
+    Async generator yielding each place's details as soon as it is scraped.
+    Pages are admitted through `ticket` (an admission `RequestTicket`); a private one
+    is opened when the caller doesn't pass its own. Closing the generator early
+    cancels the outstanding place tasks. `max_age` caps the age (seconds) of place
+    details served from the cache; 0 forces a fresh scrape. A cached link list for the
+    same query skips the search and scrolling entirely unless `refresh` is set.
+    `review_budget` (a `reviews.ReviewBudget`) sizes the reviews of each place.
+    """
+    if ticket is None:
+        with admission_controller.request("scrape", limit=CONCURRENCY_LIMIT) as ticket:
+            async for place in iter_scrape_google_maps(query, max_places, lang, extract_reviews, ticket, max_age, refresh, review_budget):
+                yield place
+        return
+
     context = None
+    discard_context = False
+    link_queue = asyncio.Queue()
+    result_queue = asyncio.Queue()
+    # Detail workers start as soon as the first links are harvested, so scrolling
+    # and place scraping overlap instead of running back to back.
+    worker_count = ticket.limit
+    tasks = []
+    # With extract_reviews, reviews are fetched by a separate pipeline that starts on
+    # each link as soon as it is harvested, bounded by RPC concurrency rather than pages.
+    review_tasks = {}
+    review_slots = asyncio.Semaphore(REVIEW_RPC_CONCURRENCY)
+    # When each link was harvested, to time how long it waited for a detail worker
+    enqueued_at = {}
+
+    async def fetch_link_reviews(link, place_id):
+        with profiling.place(link):
+            return await _fetch_link_reviews(link, place_id)
+
+    async def _fetch_link_reviews(link, place_id):
+        async with review_slots:
+            if await get_cached_place(link, lang, True, max_age, review_budget):
+                return None
+            return await fetch_reviews(place_id, budget=review_budget)
+
+    def enqueue(link):
+        enqueued_at[link] = time.perf_counter()
+        place_id = extract_place_id(link) if extract_reviews else None
+        if place_id and link not in review_tasks:
+            review_tasks[link] = asyncio.create_task(fetch_link_reviews(link, place_id))
+        link_queue.put_nowait(link)
+
+    async def produce_links():
+        try:
+            cached_links = None if refresh else await get_cached_links(query, lang, max_places)
+            if cached_links is not None:
+                print(f"Search cache hit for query: '{query}' ({len(cached_links)} links)")
+                for link in cached_links:
+                    enqueue(link)
+                return
+
+            harvested = []
+            def on_new_link(link):
+                harvested.append(link)
+                enqueue(link)
+
+            async with ticket:
+                await _harvest_place_links(context, query, lang, max_places, on_new_link)
+            await store_cached_links(query, lang, max_places, harvested)
+        finally:
+            for _ in range(worker_count):
+                link_queue.put_nowait(None)
+
+    async def scrape_links():
+        try:
+            while (link := await link_queue.get()) is not None:
+                reviews = review_tasks.pop(link, None)
+                with profiling.place(link):
+                    started = enqueued_at.pop(link, time.perf_counter())
+                    metrics.observe_stage("link_queue", time.perf_counter() - started, started)
+                    result_queue.put_nowait(await scrape_place_details(context, link, extract_reviews, ticket, lang, max_age, reviews, review_budget))
+        finally:
+            result_queue.put_nowait(_WORKER_DONE)
 
     try:
-        # Use a single page for the initial search and link gathering
-        context = await browser_manager.get_context(lang=lang)
-        page = await context.new_page()
-        if not page:
-            raise Exception("Failed to create a new browser page.")
+        # The context comes from the warm pool and is handed back when done.
+        context = await browser_manager.acquire_context(lang=lang)
+        if extract_reviews:
+            # The review pipeline pages the RPC before any place page is opened, so the
+            # HTTP client needs the consent cookie up front
+            await ensure_http_cookies(lang)
+        producer = asyncio.create_task(produce_links())
+        tasks = [producer] + [asyncio.create_task(scrape_links()) for _ in range(worker_count)]
+
+        finished_workers = 0
+        while finished_workers < worker_count:
+            place_data = await result_queue.get()
+            if place_data is _WORKER_DONE:
+                finished_workers += 1
+            elif place_data is not None:
+                yield place_data
+
+        # Surface harvesting errors once every harvested link has been scraped
+        await producer
 
+    except Exception as e:
+        print(f"An error occurred during scraping: {e}")
+        metrics.record_failure("scrape", "error")
+        import traceback
+        traceback.print_exc()
+        discard_context = True
+    finally:
+        tasks.extend(review_tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if context:
+            await browser_manager.release_context(context, discard=discard_context)
+
+async def _harvest_place_links(context, query, lang, max_places, on_new_link):
+    """
+    Runs the search and scrolls the results feed, calling `on_new_link(link)` for each
+    newly discovered place as soon as it appears. Stops at `max_places` links.
+    Returns the number of links found.
+    """
+    place_links = set()
+    scroll_attempts_no_new = 0
+    page = await context.new_page()
+    if not page:
+        raise Exception("Failed to create a new browser page.")
+
+    def add_links(links):
+        new_links_found = False
+        for link in links:
+            if max_places is not None and len(place_links) >= max_places:
+                break
+            if link not in place_links:
+                place_links.add(link)
+                on_new_link(link)
+                new_links_found = True
+        return new_links_found
+
+    try:
         search_url = create_search_url(query, lang)
         print(f"Navigating to search URL: {search_url}")
-        await page.goto(search_url, wait_until='domcontentloaded')
+        with metrics.stage_timer("search_goto"):
+            await page.goto(search_url, wait_until='domcontentloaded')
         await asyncio.sleep(2)
 
-        await handle_consent(page)
+        with metrics.stage_timer("consent"):
+            await handle_consent(page)
 
         print("Scrolling to load places...")
-        feed_selector = '[role="feed"]'
         try:
-            await page.wait_for_selector(feed_selector, state='visible', timeout=25000)
+            with metrics.stage_timer("feed_wait"):
+                await page.wait_for_selector(FEED_SELECTOR, state='visible', timeout=25000)
         except PlaywrightTimeoutError:
             if "/maps/place/" in page.url:
                 print("Detected single place page.")
-                place_links.add(page.url)
+                add_links([page.url])
             else:
-                print(f"Error: Feed element '{feed_selector}' not found. Taking screenshot.")
+                print(f"Error: Feed element '{FEED_SELECTOR}' not found. Taking screenshot.")
                 await page.screenshot(path='feed_not_found_screenshot.png')
-                return []
+                return 0
+
+        if await page.locator(FEED_SELECTOR).count() > 0:
+            scroll_started = time.perf_counter()
+            feed_events = asyncio.Queue()
+            binding_name = "__gmapsFeedHarvest"
+            await page.expose_function(binding_name, lambda links, at_end: feed_events.put_nowait((links, at_end)))
+            await page.evaluate(FEED_HARVESTER_JS, [FEED_SELECTOR, END_OF_LIST_TEXT, binding_name])
 
-        if await page.locator(feed_selector).count() > 0:
-            # Scrolling logic remains the same
-            last_height = await page.evaluate(f'document.querySelector(\'{feed_selector}\').scrollHeight')
             while True:
-                await page.evaluate(f'document.querySelector(\'{feed_selector}\').scrollTop = document.querySelector(\'{feed_selector}\').scrollHeight')
-                await asyncio.sleep(SCROLL_PAUSE_TIME)
+                try:
+                    links, at_end = await asyncio.wait_for(feed_events.get(), timeout=SCROLL_PAUSE_TIME)
+                except asyncio.TimeoutError:
+                    scroll_attempts_no_new += 1
+                    if scroll_attempts_no_new >= MAX_SCROLL_ATTEMPTS_WITHOUT_NEW_LINKS:
+                        print("Stopping scroll due to lack of new links.")
+                        break
+                    await page.evaluate(FEED_NUDGE_JS, FEED_SELECTOR)
+                    continue
 
-                current_links_list = await page.locator(f'{feed_selector} a[href*="/maps/place/"]').evaluate_all('elements => elements.map(a => a.href)')
-                current_links = set(current_links_list)
-                new_links_found = len(current_links - place_links) > 0
-                place_links.update(current_links)
-                print(f"Found {len(place_links)} unique place links so far...")
+                if add_links(links):
+                    scroll_attempts_no_new = 0
+                    print(f"Found {len(place_links)} unique place links so far...")
 
                 if max_places is not None and len(place_links) >= max_places:
                     print(f"Reached max_places limit ({max_places}).")
-                    place_links = set(list(place_links)[:max_places])
                     break
+                if at_end:
+                    print("Reached the end of the results list.")
+                    break
+            metrics.observe_stage("scroll", time.perf_counter() - scroll_started)
 
-                new_height = await page.evaluate(f'document.querySelector(\'{feed_selector}\').scrollHeight')
-                if new_height == last_height:
-                    end_marker_xpath = "//span[contains(text(), \"You've reached the end of the list.\")]"
-                    if await page.locator(end_marker_xpath).count() > 0:
-                        print("Reached the end of the results list.")
-                        break
-                    else:
-                        if not new_links_found:
-                            scroll_attempts_no_new += 1
-                            if scroll_attempts_no_new >= MAX_SCROLL_ATTEMPTS_WITHOUT_NEW_LINKS:
-                                print("Stopping scroll due to lack of new links.")
-                                break
-                        else:
-                            scroll_attempts_no_new = 0
-                else:
-                    last_height = new_height
-                    scroll_attempts_no_new = 0
-        
+    finally:
         await page.close() # Close the initial search page
 
-        # --- Scraping Individual Places Concurrently ---
-        if place_links:
-            print(f"\nScraping details for {len(place_links)} places concurrently...")
-            CONCURRENCY_LIMIT = 15
-            semaphore = asyncio.Semaphore(CONCURRENCY_LIMIT)
-
-            tasks = [scrape_place_details(context, link, extract_reviews, semaphore) for link in place_links]
-            scraped_data_list = await asyncio.gather(*tasks)
-            results = [data for data in scraped_data_list if data is not None]
+    return len(place_links)
 
-    except Exception as e:
-        print(f"An error occurred during scraping: {e}")
-        import traceback
-        traceback.print_exc()
+async def get_cached_links(query, lang, max_places):
+    """
+    Returns the cached ordered link list for a query, or None.
+    A list truncated by an earlier, smaller `max_places` only satisfies requests it covers.
+    """
+    if not search_cache.enabled:
+        return None
+    cached = await asyncio.to_thread(search_cache.get, search_cache_key(query, lang))
+    if not cached:
+        return None
+    links = cached["links"]
+    if max_places is not None and len(links) >= max_places:
+        return links[:max_places]
+    return links if cached["complete"] else None
+
+async def store_cached_links(query, lang, max_places, links):
+    if not links or not search_cache.enabled:
+        return
+    # The harvest stopped on max_places, so there may be more results than we saw
+    complete = max_places is None or len(links) < max_places
+    await asyncio.to_thread(search_cache.set, search_cache_key(query, lang), {"links": links, "complete": complete})
+
+async def get_cached_place(link, lang, extract_reviews, max_age=None, review_budget=None):
+    """
+    Returns cached place details for `link`, or None. Entries cached without reviews, or
+    with fewer reviews than `review_budget` asks for, don't satisfy review requests.
+    """
+    cache_key = place_cache_key(link, lang)
+    if not cache_key or not place_cache.enabled:
+        return None
+    cached = await asyncio.to_thread(place_cache.get, cache_key, max_age)
+    if not cached or (extract_reviews and not cached["with_reviews"]):
+        return None
+    place_data = cached["place"]
+    if extract_reviews:
+        max_reviews = (review_budget or DEFAULT_REVIEW_BUDGET).max_reviews
+        if cached.get("max_reviews", DEFAULT_REVIEW_BUDGET.max_reviews) < max_reviews:
+            return None
+        place_data["user_reviews"] = place_data.get("user_reviews", [])[:max_reviews]
+    else:
+        place_data["user_reviews"] = []
+    place_data['link'] = link
+    return place_data
+
+async def store_cached_place(link, lang, extract_reviews, place_data, review_budget=None):
+    """Caches place details; `extract_reviews` says whether their reviews can serve review requests."""
+    cache_key = place_cache_key(link, lang)
+    if cache_key and place_cache.enabled:
+        max_reviews = (review_budget or DEFAULT_REVIEW_BUDGET).max_reviews
+        entry = {"with_reviews": extract_reviews, "max_reviews": max_reviews, "place": place_data}
+        await asyncio.to_thread(place_cache.set, cache_key, entry)
+
+async def scrape_place_details(context, link, extract_reviews, semaphore, lang="en", max_age=None, reviews=None, review_budget=None):
+    """
+    Scrapes details for a single place link.
+    Served from the place cache when a fresh enough entry exists (see `max_age`), in which
+    case no page slot is taken at all. `reviews` is an optional task already fetching the
+    place's raw reviews (see the review pipeline in `iter_scrape_google_maps`); the page is
+    then only used for the details and its slot is freed before the reviews are awaited.
+    A `reviews` task that ends up unused (cache hit, failed page) is cancelled.
+    """
+    try:
+        return await _scrape_place_details(context, link, extract_reviews, semaphore, lang, max_age, reviews, review_budget)
     finally:
-        if context:
-            await context.close()
-
-    print(f"\nScraping finished. Found details for {len(results)} places.")
-    return results
+        if reviews is not None:
+            if not reviews.done():
+                reviews.cancel()
+            elif not reviews.cancelled():
+                # Marks a failure nobody awaited as retrieved
+                reviews.exception()
+
+async def _scrape_place_details(context, link, extract_reviews, semaphore, lang="en", max_age=None, reviews=None, review_budget=None):
+    review_budget = review_budget or DEFAULT_REVIEW_BUDGET
+    cached = await get_cached_place(link, lang, extract_reviews, max_age, review_budget)
+    if cached:
+        print(f"Cache hit for link: {link}")
+        return cached
+
+    if PLACE_FETCH_MODE == "http":
+        place_data, all_reviews = await _fetch_place_details_http(context, link, lang, extract_reviews, reviews, review_budget)
+        if place_data:
+            await store_cached_place(link, lang, extract_reviews and not reviews_failed(all_reviews), place_data, review_budget)
+            return place_data
+
+    html_content, all_reviews = await _load_place_page(
+        context, link, semaphore, review_budget if extract_reviews and reviews is None else None
+    )
+    if html_content is None:
+        return None
 
-async def scrape_place_details(context, link, extract_reviews, semaphore):
-    """Scrapes details for a single place link."""
+    try:
+        if extract_reviews and reviews is not None:
+            all_reviews = await _pipeline_reviews(reviews, link, review_budget)
+        place_data = await run_extraction(html_content, all_reviews, False, review_budget)
+    except Exception as e:
+        print(f"  - Error processing {link}: {e}")
+        metrics.record_failure("scrape", "error")
+        return None
+
+    if place_data:
+        place_data['link'] = link
+        await store_cached_place(link, lang, extract_reviews and not reviews_failed(all_reviews), place_data, review_budget)
+        return place_data
+    else:
+        print(f"  - Failed to extract data for: {link}")
+        return None
+
+async def run_extraction(html_content, all_reviews=None, require_blob=False, review_budget=None):
+    """Runs `extract_place_data` on the extraction executor and records its phase timings."""
+    review_budget = review_budget or DEFAULT_REVIEW_BUDGET
+    timeline = profiling.current_timeline()
+    started = time.perf_counter()
+    place_data, timings = await extraction_executor.extract_place_data(
+        html_content, all_reviews, require_blob,
+        max_reviews=review_budget.max_reviews, candidate_pool=review_budget.candidate_pool,
+        review_seed=review_budget.seed, cpu_samples=timeline.cpu_samples if timeline and timeline.cpu_profile else None,
+    )
+    extractor.extraction_stats.add(timings)
+    # Whatever the extraction itself didn't take was spent waiting for (or getting to) the executor
+    work = sum(timings.values())
+    queued = max(0.0, time.perf_counter() - started - work)
+    metrics.observe_stage("extraction_queue", queued, started)
+    metrics.observe_stage("extraction", work, started + queued,
+                          phases={phase: round(seconds, 4) for phase, seconds in timings.items()})
+    return place_data
+
+async def _load_place_page(context, link, semaphore, review_budget=None):
+    """
+    Renders a place page inside one page slot and returns (html_content, all_reviews),
+    or (None, None) on failure. Reviews are only fetched here when a `review_budget` is given.
+    """
     async with semaphore:
         page = None
         try:
             page = await context.new_page()
             print(f"Processing link: {link}")
-            await page.goto(link, wait_until='domcontentloaded')
+            with metrics.stage_timer("place_goto"):
+                await page.goto(link, wait_until='domcontentloaded')
             
             # Wait for main content to ensure semantic attributes are rendered
             try:
-                await page.wait_for_selector('div[role="main"]', timeout=5000)
+                with metrics.stage_timer("place_wait_main"):
+                    await page.wait_for_selector('div[role="main"]', timeout=5000)
             except:
                 pass
             
             all_reviews = None
-            if extract_reviews:
+            if review_budget:
                 print(f"  - Extracting all user reviews for: {link}")
-                all_reviews = await fetch_all_reviews(page, link)
+                all_reviews = await fetch_all_reviews(page, link, review_budget=review_budget)
 
-            html_content = await page.content()
-            place_data = await asyncio.to_thread(extractor.extract_place_data, html_content, all_reviews)
-
-            if place_data:
-                place_data['link'] = link
-                return place_data
-            else:
-                print(f"  - Failed to extract data for: {link}")
-                return None
+            return await capture_place_html(page), all_reviews
 
         except PlaywrightTimeoutError:
             print(f"  - Timeout navigating to or processing: {link}")
-            return None
+            metrics.record_failure("scrape", "timeout")
+            return None, None
         except Exception as e:
             print(f"  - Error processing {link}: {e}")
-            return None
+            metrics.record_failure("scrape", "error")
+            return None, None
         finally:
             if page:
                 await page.close()
 
+def reviews_failed(all_reviews):
+    """
+    True when the raw reviews of a place came from a failed fetch (or none ran): the
+    place may well have reviews, so its details mustn't be cached as having them.
+    """
+    return all_reviews is None or getattr(all_reviews, "failed", False)
+
+async def _pipeline_reviews(reviews, link, review_budget=None):
+    """Awaits a review pipeline task; it yields None when it skipped a place it found cached."""
+    all_reviews = await reviews
+    if all_reviews is None:
+        all_reviews = await fetch_reviews(extract_place_id(link), budget=review_budget)
+    return all_reviews
+
+
+async def fetch_place_details_http(context, link, lang="en", extract_reviews=False, reviews=None, review_budget=None):
+    """
+    Browserless fast path: fetches the place page over the shared HTTP client using the
+    browser context's cookies and runs the regular extractor on the raw HTML.
+    Reviews are fetched through the RPC concurrently when the link carries a place id.
+    Returns None when the page carries no data blob, so the caller falls back to Playwright.
+    """
+    place_data, _ = await _fetch_place_details_http(context, link, lang, extract_reviews, reviews, review_budget)
+    return place_data
+
+async def _fetch_place_details_http(context, link, lang="en", extract_reviews=False, reviews=None, review_budget=None):
+    """`fetch_place_details_http`, returning (place_data, all_reviews) so the caller can tell how the reviews went."""
+    review_budget = review_budget or DEFAULT_REVIEW_BUDGET
+    place_id = extract_place_id(link)
+    all_reviews = None
+    if extract_reviews and not place_id:
+        return None, None
+    try:
+        await http_session.borrow_cookies(context)
+        print(f"Fetching link over HTTP: {link}")
+        if extract_reviews:
+            if reviews is not None:
+                review_fetch = _pipeline_reviews(reviews, link, review_budget)
+            else:
+                review_fetch = fetch_reviews(place_id, budget=review_budget)
+            (resolved_url, html_content), all_reviews = await asyncio.gather(
+                fetch_place_html(link, lang), review_fetch
+            )
+        else:
+            (resolved_url, html_content), all_reviews = await fetch_place_html(link, lang), None
+        if not html_content:
+            return None, all_reviews
+        place_data = await run_extraction(html_content, all_reviews, True, review_budget)
+    except Exception as e:
+        print(f"  - HTTP fast path failed for {link}: {e}")
+        return None, all_reviews
+
+    if not place_data:
+        print(f"  - No data blob in raw HTML, falling back to browser for: {link}")
+        return None, all_reviews
+    place_data['link'] = link
+    return place_data, all_reviews
+
+async def fetch_place_html(link, lang="en"):
+    with metrics.stage_timer("http_fetch"):
+        return await http_session.fetch_text(link, lang=lang)
 
 async def handle_consent(page):
     """Handles the consent form if it appears."""
@@ -1,5 +1,7 @@
 import os
 import multiprocessing
+import shutil
+import tempfile
 
 # Server socket
 bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
@@ -11,6 +13,9 @@ bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
 # This can be overridden with the GUNICORN_WORKERS environment variable.
 default_workers = multiprocessing.cpu_count()
 workers = int(os.environ.get("GUNICORN_WORKERS", default_workers))
+# Exported so the workers size their extraction pools by the resolved count
+# (see EXTRACTION_WORKERS), whether or not it was set explicitly.
+os.environ["GUNICORN_WORKERS"] = str(workers)
 
 # Worker class
 # Use uvicorn's worker class for asyncio compatibility.
@@ -24,3 +29,20 @@ timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
 # Logging
 accesslog = "-"
 errorlog = "-"
+
+# Metrics
+# Workers write their Prometheus metrics to files in this directory so /metrics can
+# aggregate them, whichever worker serves it. It must be set before the app is imported.
+prometheus_multiproc_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "gmaps_scraper_metrics")
+)
+
+def on_starting(server):
+    # Start from empty files; counters from a previous run would be added in otherwise.
+    shutil.rmtree(prometheus_multiproc_dir, ignore_errors=True)
+    os.makedirs(prometheus_multiproc_dir, exist_ok=True)
+
+def child_exit(server, worker):
+    # Drops the gauges of a worker that exited, so they stop counting towards the live sum.
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
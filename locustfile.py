@@ -1,6 +1,13 @@
-
-from locust import HttpUser, task, between
+from locust import HttpUser, task, between, events
+import os
 import random
+import time
+
+# Offline runs: start benchmarks/fake_maps_server.py and the API with GMAPS_BASE_URL
+# pointing at it, then set LOCUST_BYPASS_CACHE=1 so every request really scrapes.
+MAX_PLACES = int(os.environ.get("LOCUST_MAX_PLACES", 10))
+EXTRACT_REVIEWS = os.environ.get("LOCUST_EXTRACT_REVIEWS", "false").lower() == "true"
+BYPASS_CACHE = os.environ.get("LOCUST_BYPASS_CACHE", "false").lower() == "true"
 
 class ScraperUser(HttpUser):
     wait_time = between(1, 5)  # Wait 1-5 seconds between tasks
@@ -15,11 +22,26 @@ class ScraperUser(HttpUser):
             "tourist attractions in Tokyo",
             "gyms in Los Angeles"
         ]
-        
+
         # Pick a random query
         random_query = random.choice(queries)
-        
-        self.client.get(
-            f"/scrape-get?query={random_query}&max_places=10&extract_reviews=False",
-            name="/scrape-get?query=[query]" # Group all requests under one name in the UI
-        )
+        params = f"max_places={MAX_PLACES}&extract_reviews={EXTRACT_REVIEWS}"
+        if BYPASS_CACHE:
+            params += "&refresh=true&max_age=0"
+
+        started = time.perf_counter()
+        with self.client.get(
+            f"/scrape-get?query={random_query}&{params}",
+            name="/scrape-get?query=[query]", # Group all requests under one name in the UI
+            catch_response=True,
+        ) as response:
+            if response.status_code != 200:
+                response.failure(f"HTTP {response.status_code}")
+                return
+            # One "places scraped" entry per returned place, so its RPS column reads as places/sec
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            for _ in response.json():
+                events.request.fire(
+                    request_type="PLACES", name="places scraped", response_time=elapsed_ms,
+                    response_length=0, exception=None, context={},
+                )
@@ -7,6 +7,12 @@ setup(
     install_requires=[
         "playwright",
         "fastapi",
-        "uvicorn[standard]"
+        "uvicorn[standard]",
+        "httpx[http2]",
+        "prometheus_client",
     ],
+    extras_require={
+        # Faster parsing of the page state during extraction
+        "fast": ["orjson"],
+    },
 )
\ No newline at end of file
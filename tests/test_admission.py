@@ -0,0 +1,78 @@
+import asyncio
+import os
+import sys
+import unittest
+
+# Add the project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from gmaps_scraper_server.admission import AdmissionController
+
+
+class TestAdmissionController(unittest.IsolatedAsyncioTestCase):
+    async def test_budget_is_shared_across_requests(self):
+        controller = AdmissionController(budget=3)
+        peak = 0
+
+        async def work(ticket):
+            nonlocal peak
+            async with ticket:
+                peak = max(peak, controller.in_use)
+                await asyncio.sleep(0.01)
+
+        with controller.request("a") as a, controller.request("b") as b:
+            await asyncio.gather(*(work(a) for _ in range(5)), *(work(b) for _ in range(5)))
+
+        self.assertEqual(peak, 3)
+        self.assertEqual(controller.in_use, 0)
+
+    async def test_small_request_is_not_starved_by_large_one(self):
+        controller = AdmissionController(budget=2)
+        order = []
+
+        async def work(ticket, label):
+            async with ticket:
+                order.append(label)
+                await asyncio.sleep(0.01)
+
+        with controller.request("big") as big, controller.request("small") as small:
+            big_tasks = [asyncio.create_task(work(big, "big")) for _ in range(10)]
+            await asyncio.sleep(0)
+            small_task = asyncio.create_task(work(small, "small"))
+            await asyncio.gather(*big_tasks, small_task)
+
+        # The small request gets the first slot freed after it arrived
+        self.assertEqual(order.index("small"), 2)
+        self.assertGreater(small.queue_wait, 0)
+        self.assertEqual(big.summary()["slots_granted"], 10)
+
+    async def test_per_request_limit(self):
+        controller = AdmissionController(budget=10)
+        peak = 0
+
+        async def work(ticket):
+            nonlocal peak
+            async with ticket:
+                peak = max(peak, ticket.in_use)
+                await asyncio.sleep(0.01)
+
+        with controller.request("limited", limit=2) as ticket:
+            await asyncio.gather(*(work(ticket) for _ in range(6)))
+
+        self.assertEqual(peak, 2)
+
+    async def test_cancelled_waiter_frees_its_place(self):
+        controller = AdmissionController(budget=1)
+        with controller.request("a") as ticket:
+            async with ticket:
+                waiter = asyncio.create_task(ticket.__aenter__())
+                await asyncio.sleep(0)
+                waiter.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await waiter
+            self.assertEqual(controller.in_use, 0)
+            self.assertEqual(controller.waiting, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import sys
+import unittest
+
+# Add the project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import run_benchmarks
+from gmaps_scraper_server import extractor
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+    def test_synthesized_inputs_exercise_the_extractor(self):
+        html = run_benchmarks.build_place_html(run_benchmarks.load_fixture("initial_data.json"), 4)
+        place = extractor.extract_place_data(html)
+        self.assertTrue(place["name"])
+        self.assertEqual(extractor.get_address_from_html(html), "Jl. Raya Ubud, Bali")
+
+        selected = extractor.process_and_select_reviews(run_benchmarks.build_raw_reviews(400), seed=1)
+        self.assertEqual(len(selected), extractor.REVIEW_SELECTION_COUNT)
+
+    def test_find_regressions(self):
+        baseline = {"a": {"normalized": 1.0, "peak_kib": 1000.0}, "b": {"normalized": 1.0, "peak_kib": 10.0}}
+        results = {
+            "a": {"normalized": 0.6, "peak_kib": 1400.0},
+            "b": {"normalized": 0.9, "peak_kib": 60.0},  # small absolute growth is noise
+            "new": {"normalized": 1.0, "peak_kib": 1.0},
+        }
+        regressions = run_benchmarks.find_regressions(results, baseline, tolerance=0.3)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(r.startswith("a:") for r in regressions))
+
+    def test_micro_cases_get_a_wider_tolerance(self):
+        baseline = {
+            "micro": {"ops_per_sec": 5000.0, "normalized": 1.0, "peak_kib": 10.0},
+            "slow": {"ops_per_sec": 50.0, "normalized": 1.0, "peak_kib": 10.0},
+        }
+        results = {name: {"normalized": 0.5, "peak_kib": 10.0} for name in baseline}
+        regressions = run_benchmarks.find_regressions(results, baseline, tolerance=0.3)
+        self.assertEqual(regressions, ["slow: throughput -50%"])
+
+    def test_measure_memory_counts_held_blocks(self):
+        peak_kib, retained_kib, blocks = run_benchmarks.measure_memory(lambda: [object() for _ in range(1000)])
+        self.assertGreaterEqual(blocks, 1000)
+        self.assertGreaterEqual(peak_kib, retained_kib)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+# Add the project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from gmaps_scraper_server.cache import TieredCache, place_cache_key
+
+
+class TestTieredCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "cache.sqlite3")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def make_cache(self, ttl=60, memory_size=10):
+        return TieredCache("place_details", ttl, memory_size, db_path=self.db_path)
+
+    def test_memory_hit_returns_a_copy(self):
+        cache = self.make_cache()
+        cache.set("k", {"name": "A"})
+        first = cache.get("k")
+        first["name"] = "mutated"
+
+        self.assertEqual(cache.get("k"), {"name": "A"})
+        self.assertEqual(cache.counters["memory_hits"], 2)
+
+    def test_disk_tier_is_shared_between_instances(self):
+        self.make_cache().set("k", {"name": "A"})
+        other_worker = self.make_cache()
+
+        self.assertEqual(other_worker.get("k"), {"name": "A"})
+        self.assertEqual(other_worker.counters["disk_hits"], 1)
+        # Promoted into the memory tier
+        other_worker.get("k")
+        self.assertEqual(other_worker.counters["memory_hits"], 1)
+
+    def test_lru_eviction_of_memory_tier(self):
+        cache = self.make_cache(memory_size=2)
+        for key in ("a", "b", "c"):
+            cache.set(key, key)
+
+        self.assertEqual(list(cache._memory), ["b", "c"])
+        self.assertEqual(cache.get("a"), "a")  # still on disk
+        self.assertEqual(cache.counters["disk_hits"], 1)
+
+    def test_ttl_and_max_age(self):
+        cache = self.make_cache(ttl=60)
+        cache.set("k", 1)
+        stored_at, value = cache._memory["k"]
+        cache._memory["k"] = (stored_at - 30, value)
+        cache._conn.execute("UPDATE place_details SET stored_at = ?", (stored_at - 30,))
+
+        self.assertEqual(cache.get("k"), 1)
+        self.assertIsNone(cache.get("k", max_age=10))
+        self.assertIsNone(cache.get("k", max_age=0))
+
+        cache._memory["k"] = (time.time() - 120, value)
+        cache._conn.execute("UPDATE place_details SET stored_at = ?", (time.time() - 120,))
+        self.assertIsNone(cache.get("k"))
+        # max_age=0 bypasses the cache without counting a miss
+        self.assertEqual(cache.stats()["misses"], 2)
+
+    def test_disabled_cache(self):
+        cache = self.make_cache(ttl=0)
+        cache.set("k", 1)
+        self.assertIsNone(cache.get("k"))
+        self.assertFalse(os.path.exists(self.db_path))
+
+
+class TestPlaceCacheKey(unittest.TestCase):
+    def test_key_from_feature_id(self):
+        link = "https://www.google.com/maps/place/Starbucks/@40.7,-73.9,17z/data=!3m1!4b1!4m6!3m5!1s0x89c259a9b3117469:0xd134e199a405a163!8m2"
+        self.assertEqual(place_cache_key(link, "en"), "en:0x89c259a9b3117469:0xd134e199a405a163")
+        self.assertNotEqual(place_cache_key(link, "en"), place_cache_key(link, "fr"))
+
+    def test_link_without_identity(self):
+        self.assertIsNone(place_cache_key("https://maps.app.goo.gl/ViRpRQyv56MzQHsXA"))
+
+
+if __name__ == '__main__':
+    unittest.main()
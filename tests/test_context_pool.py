@@ -0,0 +1,292 @@
+import asyncio
+import os
+import sys
+import unittest
+
+# Add the project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from gmaps_scraper_server import browser_manager as bm
+
+
+class FakePage:
+    def __init__(self, context):
+        self.context = context
+
+    async def close(self):
+        self.context.pages.remove(self)
+
+
+class FakeCDPSession:
+    def __init__(self, context):
+        self.context = context
+
+    async def send(self, method, params):
+        await asyncio.sleep(0)
+        self.context.cleared_origins.append(params["origin"])
+        self.context._origins = [o for o in self.context._origins if o["origin"] != params["origin"]]
+
+    async def detach(self):
+        pass
+
+
+class FakeContext:
+    def __init__(self, browser=None):
+        self.browser = browser
+        self.pages = []
+        self.closed = False
+        self._cookies = [{"name": "SOCS", "value": "1"}, {"name": "NID", "value": "x"}]
+        self._origins = [{"origin": "https://maps.gstatic.com", "localStorage": [{"name": "k", "value": "v"}]}]
+        self.cleared_origins = []
+
+    async def close(self):
+        self.closed = True
+        if self.browser and self in self.browser.contexts:
+            self.browser.contexts.remove(self)
+
+    async def cookies(self):
+        return list(self._cookies)
+
+    async def clear_cookies(self):
+        self._cookies = []
+
+    async def add_cookies(self, cookies):
+        self._cookies.extend(cookies)
+
+    async def clear_permissions(self):
+        pass
+
+    async def storage_state(self):
+        return {"cookies": list(self._cookies), "origins": list(self._origins)}
+
+    async def new_page(self):
+        page = FakePage(self)
+        self.pages.append(page)
+        return page
+
+    async def new_cdp_session(self, page):
+        return FakeCDPSession(self)
+
+
+class FakeBrowser:
+    def __init__(self, delay=0):
+        self.contexts = []
+        self.connected = True
+        self.handlers = {}
+        self.created = 0
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def is_connected(self):
+        return self.connected
+
+    def on(self, event, handler):
+        self.handlers[event] = handler
+
+    async def close(self):
+        self.connected = False
+
+    async def new_context(self, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        self.created += 1
+        context = FakeContext(self)
+        self.contexts.append(context)
+        return context
+
+
+class FakeChromium:
+    def __init__(self, delay=0):
+        self.delay = delay
+
+    async def launch(self, headless=True):
+        await asyncio.sleep(self.delay)
+        return FakeBrowser()
+
+
+class FakePlaywright:
+    def __init__(self, launch_delay=0):
+        self.chromium = FakeChromium(launch_delay)
+
+
+def make_manager(shard_count=1, delay=0):
+    manager = bm.BrowserManager(shard_count=shard_count)
+    for shard in manager.shards:
+        shard.browser = FakeBrowser(delay=delay)
+    return manager
+
+
+class TestContextPool(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.manager = make_manager()
+
+    async def test_released_context_is_reused_and_reset(self):
+        context = await self.manager.acquire_context(lang="en")
+        await self.manager.release_context(context)
+        again = await self.manager.acquire_context(lang="en")
+
+        self.assertIs(context, again)
+        self.assertEqual(self.manager.browser.created, 1)
+        # Only consent cookies survive the reset
+        self.assertEqual([c["name"] for c in await again.cookies()], ["SOCS"])
+        # Origin storage is wiped, including origins only the storage state knew about
+        self.assertIn("https://www.google.com", again.cleared_origins)
+        self.assertIn("https://maps.gstatic.com", again.cleared_origins)
+        self.assertEqual((await again.storage_state())["origins"], [])
+        self.assertEqual(again.pages, [])
+
+    async def test_uncleanable_context_is_retired(self):
+        context = await self.manager.acquire_context()
+        async def broken(page):
+            raise RuntimeError("no DevTools session")
+        context.new_cdp_session = broken
+        await self.manager.release_context(context)
+
+        self.assertTrue(context.closed)
+        self.assertEqual(self.manager.pool_stats()["idle"].get("en:0", 0), 0)
+
+    async def test_concurrent_releases_respect_the_idle_limit(self):
+        original = bm.CONTEXT_POOL_MAX_IDLE
+        bm.CONTEXT_POOL_MAX_IDLE = 2
+        try:
+            contexts = [await self.manager.acquire_context() for _ in range(4)]
+            await asyncio.gather(*(self.manager.release_context(c) for c in contexts))
+        finally:
+            bm.CONTEXT_POOL_MAX_IDLE = original
+
+        self.assertEqual(self.manager.pool_stats()["idle"]["en:0"], 2)
+        self.assertEqual(sum(c.closed for c in contexts), 2)
+
+    async def test_pool_is_keyed_by_lang_and_blocking(self):
+        context = await self.manager.acquire_context(lang="en")
+        await self.manager.release_context(context)
+        other = await self.manager.acquire_context(lang="fr")
+
+        self.assertIsNot(context, other)
+        self.assertEqual(self.manager.browser.created, 2)
+
+    async def test_discarded_context_is_closed(self):
+        with self.assertRaises(RuntimeError):
+            async with self.manager.pooled_context(lang="en") as context:
+                raise RuntimeError("boom")
+
+        self.assertTrue(context.closed)
+        self.assertEqual(self.manager.pool_stats()["checked_out"], 0)
+
+    async def test_context_recycled_after_max_uses(self):
+        original = bm.CONTEXT_POOL_MAX_USES
+        bm.CONTEXT_POOL_MAX_USES = 2
+        try:
+            first = await self.manager.acquire_context()
+            await self.manager.release_context(first)
+            again = await self.manager.acquire_context()
+            await self.manager.release_context(again)
+        finally:
+            bm.CONTEXT_POOL_MAX_USES = original
+
+        self.assertTrue(first.closed)
+        self.assertEqual(self.manager.pool_stats()["recycled"], 1)
+
+    async def test_idle_contexts_are_evicted(self):
+        context = await self.manager.acquire_context()
+        await self.manager.release_context(context)
+        self.manager._idle[("en", False)][0].last_used -= bm.CONTEXT_POOL_IDLE_TIMEOUT + 1
+
+        await self.manager.evict_idle()
+
+        self.assertTrue(context.closed)
+        self.assertEqual(self.manager.pool_stats()["evicted"], 1)
+
+
+class TestContextCreationConcurrency(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.manager = make_manager(delay=0.01)
+        self.shard = self.manager.shards[0]
+
+    async def test_context_creation_runs_in_parallel(self):
+        await asyncio.gather(*(self.manager.acquire_context() for _ in range(10)))
+        self.assertEqual(self.manager.browser.max_in_flight, 10)
+
+    async def test_context_from_previous_generation_is_retried(self):
+        task = asyncio.create_task(self.manager.get_context())
+        await asyncio.sleep(0)
+        # Simulate a restart swapping the browser while the context is being created
+        old_browser = self.shard.browser
+        self.shard.browser = FakeBrowser()
+        self.shard.generation += 1
+
+        await task
+
+        self.assertEqual(old_browser.created, 1)
+        self.assertEqual(self.manager.browser.created, 1)
+
+    async def test_creation_waits_only_while_restarting(self):
+        self.shard._not_restarting.clear()
+        task = asyncio.create_task(self.manager.get_context())
+        await asyncio.sleep(0.02)
+        self.assertFalse(task.done())
+
+        self.shard._not_restarting.set()
+        await task
+        self.assertEqual(self.manager.browser.created, 1)
+
+    async def test_acquire_during_a_restart_waits_for_the_new_browser(self):
+        self.manager.playwright = FakePlaywright(launch_delay=0.02)
+        old_browser = self.shard.browser
+        restart = asyncio.create_task(self.manager.restart_shard(self.shard))
+        await asyncio.sleep(0)
+        self.assertIsNone(self.shard.browser)
+
+        context = await self.manager.acquire_context()
+        await restart
+
+        self.assertIsNot(context.browser, old_browser)
+        self.assertIs(context.browser, self.shard.browser)
+
+
+class TestBrowserSharding(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.manager = make_manager(shard_count=2)
+        self.manager.playwright = FakePlaywright()
+
+    async def test_contexts_go_to_least_loaded_shard(self):
+        first = await self.manager.acquire_context()
+        first.pages.extend(["page", "page"])
+        second = await self.manager.acquire_context()
+
+        self.assertIs(first.browser, self.manager.shards[0].browser)
+        self.assertIs(second.browser, self.manager.shards[1].browser)
+
+    async def test_crashed_shard_restarts_alone(self):
+        healthy_browser = self.manager.shards[1].browser
+        crashed = self.manager.shards[0]
+        crashed.generation = 1
+        crashed.browser.connected = False
+
+        self.manager._on_disconnected(crashed, 1)
+        await asyncio.gather(*self.manager._background_tasks)
+
+        self.assertTrue(crashed.is_healthy)
+        self.assertEqual(crashed.crashes, 1)
+        self.assertEqual(crashed.restarts, 1)
+        self.assertIs(self.manager.shards[1].browser, healthy_browser)
+        self.assertEqual([s["restarts"] for s in self.manager.shard_stats()], [1, 0])
+
+    async def test_restart_drops_only_that_shards_idle_contexts(self):
+        a = await self.manager.acquire_context()
+        b = await self.manager.acquire_context()
+        await self.manager.release_context(a)
+        await self.manager.release_context(b)
+
+        await self.manager.restart_shard(self.manager.shards[0])
+
+        self.assertTrue(a.closed)
+        self.assertFalse(b.closed)
+        self.assertEqual(self.manager.pool_stats()["idle"], {"en:0": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,223 @@
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+# Add the project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from gmaps_scraper_server import extractor, scraper
+from test_http_fast_path import ROOT, build_place_html
+
+
+class TestExtractPlaceData(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(ROOT, "data_blob.json"), encoding="utf-8") as f:
+            cls.place_html = build_place_html(json.load(f))
+
+    def test_page_state_is_parsed_once(self):
+        with mock.patch.object(extractor, "json_loads", wraps=extractor.json_loads) as loads:
+            place = extractor.extract_place_data(self.place_html)
+
+        # Once for the outer state, once for the inner data blob
+        self.assertEqual(loads.call_count, 2)
+        self.assertEqual(place["rating"], 4.9)
+
+    def test_phase_timings(self):
+        timings = {}
+        extractor.extract_place_data(self.place_html, timings=timings)
+        self.assertEqual(
+            set(timings),
+            {"locate_state", "parse_state", "parse_blob", "fields", "html_fallbacks", "reviews"},
+        )
+
+        stats = extractor.PhaseStats()
+        stats.add(timings)
+        stats.add(timings)
+        self.assertEqual(stats.summary()["extractions"], 2)
+        self.assertIn(stats.summary()["json_backend"], ("orjson", "json"))
+
+    def test_html_fallbacks_skip_the_page_state(self):
+        blob = [None] * 12
+        blob[11] = "Corner Cafe"
+        html = build_place_html(blob).replace(
+            "<html>", '<html><div aria-label="Address: 1 Main St"></div><div aria-label="4.2 stars"></div>'
+        )
+        fallback = mock.Mock(wraps=extractor.get_address_from_html)
+        with mock.patch.dict(extractor.HTML_FALLBACKS, {"address": fallback}):
+            place = extractor.extract_place_data(html)
+
+        self.assertEqual(place["name"], "Corner Cafe")
+        self.assertEqual(place["address"], "1 Main St")
+        self.assertEqual(place["rating"], "4.2")
+        self.assertNotIn("APP_INITIALIZATION_STATE", fallback.call_args.args[0])
+
+    def test_locate_initial_json(self):
+        html = 'x;window.APP_INITIALIZATION_STATE = [[1],[2]];window.APP_FLAGS=[];'
+        json_str, start, end = extractor.locate_initial_json(html)
+        self.assertEqual(json_str, "[[1],[2]]")
+        self.assertEqual(html[:start] + html[end:], "x=[];")
+
+
+class TestFieldSpecs(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(ROOT, "data_blob.json"), encoding="utf-8") as f:
+            cls.blob = json.load(f)
+
+    def test_compiled_fields_match_safe_get(self):
+        fields = extractor.extract_blob_fields(self.blob)
+        self.assertEqual(set(fields), set(extractor.FIELD_SPECS))
+        for field, (paths, post_process) in extractor.FIELD_SPECS.items():
+            value = extractor.safe_get(self.blob, *paths[0])
+            for path in paths[1:]:
+                value = value or extractor.safe_get(self.blob, *path)
+            self.assertEqual(fields[field], post_process(value) if post_process else value, field)
+        self.assertEqual((fields["rating"], fields["reviews_count"]), (4.9, 255))
+
+    def test_fallback_paths_and_odd_shapes(self):
+        extract = extractor.compile_field_specs({"id": ([[3, 1], [0]], None), "deep": ([[3, 1, 0]], None)})
+        self.assertEqual(extract(["a", None, None, [None, "b"]]), {"id": "b", "deep": None})
+        self.assertEqual(extract(["a", None, None, [None, ""]]), {"id": "a", "deep": None})
+        self.assertEqual(extract(["a", None, None, "not a list"]), {"id": "a", "deep": None})
+        self.assertEqual(extract(None), {"id": None, "deep": None})
+        self.assertEqual(extract({"3": 1}), {"id": None, "deep": None})
+
+    def test_marker_index(self):
+        blob = [{"k": [["call_googblue", "n/a"]]}, [["call_googblue x", "+1 (555) 010-0199"], ["web_site", "x"]]]
+        self.assertEqual(extractor.get_phone_number(blob), "15550100199")
+        index = extractor.MarkerIndex(blob, ["call_googblue", "web"])
+        self.assertEqual(next(index.nodes("web")), ["web_site", "x"])
+        self.assertEqual(len(list(index.nodes("call_googblue"))), 2)
+        self.assertEqual(extractor.get_phone_number(self.blob), "622129553600")
+
+    def test_marker_walk_has_no_recursion_limit(self):
+        blob = ["call_googblue", "42"]
+        for _ in range(sys.getrecursionlimit() * 2):
+            blob = [blob]
+        self.assertEqual(extractor.get_phone_number(blob), "42")
+
+    def test_single_field_getters(self):
+        self.assertEqual(extractor.get_rating(self.blob), 4.9)
+        self.assertEqual(extractor.get_categories(None), [])
+        self.assertIsNone(extractor.get_gps_coordinates([]))
+
+
+class TestLazyBlob(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(ROOT, "data_blob.json"), encoding="utf-8") as f:
+            cls.blob = json.load(f)
+        cls.place_html = build_place_html(cls.blob)
+
+    def test_element_spans(self):
+        text = '[ null, "a,]\\"[", [1, [2, "]"]], {"k": [3]}, 4.5 ,true ]'
+        spans = list(extractor.iter_array_elements(text, 0))
+        self.assertEqual([json.loads(text[a:b]) for a, b in spans], json.loads(text))
+        self.assertEqual(list(extractor.iter_array_elements("[]", 0)), [])
+
+    def test_reads_match_full_decoding(self):
+        lazy = extractor.LazyBlob.from_inner_json(json.dumps([None] * 6 + [self.blob]), 6)
+        self.assertIsInstance(lazy, list)
+        self.assertEqual(len(lazy), len(self.blob))
+        self.assertEqual(extractor.safe_get(lazy, 4, 7), 4.9)
+        self.assertEqual(lazy[-1], self.blob[-1])
+        self.assertEqual(list(lazy), self.blob)
+
+    def test_lazy_extraction_decodes_only_what_getters_read(self):
+        full = extractor.extract_place_data(self.place_html)
+        decoded = []
+        def decode(json_str_inner, decode_data_blob=extractor.decode_data_blob):
+            decoded.append(decode_data_blob(json_str_inner))
+            return decoded[-1]
+
+        with mock.patch.object(extractor, "BLOB_DECODING", "lazy"), \
+                mock.patch.object(extractor, "decode_data_blob", decode):
+            lazy = extractor.extract_place_data(self.place_html)
+
+        self.assertEqual(lazy, full)
+        self.assertIn("phone", lazy)
+        self.assertIsInstance(decoded[0], extractor.LazyBlob)
+        self.assertLess(len(decoded[0]._decoded), len(decoded[0]) // 4)
+
+
+def raw_review(n, description="", name="Ann"):
+    review = [f"id-{n}", [None, "a day ago", n, None, [None] * 5 + [[name, None]]], [None] * 15 + [[[description]]]]
+    return [review]
+
+
+class TestReviewRanking(unittest.TestCase):
+    def setUp(self):
+        lengths = [5, 0, 30, 5, 12, 30, 0, 7] * 10
+        self.raw = [raw_review(i, "x" * length) for i, length in enumerate(lengths)] + [[None]]
+
+    def test_heap_matches_a_full_stable_sort(self):
+        ranker = extractor.ReviewRanker(pool_size=25)
+        for start in range(0, len(self.raw), 10):  # page by page
+            ranker.extend(self.raw[start:start + 10])
+
+        ranked = sorted(
+            (r for r in self.raw if r[0]), key=lambda r: extractor.review_rank_key(r[0]), reverse=True
+        )
+        self.assertEqual(ranker.candidates(), ranked[:25])
+        self.assertEqual(ranker.ranked, 80)
+        self.assertEqual(len(ranker._heap), 25)
+
+    def test_seeded_sample_is_reproducible(self):
+        first = extractor.process_and_select_reviews(self.raw, 5, 40, seed=7)
+        self.assertEqual(first, extractor.process_and_select_reviews(self.raw, 5, 40, seed=7))
+        self.assertEqual(len(first), 5)
+        self.assertEqual(extractor.process_and_select_reviews([], 5, 40, seed=7), [])
+
+
+class FakePage:
+    def __init__(self, snapshot, content):
+        self.snapshot = snapshot
+        self._content = content
+        self.content_calls = 0
+
+    async def evaluate(self, script, args):
+        return self.snapshot
+
+    async def content(self):
+        self.content_calls += 1
+        return self._content
+
+
+class TestPageCapture(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        blob = [None] * 12
+        blob[11] = "Corner Cafe"
+        self.place_html = build_place_html(blob)
+        state_start = self.place_html.index(extractor.INITIAL_STATE_MARKER)
+        state_end = self.place_html.index(extractor.INITIAL_STATE_END_MARKER)
+        self.snapshot = {
+            "title": "<title>Corner Cafe - Google Maps</title>",
+            "snippets": ['<div aria-label="Address: 1 Main St"></div>', '<a href="tel:+15550100"></a>'],
+            "state": self.place_html[state_start:state_end],
+        }
+        self.patch = mock.patch.object(scraper, "PAGE_CAPTURE_MODE", "state")
+        self.patch.start()
+
+    async def asyncTearDown(self):
+        self.patch.stop()
+
+    async def test_state_capture_extracts_like_the_full_page(self):
+        page = FakePage(self.snapshot, None)
+        place = extractor.extract_place_data(await scraper.capture_place_html(page))
+
+        self.assertEqual(page.content_calls, 0)
+        self.assertEqual(place["name"], "Corner Cafe")
+        self.assertEqual(place["address"], "1 Main St")
+        self.assertEqual(place["phone"], "+15550100")
+
+    async def test_pages_without_state_are_captured_whole(self):
+        page = FakePage(None, "<html>consent wall</html>")
+        self.assertEqual(await scraper.capture_place_html(page), "<html>consent wall</html>")
+        self.assertEqual(page.content_calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+# Add the project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from gmaps_scraper_server import extractor
+from gmaps_scraper_server.extraction_executor import ExtractionExecutor
+from gmaps_scraper_server.reviews import ReviewBudget
+from test_http_fast_path import ROOT, build_place_html
+
+
+class TestExtractionExecutor(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(ROOT, "data_blob.json"), encoding="utf-8") as f:
+            cls.place_html = build_place_html(json.load(f))
+        cls.expected = extractor.extract_place_data(cls.place_html)
+
+    def test_default_workers_follow_gunicorn(self):
+        env = {k: v for k, v in os.environ.items() if k not in ("GUNICORN_WORKERS", "EXTRACTION_WORKERS")}
+        code = "import gunicorn_conf; from gmaps_scraper_server import extraction_executor as e; print(gunicorn_conf.workers, e.EXTRACTION_WORKERS)"
+        output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True, capture_output=True, text=True).stdout
+        gunicorn_workers, extraction_workers = map(int, output.split())
+        self.assertEqual(extraction_workers, max(1, (os.cpu_count() or 1) // gunicorn_workers))
+
+    def test_rejects_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            ExtractionExecutor(mode="gpu")
+
+    async def test_modes_return_the_same_place(self):
+        for mode in ("inline", "thread", "process"):
+            executor = ExtractionExecutor(mode=mode, workers=2)
+            try:
+                place, timings = await executor.extract_place_data(self.place_html)
+                missing = await executor.extract_place_data("<html></html>", require_blob=True)
+            finally:
+                executor.shutdown()
+
+            self.assertEqual(place, self.expected, mode)
+            self.assertIn("fields", timings)
+            self.assertIsNone(missing[0])
+            self.assertEqual(executor.stats()["queue_depth"], 0)
+            self.assertEqual(executor.stats()["completed"], 2)
+
+    async def test_select_reviews(self):
+        author = [None] * 5 + [["Ann", "//pic"]]
+        raw = [[[f"id-{i}", [None, "a day ago", i, None, author]]] for i in range(20)]
+        executor = ExtractionExecutor(mode="inline")
+        selected = await executor.select_reviews(raw, ReviewBudget(max_reviews=5))
+        self.assertEqual(len(selected), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+import httpx
+
+# Add the project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import fake_maps_server
+from gmaps_scraper_server import extractor, reviews
+from gmaps_scraper_server.http_client import HttpSession
+
+BASE_URL = "http://fakemaps"
+
+
+class TestFakeMapsServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.config = fake_maps_server.FakeMapsConfig(places_per_query=5, reviews_per_place=25, consent=True)
+        self.session = HttpSession()
+        self.session._client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=fake_maps_server.create_app(self.config)), base_url=BASE_URL
+        )
+        self.patches = [
+            mock.patch.object(reviews, "http_session", self.session),
+            mock.patch.object(reviews, "REVIEWS_RPC_URL", f"{BASE_URL}/maps/rpc/listugcposts"),
+            mock.patch.object(reviews.random, "uniform", return_value=0),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    async def asyncTearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        await self.session.aclose()
+
+    async def test_consent_wall_then_feed(self):
+        page = await self.session.get("/maps/search/?q=yoga+bali&hl=en")
+        self.assertIn("Accept all", page.text)
+
+        self.session.client.cookies.set("SOCS", "fakemaps")
+        page = await self.session.get("/maps/search/?q=yoga+bali&hl=en")
+        self.assertIn('role="feed"', page.text)
+        self.assertEqual(page.text.count("/maps/place/"), 5)
+
+    async def test_place_pages_and_reviews(self):
+        link = fake_maps_server.place_link(BASE_URL, "yoga bali", 3)
+        place = extractor.extract_place_data((await self.session.get(link)).text, require_blob=True)
+        place_id = reviews.extract_place_id(link)
+
+        self.assertEqual(place["name"], "Yoga Bali 4")
+        self.assertEqual(place["cid"], place_id)
+
+        raw = await reviews.fetch_reviews(place_id, budget=reviews.ReviewBudget(max_reviews=10, page_size=10))
+        self.assertEqual(len(raw), 25)  # three pages, the last one partial
+
+    async def test_error_injection(self):
+        self.config.error_rate = 1.0
+        response = await self.session.get(fake_maps_server.place_link(BASE_URL, "yoga bali", 0))
+        self.assertEqual(response.status_code, 500)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import httpx
+
+# Add the project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from gmaps_scraper_server import reviews, scraper
+from gmaps_scraper_server.cache import TieredCache
+from gmaps_scraper_server.http_client import HttpSession
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def build_place_html(blob):
+    """Wraps a data blob the way Maps serves it inside APP_INITIALIZATION_STATE."""
+    inner = ")]}'\n" + json.dumps([None] * 6 + [blob])
+    initial = [None, None, None, [None] * 6 + [inner]]
+    return f"<html><script>;window.APP_INITIALIZATION_STATE={json.dumps(initial)};window.APP_FLAGS=[];</script></html>"
+
+
+class FakeContext:
+    async def cookies(self):
+        return [{"name": "SOCS", "value": "abc", "domain": ".google.com", "path": "/"}]
+
+
+class TestHttpFastPath(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        with open(os.path.join(ROOT, "data_blob.json"), encoding="utf-8") as f:
+            self.place_html = build_place_html(json.load(f))
+        self.seen_cookies = []
+
+        def handler(request):
+            self.seen_cookies.append(request.headers.get("cookie"))
+            if "noblob" in str(request.url):
+                return httpx.Response(200, text="<html>consent wall</html>")
+            return httpx.Response(200, text=self.place_html)
+
+        self.session = HttpSession()
+        self.session._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        self.patch = mock.patch.object(scraper, "http_session", self.session)
+        self.patch.start()
+
+    async def asyncTearDown(self):
+        self.patch.stop()
+        await self.session.aclose()
+
+    async def test_place_extracted_without_browser(self):
+        link = "https://www.google.com/maps/place/Blooming+Lotus+Yoga"
+        place = await scraper.fetch_place_details_http(FakeContext(), link)
+
+        self.assertEqual(place["link"], link)
+        self.assertEqual(place["rating"], 4.9)
+        self.assertEqual(place["reviews_count"], 255)
+        self.assertIn("SOCS=abc", self.seen_cookies[0])
+
+    async def test_missing_blob_falls_back(self):
+        place = await scraper.fetch_place_details_http(FakeContext(), "https://www.google.com/maps/place/noblob")
+        self.assertIsNone(place)
+
+    async def test_failed_reviews_are_not_cached_as_reviews(self):
+        link = "https://www.google.com/maps/place/Blooming+Lotus+Yoga/data=!4m2!1s0x1:0x2!8m2"
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch.object(scraper, "place_cache", TieredCache("place_details", 60, 10, db_path=os.path.join(tmpdir, "c.sqlite3"))), \
+                mock.patch.object(scraper, "PLACE_FETCH_MODE", "http"), \
+                mock.patch.object(reviews, "http_session", self.session):
+            # The RPC gets the place page back, which isn't a reviews payload
+            place = await scraper.scrape_place_details(FakeContext(), link, True, None)
+            self.assertEqual(place["rating"], 4.9)
+
+            self.assertIsNone(await scraper.get_cached_place(link, "en", True))
+            self.assertEqual((await scraper.get_cached_place(link, "en", False))["rating"], 4.9)
+
+    async def test_cached_reviews_are_dropped_for_detail_requests(self):
+        link = "https://www.google.com/maps/place/Blooming+Lotus+Yoga/data=!4m2!1s0x1:0x2!8m2"
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch.object(scraper, "place_cache", TieredCache("place_details", 60, 10, db_path=os.path.join(tmpdir, "c.sqlite3"))):
+            await scraper.store_cached_place(link, "en", True, {"name": "Lotus", "user_reviews": [{"text": "ok"}]})
+
+            self.assertEqual((await scraper.get_cached_place(link, "en", False))["user_reviews"], [])
+            self.assertEqual(len((await scraper.get_cached_place(link, "en", True))["user_reviews"]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
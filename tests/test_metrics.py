@@ -0,0 +1,82 @@
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Add the project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from gmaps_scraper_server import main_api, metrics
+from test_streaming import fake_iter_scrape, no_browser_lifespan
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def sample_value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestMetrics(unittest.TestCase):
+    def test_stage_timer_records_failed_stages_too(self):
+        before = sample_value("gmaps_stage_seconds_count", stage="test_stage")
+        with metrics.stage_timer("test_stage"):
+            pass
+        with self.assertRaises(ValueError), metrics.stage_timer("test_stage"):
+            raise ValueError("boom")
+        self.assertEqual(sample_value("gmaps_stage_seconds_count", stage="test_stage"), before + 2)
+
+    def test_runtime_gauges(self):
+        shards = [{"open_contexts": 3, "open_pages": 5, "checked_out": 2}, {"open_contexts": 1, "open_pages": 0, "checked_out": 1}]
+        metrics.set_runtime_gauges(shards, {"in_use": 4, "waiting": 7}, {"queue_depth": 2})
+        self.assertEqual(sample_value("gmaps_open_contexts"), 4)
+        self.assertEqual(sample_value("gmaps_open_pages"), 5)
+        self.assertEqual(sample_value("gmaps_page_slots_waiting"), 7)
+        self.assertEqual(sample_value("gmaps_extraction_queue_depth"), 2)
+
+    def test_sampler_records_event_loop_lag(self):
+        before = sample_value("gmaps_event_loop_lag_seconds_count")
+        samples = []
+
+        async def run():
+            sampler = asyncio.create_task(metrics.run_sampler(lambda: samples.append(1), interval=0.01))
+            await asyncio.sleep(0.1)
+            sampler.cancel()
+
+        asyncio.run(run())
+        self.assertGreater(len(samples), 2)
+        self.assertEqual(sample_value("gmaps_event_loop_lag_seconds_count"), before + len(samples))
+
+    def test_metrics_endpoint(self):
+        with mock.patch.object(main_api, "iter_scrape_google_maps", fake_iter_scrape), \
+                mock.patch.object(main_api.app.router, "lifespan_context", no_browser_lifespan):
+            client = TestClient(main_api.app)
+            client.get("/scrape-get?query=cafes&stream=ndjson")
+            client.get("/no-such-page")
+            response = client.get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('gmaps_requests_total{endpoint="/scrape-get",status="200"}', response.text)
+        self.assertIn('gmaps_requests_total{endpoint="unmatched",status="404"}', response.text)
+        self.assertIn('gmaps_stage_seconds_count{stage="admission_wait"}', response.text)
+
+    def test_workers_are_aggregated(self):
+        with tempfile.TemporaryDirectory() as multiproc_dir:
+            env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=multiproc_dir)
+            run = lambda code: subprocess.run(
+                [sys.executable, "-c", f"from gmaps_scraper_server import metrics; {code}"],
+                cwd=ROOT, env=env, check=True, capture_output=True, text=True,
+            ).stdout
+            for _ in range(2):  # two "workers"
+                run('metrics.record_failure("scrape", "timeout")')
+            exposition = run("print(metrics.render().decode())")
+
+        self.assertIn('gmaps_failures_total{job="scrape",kind="timeout"} 2.0', exposition)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import os
+import sys
+import time
+import unittest
+from collections import Counter
+from unittest import mock
+
+# Add the project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.testclient import TestClient
+from gmaps_scraper_server import main_api, metrics, profiling
+from gmaps_scraper_server.extraction_executor import ExtractionExecutor
+from test_http_fast_path import ROOT, build_place_html
+from test_streaming import no_browser_lifespan
+
+
+async def fake_iter_scrape(query, max_places, lang, extract_reviews, ticket, max_age=None, refresh=False, review_budget=None):
+    with metrics.stage_timer("search_goto"):
+        await asyncio.sleep(0)
+
+    async def scrape(i):
+        with profiling.place(f"place-{i}"):
+            async with ticket:
+                for _ in range(2):
+                    with metrics.stage_timer("review_page"):
+                        await asyncio.sleep(0.001 * i)
+            return {"name": f"Place {i}"}
+
+    for task in asyncio.as_completed([asyncio.create_task(scrape(i)) for i in range(3)]):
+        yield await task
+
+
+async def fake_scrape(query, max_places, lang, extract_reviews, ticket, max_age=None, refresh=False, review_budget=None):
+    return [place async for place in fake_iter_scrape(query, max_places, lang, extract_reviews, ticket)]
+
+
+class TestTimeline(unittest.TestCase):
+    def test_spans_are_grouped_per_place(self):
+        with profiling.profile_request() as timeline:
+            with profiling.place("a"):
+                metrics.observe_stage("place_goto", 0.2)
+                metrics.observe_stage("extraction", 0.05, phases={"fields": 0.01})
+            metrics.observe_stage("consent", 1.0)
+        metrics.observe_stage("consent", 5.0)  # after the request: not recorded
+
+        profile = timeline.to_dict()
+        self.assertEqual([span["stage"] for span in profile["request"]], ["consent"])
+        spans = profile["places"]["a"]["spans"]
+        self.assertEqual([span["stage"] for span in spans], ["place_goto", "extraction"])
+        self.assertEqual(spans[1]["phases"], {"fields": 0.01})
+        self.assertEqual(profile["summary"]["stages"]["consent"]["count"], 1)
+        self.assertEqual(profile["summary"]["places"]["count"], 1)
+        self.assertNotIn("cpu_profile", profile)
+
+    def test_distribution(self):
+        summary = profiling.distribution([float(n) for n in range(100, 0, -1)])
+        self.assertEqual((summary["p50"], summary["p90"], summary["p99"], summary["max"]), (50, 90, 99, 100))
+        self.assertEqual(profiling.distribution([]), {"count": 0})
+
+    def test_sample_call(self):
+        def busy():
+            deadline = time.perf_counter() + 0.1
+            while time.perf_counter() < deadline:
+                pass
+            return "done"
+
+        result, samples = profiling.sample_call(busy)
+        self.assertEqual(result, "done")
+        self.assertTrue(samples)
+        self.assertTrue(all(stack.startswith("test_profiling.py:busy") for stack in samples))
+        summary = profiling.summarize_cpu_samples(samples)
+        self.assertEqual(summary["top"][0]["function"], "test_profiling.py:busy")
+
+
+class TestExtractionProfile(unittest.IsolatedAsyncioTestCase):
+    @mock.patch.object(profiling, "CPU_SAMPLE_INTERVAL", 0.0005)
+    async def test_cpu_samples_are_collected_in_every_mode(self):
+        with open(os.path.join(ROOT, "data_blob.json"), encoding="utf-8") as f:
+            place_html = build_place_html(json.load(f))
+        for mode in ("inline", "thread"):
+            executor = ExtractionExecutor(mode=mode)
+            cpu_samples = Counter()
+            deadline = time.perf_counter() + 5
+            # A sample is only taken when the sampler gets the GIL, so keep going until one lands
+            while not cpu_samples and time.perf_counter() < deadline:
+                place, timings = await executor.extract_place_data(place_html, cpu_samples=cpu_samples)
+            self.assertEqual(place["rating"], 4.9, mode)
+            self.assertTrue(all(stack.startswith("extraction_executor.py:_extract") for stack in cpu_samples), mode)
+
+
+class TestProfiledEndpoints(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(main_api, "iter_scrape_google_maps", fake_iter_scrape),
+            mock.patch.object(main_api, "scrape_google_maps", fake_scrape),
+            mock.patch.object(main_api.app.router, "lifespan_context", no_browser_lifespan),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.client = TestClient(main_api.app)
+
+    def test_profile_wraps_the_results(self):
+        response = self.client.get("/scrape-get?query=cafes&profile=true")
+        body = response.json()
+        self.assertEqual(len(body["results"]), 3)
+        self.assertIn("X-Queue-Wait-Seconds", response.headers)
+        self.assertEqual(int(response.headers["content-length"]), len(response.content))
+
+        profile = body["profile"]
+        self.assertEqual(set(profile["places"]), {"place-0", "place-1", "place-2"})
+        self.assertEqual(len(profile["places"]["place-2"]["spans"]), 3)  # admission wait + 2 pages
+        self.assertEqual(profile["summary"]["stages"]["review_page"]["count"], 6)
+        self.assertEqual(profile["request"][0]["stage"], "search_goto")
+
+    def test_unprofiled_results_are_unchanged(self):
+        self.assertEqual(len(self.client.get("/scrape-get?query=cafes").json()), 3)
+
+    def test_stream_summary_carries_the_profile(self):
+        response = self.client.get("/scrape-get?query=cafes&stream=ndjson&profile=true&profile_cpu=true")
+        summary = json.loads(response.text.splitlines()[-1])["data"]
+        self.assertEqual(summary["profile"]["summary"]["places"]["count"], 3)
+        self.assertIn("cpu_profile", summary["profile"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,301 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import asynccontextmanager
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+
+# Add the project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from gmaps_scraper_server import reviews, scraper
+from gmaps_scraper_server.cache import TieredCache
+from gmaps_scraper_server.http_client import HttpSession
+
+PLACE_ID = "0x89c259a9b3117469:0xd134e199a405a163"
+PLACE_LINK = f"https://www.google.com/maps/place/Starbucks/data=!4m6!3m5!1s{PLACE_ID}!8m2"
+
+
+def rpc_page(page_token, next_token, count=10):
+    items = [[[f"review-{page_token}-{i}"]] for i in range(count)]
+    return ")]}'\n" + json.dumps([None, next_token, items])
+
+
+class FakeContext:
+    def __init__(self, cookies=None):
+        self._cookies = cookies if cookies is not None else [
+            {"name": "NID", "value": "xyz", "domain": ".google.com", "path": "/"},
+            {"name": "SOCS", "value": "abc", "domain": ".google.com", "path": "/"},
+        ]
+
+    async def cookies(self):
+        return self._cookies
+
+    async def new_page(self):
+        raise AssertionError("Review-only jobs with a place id must not open a page")
+
+
+class FakeConsentPage:
+    def __init__(self, context):
+        self.context = context
+        self.closed = False
+
+    async def goto(self, url, wait_until=None):
+        self.context.visited.append(url)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeFreshContext(FakeContext):
+    """A pooled context that only gets the consent cookie once Maps was loaded and consent given."""
+
+    def __init__(self, consent_wall=True):
+        super().__init__([])
+        self.consent_wall = consent_wall
+        self.visited = []
+
+    async def new_page(self):
+        self.page = FakeConsentPage(self)
+        return self.page
+
+    def accept_consent(self):
+        if self.consent_wall:
+            self._cookies = [{"name": "SOCS", "value": "abc", "domain": ".google.com", "path": "/"}]
+
+
+class FakePooledBrowser:
+    def __init__(self, context):
+        self.context = context
+
+    @asynccontextmanager
+    async def pooled_context(self, lang="en"):
+        yield self.context
+
+
+class TestReviewsRpc(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.requests = []
+        self.pages = {"": "p2", "p2": "p3", "p3": None}
+
+        def handler(request):
+            self.requests.append(request)
+            pb = parse_qs(urlparse(str(request.url)).query)["pb"][0]
+            token = pb.split("!2s", 1)[1].split("!", 1)[0]
+            return httpx.Response(200, text=rpc_page(token, self.pages[token]))
+
+        self.session = HttpSession()
+        self.session._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        self.patches = [
+            mock.patch.object(reviews, "http_session", self.session),
+            mock.patch.object(scraper, "http_session", self.session),
+            mock.patch.object(reviews.random, "uniform", return_value=0),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    async def asyncTearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        await self.session.aclose()
+
+    def test_extract_place_id(self):
+        self.assertEqual(reviews.extract_place_id(PLACE_LINK), PLACE_ID)
+        self.assertEqual(reviews.extract_place_id(f"https://maps.google.com/?ftid={PLACE_ID}&hl=en"), PLACE_ID)
+        self.assertIsNone(reviews.extract_place_id("https://maps.app.goo.gl/ViRpRQyv56MzQHsXA"))
+
+    async def test_pages_until_no_token(self):
+        raw = await reviews.fetch_reviews(PLACE_ID)
+
+        self.assertEqual(len(raw), 30)
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(raw.stop_reason, "end")
+        self.assertIn(PLACE_ID.replace(":", "%3A"), str(self.requests[0].url))
+
+    async def test_stops_at_page_cap(self):
+        self.pages = {"": "more", "more": "more"}
+        raw = await reviews.fetch_reviews(PLACE_ID)
+
+        self.assertEqual(len(self.requests), reviews.REVIEWS_MAX_PAGES + 1)
+        self.assertEqual(len(raw), 10 * (reviews.REVIEWS_MAX_PAGES + 1))
+        self.assertEqual(raw.stop_reason, "limit")
+        self.assertFalse(raw.complete)
+
+    async def test_failed_page_is_reported(self):
+        self.pages = {"": "p2"}  # p2 is unknown: the handler raises and the client errors
+        raw = await reviews.fetch_reviews(PLACE_ID)
+
+        self.assertEqual(len(raw), 10)
+        self.assertTrue(raw.failed)
+
+    async def test_stops_at_the_fetch_limit(self):
+        self.pages = {"": "more", "more": "more"}
+        raw = await reviews.fetch_reviews(PLACE_ID, budget=reviews.ReviewBudget(max_reviews=10, fetch_limit=50))
+        self.assertEqual((len(raw), len(self.requests)), (30, 5))
+
+        self.requests.clear()
+        budget = reviews.ReviewBudget(max_reviews=10, candidate_pool=5, page_size=20, fetch_limit=10)
+        await reviews.fetch_reviews(PLACE_ID, budget=budget)
+        self.assertEqual(budget.candidate_pool, 10)
+        self.assertEqual(len(self.requests), 1)
+        self.assertIn("!2m2!1i20!", str(self.requests[0].url))
+
+        self.requests.clear()
+        raw = await reviews.fetch_reviews(PLACE_ID, budget=reviews.ReviewBudget(max_reviews=10, candidate_pool=10, fetch_limit=40))
+        self.assertEqual((len(raw), len(self.requests), raw.ranked), (10, 4, 40))
+
+    async def test_only_the_candidate_pool_is_kept(self):
+        raw = await reviews.fetch_reviews(PLACE_ID, budget=reviews.ReviewBudget(max_reviews=5, candidate_pool=15, fetch_limit=15))
+
+        self.assertEqual(len(self.requests), 2)
+        # Equal ranks keep arrival order
+        self.assertEqual([r[0][0] for r in raw], [f"review--{i}" for i in range(10)] + [f"review-p2-{i}" for i in range(5)])
+
+    def test_default_budget_matches_extractor_defaults(self):
+        budget = reviews.ReviewBudget()
+        self.assertEqual((budget.max_reviews, budget.candidate_pool, budget.page_size, budget.fetch_limit), (100, 300, 10, 300))
+
+    def test_small_budgets_keep_the_default_fetch_depth(self):
+        self.assertEqual(reviews.ReviewBudget(max_reviews=10).fetch_limit, 300)
+        self.assertEqual(reviews.ReviewBudget(max_reviews=10, fetch_limit=40).fetch_limit, 40)
+        self.assertEqual(reviews.ReviewBudget(max_reviews=200).fetch_limit, 600)
+
+    async def test_reviews_only_skips_navigation(self):
+        with mock.patch.object(scraper.extractor, "process_and_select_reviews", side_effect=lambda raw, *selection: raw[:2]):
+            result = await scraper.scrape_reviews_only(FakeContext(), PLACE_LINK, None)
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(len(result["user_reviews"]), 2)
+        self.assertIn("NID=xyz", self.requests[0].headers["cookie"])
+
+    async def test_reviews_only_keeps_the_language(self):
+        with mock.patch.object(scraper, "scrape_reviews_by_place_id", mock.AsyncMock()) as by_place_id:
+            await scraper.scrape_reviews_only(FakeContext(), PLACE_LINK, None, lang="fr")
+        self.assertEqual(by_place_id.call_args.args[2], "fr")
+
+    async def test_failed_rpc_is_an_error(self):
+        self.pages = {}  # every page is unknown: the handler raises and the client errors
+        result = await scraper.scrape_reviews_only(FakeContext(), PLACE_LINK, None)
+        self.assertEqual(result["status"], "error")
+
+    async def test_cookies_are_captured_after_consent(self):
+        self.assertFalse(self.session.has_cookies)
+        context = FakeFreshContext()
+        with mock.patch.object(scraper, "browser_manager", FakePooledBrowser(context)), \
+                mock.patch.object(scraper, "handle_consent", side_effect=lambda page: page.context.accept_consent()) as consent:
+            await scraper.ensure_http_cookies()
+            await scraper.ensure_http_cookies()
+
+        self.assertEqual(consent.call_count, 1)
+        self.assertTrue(context.page.closed)
+        self.assertIn("/maps/search/", context.visited[0])
+        self.assertTrue(self.session.has_cookies)
+        self.assertFalse(self.session.consent_not_required)
+
+    async def test_no_consent_wall_is_remembered(self):
+        context = FakeFreshContext(consent_wall=False)
+        with mock.patch.object(scraper, "browser_manager", FakePooledBrowser(context)), \
+                mock.patch.object(scraper, "handle_consent", side_effect=lambda page: page.context.accept_consent()) as consent:
+            await scraper.ensure_http_cookies()
+            await scraper.ensure_http_cookies()
+
+        self.assertEqual(consent.call_count, 1)
+        self.assertTrue(self.session.has_cookies)
+
+
+class TestSinceLastRun(unittest.IsolatedAsyncioTestCase):
+    """The RPC serves `self.feed` (newest first) in pages of 10."""
+
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = TieredCache("review_state", 3600, 10, db_path=os.path.join(self.tmpdir.name, "reviews.sqlite3"))
+        self.feed = [self.review(i) for i in range(25, 0, -1)]
+        self.requests = []
+
+        def handler(request):
+            self.requests.append(request)
+            pb = parse_qs(urlparse(str(request.url)).query)["pb"][0]
+            self.assertIn("!13m1!1e2", pb)  # newest first
+            start = int(pb.split("!2s", 1)[1].split("!", 1)[0] or 0)
+            next_token = str(start + 10) if start + 10 < len(self.feed) else None
+            return httpx.Response(200, text=")]}'\n" + json.dumps([None, next_token, self.feed[start:start + 10]]))
+
+        self.session = HttpSession()
+        self.session._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        self.patches = [
+            mock.patch.object(reviews, "http_session", self.session),
+            mock.patch.object(reviews, "review_store", self.store),
+            mock.patch.object(reviews.random, "uniform", return_value=0),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    async def asyncTearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        await self.session.aclose()
+        self.tmpdir.cleanup()
+
+    @staticmethod
+    def review(n):
+        return [[f"id-{n}", [None, "a day ago", 1_700_000_000_000_000 + n]]]
+
+    async def test_first_run_fetches_everything(self):
+        raw = await reviews.fetch_new_reviews(PLACE_ID)
+
+        self.assertEqual(len(raw), 25)
+        state = self.store.get(reviews.review_state_key(PLACE_ID))
+        self.assertEqual(state["seen_ids"][0], "id-25")
+        self.assertEqual(state["newest"], 1_700_000_000_000_025)
+
+    async def test_next_run_stops_at_seen_review(self):
+        await reviews.fetch_new_reviews(PLACE_ID)
+        self.requests.clear()
+        self.feed = [self.review(27), self.review(26)] + self.feed
+
+        raw = await reviews.fetch_new_reviews(PLACE_ID)
+
+        self.assertEqual([r[0][0] for r in raw], ["id-27", "id-26"])
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.store.get(reviews.review_state_key(PLACE_ID))["seen_ids"][:3], ["id-27", "id-26", "id-25"])
+
+    async def test_unchanged_place_returns_nothing(self):
+        await reviews.fetch_new_reviews(PLACE_ID)
+        self.requests.clear()
+
+        self.assertEqual(await reviews.fetch_new_reviews(PLACE_ID), [])
+        self.assertEqual(len(self.requests), 1)
+
+    async def test_failed_run_keeps_the_state(self):
+        await reviews.fetch_new_reviews(PLACE_ID)
+        state = self.store.get(reviews.review_state_key(PLACE_ID))
+        self.feed = [self.review(27), self.review(26)] + self.feed
+        with mock.patch.object(self.session, "get", return_value=httpx.Response(503)):
+            self.assertTrue((await reviews.fetch_new_reviews(PLACE_ID)).failed)
+
+        self.assertEqual(self.store.get(reviews.review_state_key(PLACE_ID)), state)
+        raw = await reviews.fetch_new_reviews(PLACE_ID)
+        self.assertEqual([r[0][0] for r in raw], ["id-27", "id-26"])
+
+    async def test_truncated_runs_lose_and_repeat_nothing(self):
+        budget = reviews.ReviewBudget(max_reviews=5, candidate_pool=10, seed=1, fetch_limit=10)
+        returned = []
+        for _ in range(10):
+            raw = await reviews.fetch_new_reviews(PLACE_ID, budget=budget)
+            if not raw:
+                break
+            self.assertLessEqual(len(raw), 5)
+            returned += [r[0][0] for r in raw]
+
+        self.assertEqual(sorted(returned), sorted(f"id-{n}" for n in range(1, 26)))
+        state = self.store.get(reviews.review_state_key(PLACE_ID))
+        self.assertEqual(state["newest"], 1_700_000_000_000_025)
+        self.assertNotIn("returned_ids", state)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,257 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Add the project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from gmaps_scraper_server import scraper
+from gmaps_scraper_server.admission import AdmissionController
+from gmaps_scraper_server.cache import TieredCache
+
+
+class FakeBrowserManager:
+    async def acquire_context(self, lang="en", block_resources=False):
+        return object()
+
+    async def release_context(self, context, discard=False):
+        self.discarded = discard
+
+
+class TestScrapePipeline(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.events = []
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.search_cache = TieredCache("search_links", 0, 10, db_path=os.path.join(self.tmpdir.name, "c.sqlite3"))
+
+        async def fake_harvest(context, query, lang, max_places, on_new_link):
+            for i in range(3):
+                await asyncio.sleep(0.02)
+                self.events.append(f"found {i}")
+                on_new_link(f"link-{i}")
+            self.events.append("harvest done")
+            return 3
+
+        async def fake_details(context, link, extract_reviews, semaphore, lang="en", max_age=None, reviews=None, review_budget=None):
+            async with semaphore:
+                self.events.append(f"scrape {link}")
+                return {"link": link}
+
+        self.patches = [
+            mock.patch.object(scraper, "browser_manager", FakeBrowserManager()),
+            mock.patch.object(scraper, "_harvest_place_links", fake_harvest),
+            mock.patch.object(scraper, "scrape_place_details", fake_details),
+            mock.patch.object(scraper, "search_cache", self.search_cache),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    async def asyncTearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        self.tmpdir.cleanup()
+
+    async def test_details_start_while_feed_is_still_scrolling(self):
+        with AdmissionController(budget=5).request("scrape") as ticket:
+            results = await scraper.scrape_google_maps("cafes", ticket=ticket)
+
+        self.assertEqual(sorted(r["link"] for r in results), ["link-0", "link-1", "link-2"])
+        self.assertLess(self.events.index("scrape link-0"), self.events.index("harvest done"))
+
+    async def test_generator_yields_places_before_harvest_finishes(self):
+        with AdmissionController(budget=5).request("scrape") as ticket:
+            stream = scraper.iter_scrape_google_maps("cafes", ticket=ticket)
+            first = await stream.__anext__()
+            self.assertEqual(first["link"], "link-0")
+            self.assertNotIn("harvest done", self.events)
+            await stream.aclose()
+
+    async def test_repeat_query_skips_harvest_unless_refreshed(self):
+        self.search_cache.ttl = 60
+        await scraper.scrape_google_maps("Cafes  in Paris")
+        self.events.clear()
+
+        results = await scraper.scrape_google_maps("cafes in paris")
+        self.assertNotIn("harvest done", self.events)
+        self.assertEqual(sorted(r["link"] for r in results), ["link-0", "link-1", "link-2"])
+
+        await scraper.scrape_google_maps("cafes in paris", refresh=True)
+        self.assertIn("harvest done", self.events)
+
+    async def test_truncated_link_list_only_serves_smaller_requests(self):
+        self.search_cache.ttl = 60
+        await scraper.scrape_google_maps("cafes", max_places=3)
+        self.events.clear()
+
+        results = await scraper.scrape_google_maps("cafes", max_places=2)
+        self.assertNotIn("harvest done", self.events)
+        self.assertEqual(len(results), 2)
+
+        await scraper.scrape_google_maps("cafes")
+        self.assertIn("harvest done", self.events)
+
+
+class TestReviewPipeline(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.events = []
+        self.tmpdir = tempfile.TemporaryDirectory()
+        db_path = os.path.join(self.tmpdir.name, "c.sqlite3")
+        self.links = [f"https://www.google.com/maps/place/P{i}/data=!1s0x{i}:0x{i}!8m2" for i in range(3)]
+
+        async def fake_harvest(context, query, lang, max_places, on_new_link):
+            for link in self.links:
+                on_new_link(link)
+            return len(self.links)
+
+        async def fake_fetch_reviews(place_id, budget=None):
+            self.events.append(f"reviews {place_id}")
+            await asyncio.sleep(0.01)
+            return [place_id]
+
+        async def fake_details(context, link, extract_reviews, semaphore, lang="en", max_age=None, reviews=None, review_budget=None):
+            async with semaphore:
+                self.events.append(f"page {scraper.extract_place_id(link)}")
+                await asyncio.sleep(0.01)
+            return {"link": link, "reviews": await reviews}
+
+        self.patches = [
+            mock.patch.object(scraper, "browser_manager", FakeBrowserManager()),
+            mock.patch.object(scraper, "_harvest_place_links", fake_harvest),
+            mock.patch.object(scraper, "fetch_reviews", fake_fetch_reviews),
+            mock.patch.object(scraper, "ensure_http_cookies", side_effect=lambda lang: self.events.append(f"cookies {lang}")),
+            mock.patch.object(scraper, "scrape_place_details", fake_details),
+            mock.patch.object(scraper, "search_cache", TieredCache("search_links", 0, 10, db_path=db_path)),
+            mock.patch.object(scraper, "place_cache", TieredCache("place_details", 0, 10, db_path=db_path)),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    async def asyncTearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        self.tmpdir.cleanup()
+
+    async def test_reviews_run_ahead_of_page_slots(self):
+        # A single page slot: details are serialized, reviews are not
+        with AdmissionController(budget=1).request("scrape") as ticket:
+            results = await scraper.scrape_google_maps("cafes", extract_reviews=True, ticket=ticket)
+
+        self.assertEqual(sorted(r["reviews"][0] for r in results), ["0x0:0x0", "0x1:0x1", "0x2:0x2"])
+        self.assertLess(self.events.index("reviews 0x2:0x2"), self.events.index("page 0x1:0x1"))
+        # Consent cookies are in the HTTP client before the first review RPC
+        self.assertEqual(self.events[0], "cookies en")
+
+    async def test_no_review_pipeline_without_extract_reviews(self):
+        async def fake_details(context, link, extract_reviews, semaphore, lang="en", max_age=None, reviews=None, review_budget=None):
+            self.assertIsNone(reviews)
+            return {"link": link}
+
+        with mock.patch.object(scraper, "scrape_place_details", fake_details):
+            results = await scraper.scrape_google_maps("cafes", extract_reviews=False)
+
+        self.assertEqual(len(results), 3)
+        self.assertFalse(any(e.startswith(("reviews", "cookies")) for e in self.events))
+
+
+class TestPlaceDetails(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.place_cache = TieredCache("place_details", 60, 10, db_path=os.path.join(self.tmpdir.name, "c.sqlite3"))
+        self.link = "https://www.google.com/maps/place/P0/data=!1s0x0:0x0!8m2"
+        self.patch = mock.patch.object(scraper, "place_cache", self.place_cache)
+        self.patch.start()
+
+    async def asyncTearDown(self):
+        self.patch.stop()
+        self.tmpdir.cleanup()
+
+    async def test_unused_review_task_is_cancelled_on_a_cache_hit(self):
+        await scraper.store_cached_place(self.link, "en", True, {"name": "P0", "user_reviews": []})
+        reviews = asyncio.create_task(asyncio.sleep(10))
+
+        place = await scraper.scrape_place_details(None, self.link, True, None, reviews=reviews)
+        await asyncio.sleep(0)
+
+        self.assertEqual(place["name"], "P0")
+        self.assertTrue(reviews.cancelled())
+
+    async def test_unused_review_task_is_cancelled_when_the_page_fails(self):
+        async def failed_load(context, link, semaphore, review_budget=None):
+            return None, None
+
+        reviews = asyncio.create_task(asyncio.sleep(10))
+        with mock.patch.object(scraper, "_load_place_page", failed_load):
+            self.assertIsNone(await scraper.scrape_place_details(None, self.link, True, None, reviews=reviews))
+        await asyncio.sleep(0)
+
+        self.assertTrue(reviews.cancelled())
+
+
+class FakeLocator:
+    async def count(self):
+        return 1
+
+
+class FakeFeedPage:
+    """Replays feed batches through the exposed binding like the in-page observer would."""
+
+    def __init__(self, batches):
+        self.batches = batches
+        self.url = "https://www.google.com/maps/search/?q=cafes"
+        self.binding = None
+        self.closed = False
+
+    async def goto(self, url, wait_until=None):
+        pass
+
+    async def wait_for_selector(self, selector, state=None, timeout=None):
+        pass
+
+    def locator(self, selector):
+        return FakeLocator()
+
+    async def expose_function(self, name, callback):
+        self.binding = callback
+
+    async def evaluate(self, script, arg=None):
+        if script == scraper.FEED_HARVESTER_JS:
+            for links, at_end in self.batches:
+                self.binding(links, at_end)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeContext:
+    def __init__(self, page):
+        self.page = page
+
+    async def new_page(self):
+        return self.page
+
+
+class TestFeedHarvester(unittest.IsolatedAsyncioTestCase):
+    async def harvest(self, batches, max_places=None):
+        found = []
+        page = FakeFeedPage(batches)
+        with mock.patch.object(scraper, "handle_consent", mock.AsyncMock()), \
+                mock.patch.object(scraper.asyncio, "sleep", mock.AsyncMock()):
+            count = await scraper._harvest_place_links(FakeContext(page), "cafes", "en", max_places, found.append)
+        self.assertTrue(page.closed)
+        self.assertEqual(count, len(found))
+        return found
+
+    async def test_new_links_are_reported_once_until_end_marker(self):
+        found = await self.harvest([(["a", "b"], False), (["b", "c"], False), ([], True), (["d"], False)])
+        self.assertEqual(found, ["a", "b", "c"])
+
+    async def test_stops_at_max_places(self):
+        found = await self.harvest([(["a", "b"], False), (["c", "d"], False)], max_places=3)
+        self.assertEqual(found, ["a", "b", "c"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import os
+import sys
+import unittest
+from contextlib import asynccontextmanager
+from unittest import mock
+
+# Add the project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.testclient import TestClient
+from gmaps_scraper_server import main_api
+
+
+@asynccontextmanager
+async def no_browser_lifespan(app):
+    yield
+
+
+async def fake_iter_scrape(query, max_places, lang, extract_reviews, ticket, max_age=None, refresh=False, review_budget=None):
+    for i in range(3):
+        async with ticket:
+            await asyncio.sleep(0)
+        yield {"name": f"Place {i}"}
+
+
+class TestStreamingResponses(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(main_api, "iter_scrape_google_maps", fake_iter_scrape),
+            mock.patch.object(main_api.app.router, "lifespan_context", no_browser_lifespan),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.client = TestClient(main_api.app)
+
+    def test_ndjson_stream_ends_with_summary(self):
+        response = self.client.get("/scrape-get?query=cafes&stream=ndjson")
+        self.assertEqual(response.headers["content-type"], "application/x-ndjson")
+
+        records = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([r["type"] for r in records], ["place", "place", "place", "summary"])
+        self.assertEqual(records[0]["data"]["name"], "Place 0")
+        self.assertEqual(records[-1]["data"]["count"], 3)
+        self.assertIn("queue_wait_seconds", records[-1]["data"])
+
+    def test_sse_stream_uses_event_names(self):
+        response = self.client.post("/scrape?query=cafes&stream=sse")
+        self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+
+        events = [chunk for chunk in response.text.split("\n\n") if chunk]
+        self.assertEqual(events[0].splitlines()[0], "event: place")
+        self.assertEqual(events[-1].splitlines()[0], "event: summary")
+
+    def test_unknown_stream_format_is_rejected(self):
+        response = self.client.get("/scrape-get?query=cafes&stream=xml")
+        self.assertEqual(response.status_code, 422)
+
+    def test_disconnect_closes_the_records_before_the_ticket(self):
+        cleanup = []
+
+        async def produce(ticket):
+            try:
+                while True:
+                    yield {"name": "Place"}
+                    await asyncio.sleep(0)
+            finally:
+                cleanup.append(ticket in main_api.admission_controller._tickets)
+
+        async def disconnect():
+            body = main_api.streaming_response("ndjson", "place", "scrape", 1, produce).body_iterator
+            await body.__anext__()
+            # What the server does with the body once the client has gone away
+            await body.aclose()
+
+        asyncio.run(disconnect())
+        self.assertEqual(cleanup, [True])
+
+    def test_place_id_reviews_are_bounded_per_request(self):
+        running = []
+        peak = []
+
+        async def fake_reviews_by_place_id(link, place_id, lang="en", since_last_run=False, review_budget=None):
+            running.append(link)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(link)
+            return {"link": link, "user_reviews": [], "status": "success"}
+
+        urls = [f"https://www.google.com/maps/place/P{i}/data=!1s0x{i}:0x{i}!8m2" for i in range(6)]
+        with mock.patch.object(main_api, "scrape_reviews_by_place_id", fake_reviews_by_place_id), \
+                mock.patch.object(main_api, "REVIEW_RPC_CONCURRENCY", 2):
+            for stream in (None, "ndjson"):
+                peak.clear()
+                response = self.client.post("/reviews", json={"urls": urls, "stream": stream})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(peak), 6)
+                self.assertEqual(max(peak), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()